@@ -1,67 +1,37 @@
 import argparse
 import csv
-import re
 import os
-import polars as pl
-import numpy as np
-import matplotlib.pyplot as plt
 
+import shards
 import utils
+from dtplib import tracefile
+from dtplib.parse import parse_trace
 
-
-def parse_trace(trace_file_name):
-    trace = []
-    with open(trace_file_name, "r") as f:
-        lines = f.readlines()
-        for idx, line in enumerate(lines):
-            info = re.split(r"\s+", line)
-            trace.append(
-                {
-                    "id": idx,
-                    "gap": float(info[0]),
-                    "ddl": int(info[1]),
-                    "size": int(info[2]),
-                    "prio": int(info[3]),
-                }
-            )
-    return pl.from_dicts(trace)
-
-def parse_server_log(server_log_file_name: str) -> pl.DataFrame:
-    """
-    # parse_server_log
-
-    Parse a server log file and return a polars DataFrame.
-
-        Parameters:
-            server_log_file_name (str): The name of the server log file.
-
-        Returns:
-            polars.DataFrame: The parsed server log.
-
-    Format of the server log file:
-        CSV file with following columns:
-        - block_id
-        - start
-        - complete
-        - cancelled
-        - cancelled_passed
-    """
-    try:
-        server_log = pl.read_csv(server_log_file_name)
-        server_log["block_id"] = server_log["block_id"].apply(lambda x: (x >> 2) - 1)
-        return server_log
-    except:
-        return pl.DataFrame(
-            None, ["block_id", "start", "complete", "cancelled", "cancelled_passed"]
-        )
+# polars, numpy and matplotlib are imported by the commands that need them, so
+# `total_time` and `find_unsend` start without loading them
 
 
 def find_unsend(result_file_name, trace_file_name):
     if trace_file_name is not None:
-        block_num = utils.count_newlines(trace_file_name)
+        block_num = tracefile.block_count(trace_file_name)
         trace = set(range(block_num))
 
-        with open(result_file_name, "r") as f:
+        if not isinstance(result_file_name, str):
+            # shards of several connections: (conn, block, stream) per connection
+            _, lines = shards.merge_lines(result_file_name)
+            result = set()
+            for line in lines:
+                row = line.split(",")
+                result.add((int(row[-1]), ((int(row[0]) - 1) >> 2) - 1))
+            res = sorted(
+                (conn, x, ((x + 1) << 2) + 1)
+                for conn in range(len(result_file_name))
+                for x in trace
+                if (conn, x) not in result
+            )
+            return (len(res), res)
+
+        with utils.open_input(result_file_name, "r") as f:
             reader = csv.DictReader(f)
             result = [((int(row["block_id"]) - 1) >> 2) - 1 for row in reader]
 
@@ -72,17 +42,276 @@ def find_unsend(result_file_name, trace_file_name):
         raise Exception("trace_file_name is None")
 
 
+def _result_name(result_file_name) -> str:
+    """Name of the figures of a result file, or of the first of its shards."""
+    name = os.path.basename(shards.shard_list(result_file_name)[0]).split(".")[0]
+    return name if isinstance(result_file_name, str) else f"{name}_merged"
+
+
 def total_time(trace_file_name):
-    with open(trace_file_name, "r") as f:
+    if tracefile.is_binary_trace(trace_file_name):
+        # summed in order like the text trace, i.e. the start of the last block
+        gap = tracefile.load(trace_file_name)["gap"]
+        return float(gap.cumsum()[-1]) if len(gap) else 0
+    with utils.open_input(trace_file_name, "r") as f:
         reader = csv.reader(f, delimiter=" ")
         return sum([float(row[0]) for row in reader])
 
 
+class _WindowLoad:
+    """Offered load of consecutive time windows, kept in a sketch."""
+
+    def __init__(self, bin_size: float):
+        import sketch
+
+        self.bin_size = bin_size
+        self.load = sketch.QuantileSketch()
+        self.window = 0
+        self.bytes = 0
+        self.peak = (0.0, 0)
+
+    def _push(self, first: int, sums):
+        """Add the windows first, first + 1, ... with `sums` bytes each."""
+        import numpy as np
+
+        mbps = np.asarray(sums, dtype=np.float64) * 8 / self.bin_size / 1e6
+        if len(mbps) and mbps.max() > self.peak[0]:
+            self.peak = (float(mbps.max()), first + int(np.argmax(mbps)))
+        self.load.add_many(mbps)
+
+    def add(self, start, size):
+        import numpy as np
+
+        idx = (start // self.bin_size).astype(np.int64)
+        lo, hi = int(idx[0]), int(idx[-1])
+        sums = np.bincount(idx - lo, weights=size, minlength=hi - lo + 1)
+        if lo == self.window:
+            sums[0] += self.bytes
+        else:
+            # the open window and the ones without any block up to lo
+            self._push(self.window, [self.bytes] + [0] * (lo - self.window - 1))
+        self._push(lo, sums[:-1])
+        self.window, self.bytes = hi, sums[-1]
+
+    def close(self):
+        self._push(self.window, [self.bytes])
+
+
+def profile(trace_file_name, bin_size=0.1, chunk_size=1 << 24):
+    """
+    # profile
+
+    Summarize a trace in one streaming pass and constant memory: block count,
+    duration, offered load over windows of `bin_size` seconds and, per
+    priority, the number of blocks, bytes and the distributions of block size
+    and deadline.
+
+    Distributions are kept in quantile sketches (1% relative error), so traces
+    with 10^8 blocks can be checked before a run without loading them.
+
+        Parameters:
+            trace_file_name (str): The name of the trace file.
+            bin_size (float): Width of the load windows in seconds.
+            chunk_size (int): Bytes of the trace parsed at once.
+    """
+    import numpy as np
+
+    import sketch
+    from dtplib.parse import read_trace_chunks
+
+    count = 0
+    total_bytes = 0
+    duration = 0.0
+    last_deadline = 0.0
+    prios = {}
+    load = _WindowLoad(bin_size)
+    for gap, ddl, size, prio in read_trace_chunks(trace_file_name, chunk_size):
+        start = duration + np.cumsum(gap)
+        duration = float(start[-1])
+        count += len(gap)
+        total_bytes += int(size.sum())
+        last_deadline = max(last_deadline, float(np.max(start + ddl / 1000)))
+        load.add(start, size)
+        for p in np.unique(prio):
+            mask = prio == p
+            stats = prios.setdefault(
+                int(p),
+                {
+                    "count": 0,
+                    "bytes": 0,
+                    "size": sketch.QuantileSketch(),
+                    "ddl": sketch.QuantileSketch(),
+                },
+            )
+            stats["count"] += int(mask.sum())
+            stats["bytes"] += int(size[mask].sum())
+            stats["size"].add_many(size[mask])
+            stats["ddl"].add_many(ddl[mask])
+    if count == 0:
+        raise Exception(f"{trace_file_name} has no blocks")
+    load.close()
+
+    def dist(s, unit):
+        values = ", ".join(
+            f"{k}={v:.0f}" for k, v in s.quantiles(sketch.QUANTILES).items()
+        )
+        return f"min={s.min:.0f}, {values}, max={s.max:.0f} {unit}"
+
+    print(f"trace: {trace_file_name}")
+    print(f"blocks: {count}")
+    print(f"duration: {duration:.3f}s (last deadline at {last_deadline:.3f}s)")
+    print(f"bytes: {total_bytes}")
+    print(f"average load: {total_bytes * 8 / max(duration, 1e-9) / 1e6:.3f}Mbps")
+    peak, window = load.peak
+    print(
+        f"load per {bin_size}s window: mean={load.load.mean():.3f}, "
+        + ", ".join(
+            f"{k}={v:.3f}" for k, v in load.load.quantiles(sketch.QUANTILES).items()
+        )
+        + f", max={peak:.3f}Mbps at {window * bin_size:.3f}s"
+    )
+    for p, stats in sorted(prios.items()):
+        print(
+            f"prio {p}: {stats['count']} blocks ({stats['count'] / count:.2%}), "
+            f"{stats['bytes']} bytes ({stats['bytes'] / max(total_bytes, 1):.2%})"
+        )
+        print(f"  size: {dist(stats['size'], 'bytes')}")
+        print(f"  ddl: {dist(stats['ddl'], 'ms')}")
+
+
+def bound(trace_file_name, result_file_names, rate, rtt=0.0):
+    """
+    # bound
+
+    Compare the BCR and BCT of result files with the ideal ones of the trace
+    on a link of `rate` Mbps (see `dtplib.bound.ideal`), per priority:
+
+    - bound: BCR upper bound given the capacity of the link, whatever the
+      scheduler, and the BCT of the blocks it counts alone on the link
+    - edf / prio / fifo: reference values of fluid schedulers cancelling late
+      blocks, not bounds
+
+    A block is in time if its BCT is below its deadline, BCTs are the average
+    of the blocks in time, in ms. An item of
+    `result_file_names` may be the list of the shards of the connections of
+    a run, its BCR is relative to the blocks of all connections.
+    """
+    import polars as pl
+
+    from dtplib import bound as ideal_bound
+    from dtplib.parse import parse_result
+
+    if trace_file_name is None or rate is None:
+        raise Exception("bound needs a trace file and --rate")
+    trace = parse_trace(trace_file_name)
+    stats = ideal_bound.summary(ideal_bound.ideal(trace, rate, rtt))
+    labels = ["bound"] + ideal_bound.SCHEDULERS
+    rows = {}
+    for row in stats.to_dicts():
+        rows[row["prio"]] = {
+            "blocks": row["blocks"],
+            "bcr": [row[f"{name}_bcr"] for name in labels],
+            "bct": [row[f"{name}_bct"] for name in labels],
+        }
+
+    for result_file_name in result_file_names:
+        if isinstance(result_file_name, str):
+            labels.append(os.path.basename(result_file_name))
+        else:
+            labels.append(_result_name(result_file_name))
+        result = parse_result(result_file_name)
+        intime = result.filter(pl.col("bct") < pl.col("deadline"))
+        measured = intime.groupby("priority").agg(
+            [pl.count().alias("intime"), pl.col("bct").mean().alias("bct")]
+        )
+        measured = {row["priority"]: row for row in measured.to_dicts()}
+        for prio, row in rows.items():
+            m = measured.get(prio, {"intime": 0, "bct": None})
+            total = row["blocks"] * shards.connections(result_file_name)
+            row["bcr"].append(m["intime"] / total)
+            row["bct"].append(m["bct"])
+
+    def fmt(value, spec):
+        return "NA" if value is None else spec % value
+
+    print(f"link {rate}Mbps, rtt {rtt}ms")
+    print("|\t| %s |" % (" | ".join(labels)))
+    for prio, row in sorted(rows.items()):
+        print(
+            "| prio %d BCR (%d blocks) | %s |"
+            % (prio, row["blocks"], " | ".join(fmt(x, "%0.3f") for x in row["bcr"]))
+        )
+        print(
+            "| prio %d BCT (ms) | %s |"
+            % (prio, " | ".join(fmt(x, "%0.1f") for x in row["bct"]))
+        )
+
+
+def significance(
+    groups, trace_file_name=None, replicates=10000, confidence=0.95, percentile=99
+):
+    """
+    # significance
+
+    Print bootstrap confidence intervals of BCR, average / percentile BCT and
+    goodput of groups of repeated runs, and of their differences to the first
+    group. Differences whose interval does not contain 0 are marked with `*`.
+
+        Parameters:
+            groups (list): [[label, result csv, ...], ...]
+    """
+    from dtplib import bootstrap
+
+    groups = {group[0]: group[1:] for group in groups}
+    if len(groups) == 0 or any(len(files) == 0 for files in groups.values()):
+        raise Exception("every group needs a label and at least one result file")
+    report = bootstrap.compare(
+        groups, trace_file_name, replicates, confidence, percentile
+    )
+    names = {
+        "bcr": ("BCR", "%0.3f"),
+        "bct": ("BCT (ms)", "%0.1f"),
+        "pbct": (f"p{percentile:g} BCT (ms)", "%0.1f"),
+        "goodput": ("Goodput (Mbps)", "%0.2f"),
+    }
+    labels = list(groups)
+
+    def cell(fmt, value, interval, mark=""):
+        return f"{fmt % value} [{fmt % interval[0]}, {fmt % interval[1]}]{mark}"
+
+    header = [
+        f"{label} ({report[label]['runs']} run{'s' if report[label]['runs'] > 1 else ''})"
+        for label in labels
+    ]
+    header += [f"{label} - {labels[0]}" for label in labels[1:]]
+    print(f"{confidence:.0%} bootstrap intervals, {replicates} replicates")
+    print("|\t| %s |" % " | ".join(header))
+    for i, (group, metric) in enumerate(report["keys"]):
+        name, fmt = names[metric]
+        row = [
+            cell(fmt, report[label]["estimate"][i], report[label]["interval"][:, i])
+            for label in labels
+        ]
+        for label in labels[1:]:
+            r = report[label]
+            mark = " *" if r["significant"][i] else ""
+            row.append(
+                cell("%+" + fmt[1:], r["diff"][i], r["diff_interval"][:, i], mark)
+            )
+        group = "all" if group == "all" else f"prio {group}"
+        print(f"| {group} {name} | {' | '.join(row)} |")
+
+
 def draw(result_file_name, trace_file_name):
-    result = pl.read_csv(result_file_name)
-    result["block_id"] = result["block_id"].apply(lambda x: (x >> 2) - 1)
-    trace = parse_trace(trace_file_name).rename({"gap": "start"})
-    trace["start"] = trace["start"].cumsum()
+    import matplotlib.pyplot as plt
+    import numpy as np
+    import polars as pl
+
+    import downsample
+    from dtplib.parse import parse_result
+
+    result = parse_result(result_file_name)
+    trace = parse_trace(trace_file_name).drop("gap")
     result = result.join(trace, left_on="block_id", right_on="id", how="outer")
     print(result)
     result = result.select(
@@ -100,20 +329,18 @@ def draw(result_file_name, trace_file_name):
     print(result)
 
     x = result["timestamp"].to_numpy()
-    y = np.zeros((8, len(x)))
-    y_count = np.zeros(8)
-    y_intime = np.zeros(8)
-    for i in range(len(x)):
-        y_count[result["prio"][i]] += 1
-        if result["intime"][i]:
-            y_intime[result["prio"][i]] += 1
-        for j in range(8):
-            y[j][i] = y_intime[j] / y_count[j] if y_count[j] > 0 else 1
+    prio = result["prio"].to_numpy()
+    intime = result["intime"].fill_null(False).cast(pl.UInt8).to_numpy() > 0
+    y = np.ones((8, len(x)))
+    for j in range(8):
+        count = np.cumsum(prio == j)
+        y_intime = np.cumsum((prio == j) & intime)
+        np.divide(y_intime, count, out=y[j], where=count > 0)
 
     fig, ax = plt.subplots()
     # ax.plot(x, y[0], label="prio 0")
-    ax.plot(x, y[1], label="prio 1")
-    ax.plot(x, y[2], label="prio 2")
+    downsample.plot(ax, x, y[1], label="prio 1")
+    downsample.plot(ax, x, y[2], label="prio 2")
     # ax.plot(x, y[3], label="prio 3")
     # ax.plot(x, y[4], label="prio 4")
     # ax.plot(x, y[5], label="prio 5")
@@ -125,13 +352,18 @@ def draw(result_file_name, trace_file_name):
     ax.set_ylabel("average intime ratio")
     ax.legend()
 
-    plt.savefig(f"{os.path.basename(result_file_name).split('.')[0]}.png")
+    plt.savefig(f"{_result_name(result_file_name)}.png")
 
     result = result.groupby("prio").agg([pl.count(), (pl.col("intime") == True).sum()])
     print(result)
 
 
 def hist(result_file_name, trace_file_name):
+    import matplotlib.pyplot as plt
+    import numpy as np
+
+    import downsample
+
     trace = parse_trace(trace_file_name)
     # print(
     #     trace.groupby("prio").agg(
@@ -151,10 +383,11 @@ def hist(result_file_name, trace_file_name):
     # ax.hist(prio_2, 100, density=True, label="prio 2")
     # ax.set_xlabel("size (bytes)")
     # ax.set_ylabel("density")
-    trace = trace["size"].to_numpy()
+    # keep the DataFrame alive, to_numpy() returns a view of its memory
+    size = trace["size"].to_numpy()
     fig, ax = plt.subplots()
-    # ax.plot(trace)
-    ax.scatter(np.arange(len(trace)), trace)
+    # ax.plot(size)
+    downsample.scatter(ax, np.arange(len(size)), size)
     plt.savefig("trace_size.png")
 
     # result = pl.read_csv(result_file_name)
@@ -178,33 +411,283 @@ def hist(result_file_name, trace_file_name):
     # plt.savefig("result_bct_hist.png")
 
 
+def _add_bins(bins: dict, key: int, counts):
+    import numpy as np
+
+    acc = bins.get(key, np.zeros(0))
+    if len(acc) < len(counts):
+        acc = np.concatenate([acc, np.zeros(len(counts) - len(acc))])
+    acc[: len(counts)] += counts
+    bins[key] = acc
+
+
+def tos(result_file_name, pcap_file_name, bin_size=0.1, offset=0.0, port=None):
+    """
+    # tos
+
+    Bin the captured bytes per ToS class over time and line them up with the
+    per priority block completions of a result file.
+
+        Parameters:
+            result_file_name (str): client result csv, or the list of the
+                shards of the connections of the run.
+            pcap_file_name (str): capture taken during the run.
+            bin_size (float): width of a time bin in seconds.
+            offset (float): start of the result file on the capture timeline
+                in seconds, the first packet is at 0.
+            port (int): only count packets from or to this UDP/TCP port.
+    """
+    import matplotlib.pyplot as plt
+    import numpy as np
+
+    import pcap
+    from dtplib.parse import parse_result
+
+    start = None
+    tos_bytes = {}
+    for chunk in pcap.PcapReader(pcap_file_name):
+        mask = chunk["version"] > 0
+        if port is not None:
+            mask &= (chunk["sport"] == port) | (chunk["dport"] == port)
+        ts = chunk["ts"][mask]
+        if len(ts) == 0:
+            continue
+        if start is None:
+            start = ts[0]
+        idx = np.maximum((ts - start) / bin_size, 0).astype(np.int64)
+        size = chunk["size"][mask]
+        klass = chunk["tos"][mask]
+        for value in np.unique(klass):
+            _add_bins(
+                tos_bytes,
+                int(value),
+                np.bincount(idx[klass == value], weights=size[klass == value]),
+            )
+
+    result = parse_result(result_file_name)
+    t = result["duration"].to_numpy() / 1e6 + offset
+    idx = np.maximum(t / bin_size, 0).astype(np.int64)
+    prio = result["priority"].to_numpy()
+    intime = result["bct"].to_numpy() < result["deadline"].to_numpy()
+    completions = {}
+    intime_completions = {}
+    for value in np.unique(prio):
+        _add_bins(completions, int(value), np.bincount(idx[prio == value]))
+        _add_bins(
+            intime_completions,
+            int(value),
+            np.bincount(idx[(prio == value) & intime]),
+        )
+
+    fig, (ax_tos, ax_block) = plt.subplots(2, 1, sharex=True)
+    for value, acc in sorted(tos_bytes.items()):
+        x = np.arange(len(acc)) * bin_size
+        ax_tos.step(
+            x, acc * 8 / bin_size / 1e6, where="post", label=f"tos {value:#04x}"
+        )
+    for value, acc in sorted(completions.items()):
+        x = np.arange(len(acc)) * bin_size
+        ax_block.step(x, acc, where="post", label=f"prio {value}")
+        ax_block.step(
+            x,
+            np.pad(
+                intime_completions[value],
+                (0, len(acc) - len(intime_completions[value])),
+            ),
+            where="post",
+            linestyle="--",
+            label=f"prio {value} intime",
+        )
+    ax_tos.set_ylabel("throughput (Mbps)")
+    ax_tos.legend()
+    ax_block.set_xlabel("time (s)")
+    ax_block.set_ylabel(f"blocks / {bin_size}s")
+    ax_block.legend()
+    plt.savefig(f"{_result_name(result_file_name)}_tos.png")
+
+    for value, acc in sorted(tos_bytes.items()):
+        print(f"tos {value:#04x} dscp {value >> 2}: {int(acc.sum())} bytes")
+    for value, acc in sorted(completions.items()):
+        print(
+            f"prio {value}: {int(acc.sum())} blocks, {int(intime_completions[value].sum())} intime"
+        )
+
+
+def quantiles(
+    result_file_names, sketch_file_names=None, save_file_name=None, chunk_size=65536
+):
+    """
+    # quantiles
+
+    BCT quantiles (p50, p90, p99, p99.9) per priority of each result file and
+    of all of them together.
+
+    The files are read in chunks into mergeable sketches, so the memory used
+    does not depend on the number of blocks. Sketches saved by `--save` can be
+    merged in again with `--sketch`, e.g. to combine runs done on different
+    machines without copying the result files.
+
+        Parameters:
+            result_file_names (list): result csv files.
+            sketch_file_names (list): sketch json files to merge in.
+            save_file_name (str): save the merged sketches to this json file.
+    """
+    import numpy as np
+
+    import sketch
+
+    merged = sketch.PrioritySketches()
+    runs = []
+    for result_file_name in result_file_names:
+        sketches = sketch.PrioritySketches()
+        with utils.open_input(result_file_name, "r") as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            while True:
+                rows = [row for _, row in zip(range(chunk_size), reader) if row]
+                if not rows:
+                    break
+                bct = np.array([int(row[1]) for row in rows])
+                prio = np.array([int(row[3]) for row in rows])
+                # 1e6 marks blocks that never completed
+                valid = bct < 1000000
+                sketches.add_many(prio[valid], bct[valid])
+        runs.append((result_file_name, sketches))
+        merged.merge(sketches)
+    for sketch_file_name in sketch_file_names or []:
+        sketches = sketch.PrioritySketches.load(sketch_file_name)
+        runs.append((sketch_file_name, sketches))
+        merged.merge(sketches)
+
+    def show(name, sketches):
+        print(name)
+        for prio in sketches.names():
+            s = sketches.get(prio)
+            values = ", ".join(
+                f"{k}={v:.2f}ms" for k, v in s.quantiles(sketch.QUANTILES).items()
+            )
+            print(f"  {prio:>4}: n={len(s)}, mean={s.mean():.2f}ms, {values}")
+
+    for name, sketches in runs:
+        show(name, sketches)
+    if len(runs) > 1:
+        show("merged", merged)
+    if save_file_name is not None:
+        merged.save(save_file_name)
+    return merged
+
+
 parser = argparse.ArgumentParser(description="Analyze result")
 parser.add_argument(
     "command",
     metavar="cmd",
     type=str,
-    choices=["find_unsend", "total_time", "draw", "hist"],
+    choices=[
+        "find_unsend",
+        "total_time",
+        "profile",
+        "draw",
+        "hist",
+        "tos",
+        "quantiles",
+        "bound",
+        "significance",
+    ],
 )
 parser.add_argument(
     "-r",
     "--result_file",
     metavar="result",
     type=str,
-    help="result files to analyze",
+    nargs="+",
+    help="result files to analyze (only quantiles and bound use more than one, "
+    "unless --merge)",
+)
+parser.add_argument(
+    "--merge",
+    action="store_true",
+    help="the result files are the shards of the connections of one run, merged "
+    "by duration (find_unsend, draw, tos, bound)",
 )
 parser.add_argument("-t", "--trace_file", metavar="trace", type=str, help="trace file")
+parser.add_argument("-p", "--pcap_file", metavar="pcap", type=str, help="pcap(ng) file")
+parser.add_argument(
+    "--bin", type=float, help="time bin in seconds (tos, profile)", default=0.1
+)
+parser.add_argument(
+    "--offset",
+    type=float,
+    help="start of the result file on the capture timeline in seconds (tos)",
+    default=0.0,
+)
+parser.add_argument("--port", type=int, help="only count packets of this port (tos)")
+parser.add_argument(
+    "-g",
+    "--group",
+    metavar=("LABEL", "RESULT"),
+    nargs="+",
+    action="append",
+    help="a label and the result files of repeated runs of one configuration, "
+    "the first group is the baseline (significance)",
+)
+parser.add_argument(
+    "--replicates", type=int, default=10000, help="bootstrap replicates (significance)"
+)
+parser.add_argument(
+    "--confidence", type=float, default=0.95, help="confidence level (significance)"
+)
+parser.add_argument(
+    "--percentile", type=float, default=99, help="BCT percentile (significance)"
+)
+parser.add_argument(
+    "--rate",
+    type=float,
+    help="link rate in Mbps of the BCR upper bound and of the reference fluid "
+    "schedulers (bound)",
+)
+parser.add_argument(
+    "--rtt", type=float, help="round trip time in ms (bound)", default=0
+)
+parser.add_argument(
+    "--sketch", type=str, nargs="+", help="saved sketch json files to merge (quantiles)"
+)
+parser.add_argument("--save", type=str, help="save the merged sketches (quantiles)")
 
 if __name__ == "__main__":
     args = parser.parse_args()
+    result_file = args.result_file[0] if args.result_file else None
+    if args.merge and args.result_file:
+        result_file = args.result_file
 
     match args.command:
         case "find_unsend":
-            print(find_unsend(args.result_file, args.trace_file))
+            print(find_unsend(result_file, args.trace_file))
         case "total_time":
             print(total_time(args.trace_file))
+        case "profile":
+            profile(args.trace_file, args.bin)
         case "draw":
-            draw(args.result_file, args.trace_file)
+            draw(result_file, args.trace_file)
         case "hist":
-            hist(args.result_file, args.trace_file)
+            hist(result_file, args.trace_file)
+        case "tos":
+            tos(result_file, args.pcap_file, args.bin, args.offset, args.port)
+        case "bound":
+            bound(
+                args.trace_file,
+                [result_file] if args.merge else args.result_file or [],
+                args.rate,
+                args.rtt,
+            )
+        case "significance":
+            significance(
+                args.group or [],
+                args.trace_file,
+                args.replicates,
+                args.confidence,
+                args.percentile,
+            )
+        case "quantiles":
+            quantiles(args.result_file or [], args.sketch, args.save)
         case _:
             raise Exception("Unknown command")
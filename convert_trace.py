@@ -1,38 +1,101 @@
 # convert trace from output of ffprobe
 #
 # ffprobe -print_format json -show_frames input.mp4 > input.json
+#
+# or convert a trace between the text and the binary (.dtpt) format
 
 import argparse
 import json
 import os
 
+import utils
+from dtplib import tracefile
+
+
+def _output_name(trace_file_name: str, suffix: str) -> str:
+    return os.path.splitext(utils.strip_compression_suffix(trace_file_name))[0] + suffix
 
-def convert_trace(trace_file_name: str):
-    result_trace_name = os.path.join(os.path.splitext(trace_file_name)[0] + ".txt")
-    with open(trace_file_name, "r") as f:
+
+def convert_trace(trace_file_name: str, binary: bool = False):
+    result_trace_name = _output_name(
+        trace_file_name, tracefile.SUFFIX if binary else ".txt"
+    )
+    with utils.open_input(trace_file_name, "r") as f:
         trace = json.load(f)["frames"]
-        with open(result_trace_name, "w") as res:
-            for frame in trace:
-                res.write(
-                    "{} {} {} {}\n".format(
-                        frame["pkt_duration_time"],
-                        500,
-                        frame["pkt_size"],
-                        1 if frame["pict_type"] == "I" else 2,
-                    )
+    if binary:
+        tracefile.write_trace(
+            result_trace_name,
+            [float(frame["pkt_duration_time"]) for frame in trace],
+            [500] * len(trace),
+            [int(frame["pkt_size"]) for frame in trace],
+            [1 if frame["pict_type"] == "I" else 2 for frame in trace],
+        )
+        return
+    with open(result_trace_name, "w") as res:
+        for frame in trace:
+            res.write(
+                "{} {} {} {}\n".format(
+                    frame["pkt_duration_time"],
+                    500,
+                    frame["pkt_size"],
+                    1 if frame["pict_type"] == "I" else 2,
                 )
+            )
+
+
+def to_binary(trace_file_name: str, result_trace_name: str):
+    """
+    Convert a text trace to the binary format. The type of every column is
+    inferred from all of its values, so a column of integers stays integers and
+    floats keep all their digits.
+    """
+    trace = utils.read_csv(
+        trace_file_name,
+        sep=" ",
+        has_header=False,
+        columns=[0, 1, 2, 3],
+        new_columns=tracefile.COLUMNS,
+        infer_schema_length=None,
+    )
+    tracefile.write_trace(
+        result_trace_name, *(trace[name].to_numpy() for name in tracefile.COLUMNS)
+    )
 
 
-parser = argparse.ArgumentParser(description="Convert trace from ffprobe")
+def to_text(trace_file_name: str, result_trace_name: str):
+    """Convert a binary trace to the text format, a chunk of blocks at a time."""
+    from gen_trace import CHUNK_SIZE, write_chunk
+
+    arrays = tracefile.load(trace_file_name)
+    columns = [arrays[name] for name in tracefile.COLUMNS]
+    with open(result_trace_name, "wb") as f:
+        for lo in range(0, len(columns[0]), CHUNK_SIZE):
+            write_chunk(f, *(c[lo : lo + CHUNK_SIZE] for c in columns))
+
+
+parser = argparse.ArgumentParser(
+    description="Convert trace from ffprobe, or between the text and binary format"
+)
 parser.add_argument(
     "traces",
     metavar="FILE",
     type=str,
     nargs="+",
-    help="trace file generated by ffprobe",
+    help="trace file generated by ffprobe (.json), a text trace (converted to "
+    "binary) or a binary trace (converted to text)",
+)
+parser.add_argument(
+    "--binary",
+    action="store_true",
+    help="write the trace of ffprobe in the binary format",
 )
 
 if __name__ == "__main__":
     args = parser.parse_args()
     for trace in args.traces:
-        convert_trace(trace)
+        if tracefile.is_binary_trace(trace):
+            to_text(trace, _output_name(trace, ".txt"))
+        elif utils.strip_compression_suffix(trace).endswith(".json"):
+            convert_trace(trace, args.binary)
+        else:
+            to_binary(trace, _output_name(trace, tracefile.SUFFIX))
@@ -0,0 +1,149 @@
+from typing import Tuple
+
+import numpy as np
+
+# series shorter than this are drawn as they are
+MIN_POINTS = 4096
+
+
+def pixel_width(ax) -> int:
+    """Width of an axes in pixels, the useful resolution of a line in it."""
+    return max(int(ax.bbox.width), 1)
+
+
+def minmax(x: np.ndarray, y: np.ndarray, buckets: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    # minmax
+
+    M4 downsampling: split the series into `buckets` contiguous buckets and
+    keep the first, minimum, maximum and last point of each.
+
+    With about one bucket per pixel column the rasterized line is the same as
+    the one drawn from every point, while at most 4 * buckets points remain.
+    NaN values are kept as gaps.
+
+        Parameters:
+            x (np.ndarray): x values, in drawing order.
+            y (np.ndarray): y values.
+            buckets (int): Number of buckets, usually the pixel width.
+
+        Returns:
+            (np.ndarray, np.ndarray): The selected x and y values.
+    """
+    n = len(y)
+    if n <= max(4 * buckets, MIN_POINTS):
+        return x, y
+
+    size = -(-n // buckets)
+    padded = np.full(size * buckets, np.nan)
+    padded[:n] = y
+    rows = padded.reshape(buckets, size)
+    valid = ~np.isnan(rows)
+    base = np.arange(buckets) * size
+    first = base + np.argmax(valid, axis=1)
+    last = base + size - 1 - np.argmax(valid[:, ::-1], axis=1)
+    lowest = base + np.argmin(np.where(valid, rows, np.inf), axis=1)
+    highest = base + np.argmax(np.where(valid, rows, -np.inf), axis=1)
+
+    idx = np.unique(np.concatenate([first, lowest, highest, last]))
+    idx = idx[idx < n]
+    # keep one NaN per gap so the line is still broken there
+    gaps = np.flatnonzero(np.isnan(y[1:]) & ~np.isnan(y[:-1])) + 1
+    if len(gaps):
+        idx = np.union1d(idx, gaps)
+    return x[idx], y[idx]
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    # lttb
+
+    Largest-Triangle-Three-Buckets downsampling to `n_out` points.
+
+    Keeps the shape of the series better than min-max when the output is
+    meant to be read as a curve rather than rasterized pixel by pixel. NaN
+    points are dropped.
+    """
+    keep = ~(np.isnan(x) | np.isnan(y))
+    x, y = x[keep], y[keep]
+    n = len(x)
+    if n <= max(n_out, MIN_POINTS) or n_out < 3:
+        return x, y
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt_lo, nxt_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        # average of the next bucket is the third vertex of the triangle
+        cx = x[nxt_lo:nxt_hi].mean() if nxt_hi > nxt_lo else x[-1]
+        cy = y[nxt_lo:nxt_hi].mean() if nxt_hi > nxt_lo else y[-1]
+        bx, by = x[lo:hi], y[lo:hi]
+        area = np.abs((x[a] - cx) * (by - y[a]) - (x[a] - bx) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return x[selected], y[selected]
+
+
+def reduce(
+    x: np.ndarray, y: np.ndarray, width: int, method: str = "minmax"
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Downsample a series for an axes `width` pixels wide."""
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=np.float64)
+    match method:
+        case "minmax":
+            return minmax(x, y, width)
+        case "lttb":
+            return lttb(x.astype(np.float64), y, 2 * width)
+        case "none":
+            return x, y
+        case _:
+            raise Exception(f"unknown downsampling method {method}")
+
+
+def plot(ax, x, y, *args, method: str = "minmax", **kwargs):
+    """`ax.plot` with the series reduced to the pixel width of `ax`."""
+    x, y = reduce(x, y, pixel_width(ax), method)
+    return ax.plot(x, y, *args, **kwargs)
+
+
+def density(
+    x: np.ndarray, y: np.ndarray, bins: Tuple[int, int]
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    # density
+
+    Count the points of a scatter plot per 2D bin.
+
+        Returns:
+            (counts, xedges, yedges): counts has shape (len(yedges) - 1,
+            len(xedges) - 1), ready for `pcolormesh`.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    keep = np.isfinite(x) & np.isfinite(y)
+    counts, xedges, yedges = np.histogram2d(x[keep], y[keep], bins=bins)
+    return counts.T, xedges, yedges
+
+
+def scatter(ax, x, y, bins: Tuple[int, int] = None, **kwargs):
+    """
+    `ax.scatter` for small inputs, a binned density image for large ones so
+    the output stays the same size whatever the number of points.
+    """
+    if len(x) <= MIN_POINTS:
+        return ax.scatter(x, y, **kwargs)
+
+    from matplotlib.colors import LogNorm
+
+    if bins is None:
+        bins = (pixel_width(ax) // 2, max(int(ax.bbox.height), 1) // 2)
+    counts, xedges, yedges = density(x, y, bins)
+    counts = np.ma.masked_equal(counts, 0)
+    mesh = ax.pcolormesh(xedges, yedges, counts, norm=LogNorm(), **kwargs)
+    ax.figure.colorbar(mesh, ax=ax, label="count")
+    return mesh
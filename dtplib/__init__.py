@@ -0,0 +1,24 @@
+"""
+# dtplib
+
+Reusable analysis functions of the test scripts, importable from notebooks
+and other scripts:
+
+    from dtplib.stats import get_stats
+    get_stats("data/client_n_n.csv", "data/trace_1300_1ms_1000_seq012.txt")
+
+polars, numpy and matplotlib are only imported by the functions that use
+them, so importing the package (or running one of its light commands, see
+`python -m dtplib --help`) stays fast.
+"""
+
+import importlib
+
+__all__ = ["bootstrap", "bound", "cli", "figures", "parse", "stats", "tracefile"]
+
+
+def __getattr__(name):
+    # `dtplib.stats` etc. without importing every submodule up front
+    if name in __all__:
+        return importlib.import_module(f"{__name__}.{name}")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
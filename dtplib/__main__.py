@@ -0,0 +1,3 @@
+from dtplib.cli import main
+
+main()
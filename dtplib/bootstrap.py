@@ -0,0 +1,281 @@
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from dtplib.parse import parse_result, parse_trace
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+def run_arrays(
+    result_file_name: str, trace_counts: Optional[Dict[int, int]] = None
+) -> dict:
+    """
+    # run_arrays
+
+    The per block arrays of one run needed by `run_metrics`, grouped by
+    priority ("all" for every block).
+
+        Parameters:
+            result_file_name (str): client result csv.
+            trace_counts (dict): number of blocks of each priority in the
+                trace. Blocks missing from the result are counted as not in
+                time. Without it the BCR is relative to the received blocks.
+
+        Returns:
+            dict: {group: (bct, intime, size)} and "duration", the finish time
+            of the run in µs. Missing blocks and blocks that never completed
+            have a NaN BCT.
+    """
+    import numpy as np
+
+    result = parse_result(result_file_name)
+    bct = result["bct"].to_numpy().astype(np.float64)
+    # blocks that never completed (bct 1000000) are not received, and a block
+    # is in time if its BCT is below its deadline, like in liveshow.py
+    bct[bct >= 1000000] = np.nan
+    intime = bct < result["deadline"].to_numpy()
+    size = result["size"].to_numpy().astype(np.float64)
+    prio = result["priority"].to_numpy()
+
+    arrays = {"duration": float(result["duration"].max())}
+    groups = [("all", np.ones(len(prio), dtype=bool))]
+    for p in sorted(set(np.unique(prio).tolist()) | set(trace_counts or {})):
+        groups.append((str(p), prio == p))
+    for name, mask in groups:
+        missing = 0
+        if trace_counts is not None:
+            total = (
+                sum(trace_counts.values())
+                if name == "all"
+                else trace_counts.get(int(name), 0)
+            )
+            missing = max(total - int(mask.sum()), 0)
+        arrays[name] = (
+            np.concatenate([bct[mask], np.full(missing, np.nan)]),
+            np.concatenate([intime[mask], np.zeros(missing, dtype=bool)]),
+            np.concatenate([size[mask], np.zeros(missing)]),
+        )
+    return arrays
+
+
+METRICS = ["bcr", "bct", "pbct", "goodput"]
+
+
+def _metrics(bct, intime, size, duration, percentile):
+    """
+    The metrics of (replicates of) one group of blocks, `bct`, `intime` and
+    `size` have the blocks on the last axis.
+
+    bcr: in time blocks / blocks, bct: average BCT of the received blocks
+    (ms), pbct: `percentile` of their BCT (ms), goodput: in time bytes (Mbps).
+    """
+    import warnings
+
+    import numpy as np
+
+    shape = bct.shape[:-1]
+    if bct.shape[-1] == 0:
+        return np.zeros(shape), *[np.full(shape, np.nan)] * 2, np.zeros(shape)
+    with warnings.catch_warnings():
+        # replicates without any received block
+        warnings.simplefilter("ignore", RuntimeWarning)
+        if np.isnan(bct).any():
+            mean = np.nanmean(bct, axis=-1)
+            pbct = _nanpercentile(bct, percentile)
+        else:
+            mean = bct.mean(axis=-1)
+            pbct = np.percentile(bct, percentile, axis=-1)
+    return (
+        intime.mean(axis=-1),
+        mean,
+        pbct,
+        (size * intime).sum(axis=-1) * 8 / duration,
+    )
+
+
+def _nanpercentile(values, percentile):
+    """
+    np.nanpercentile along the last axis (linear interpolation), much faster
+    for many rows: NaNs are sorted last, so only the rank changes per row.
+    """
+    import numpy as np
+
+    values = np.sort(values, axis=-1)
+    count = (~np.isnan(values)).sum(axis=-1, keepdims=True)
+    rank = np.maximum(count - 1, 0) * percentile / 100
+    lo = np.floor(rank).astype(np.int64)
+    hi = np.minimum(lo + 1, np.maximum(count - 1, 0))
+    low = np.take_along_axis(values, lo, axis=-1)
+    high = np.take_along_axis(values, hi, axis=-1)
+    result = (low + (high - low) * (rank - lo))[..., 0]
+    return np.where(count[..., 0] > 0, result, np.nan)
+
+
+def run_metrics(arrays: dict, percentile: float = 99) -> Dict[Tuple[str, str], float]:
+    """{(group, metric): value} of one run, see METRICS."""
+    metrics = {}
+    for name, value in arrays.items():
+        if name == "duration":
+            continue
+        bct, intime, size = value
+        values = _metrics(bct, intime, size, arrays["duration"], percentile)
+        for metric, v in zip(METRICS, values):
+            metrics[(name, metric)] = float(v)
+    return metrics
+
+
+def bootstrap_runs(
+    values: "np.ndarray", replicates: int, rng: "np.random.Generator"
+) -> "np.ndarray":
+    """
+    # bootstrap_runs
+
+    Bootstrap the mean over runs of every metric at once.
+
+        Parameters:
+            values (np.ndarray): (runs, metrics) matrix.
+            replicates (int): number of bootstrap replicates.
+
+        Returns:
+            np.ndarray: (replicates, metrics) means of resampled runs.
+    """
+    import numpy as np
+
+    runs = values.shape[0]
+    idx = rng.integers(0, runs, size=(replicates, runs))
+    # (replicates, runs, metrics) -> mean over the resampled runs
+    return np.nanmean(values[idx], axis=1)
+
+
+def bootstrap_blocks(
+    arrays: dict,
+    keys: List[Tuple[str, str]],
+    replicates: int,
+    rng: "np.random.Generator",
+    percentile: float = 99,
+    batch_size: int = 1 << 24,
+) -> "np.ndarray":
+    """
+    # bootstrap_blocks
+
+    Bootstrap the metrics of a single run by resampling its blocks, each
+    priority on its own. Used when a configuration has only one run.
+
+    Replicates are drawn in batches of about `batch_size` sampled blocks so
+    memory stays bounded for long runs.
+
+        Returns:
+            np.ndarray: (replicates, len(keys)).
+    """
+    import numpy as np
+
+    out = np.full((replicates, len(keys)), np.nan)
+    for name in {name for name, _ in keys}:
+        bct, intime, size = arrays[name]
+        n = len(bct)
+        batch = max(1, min(replicates, batch_size // max(n, 1)))
+        for lo in range(0, replicates, batch):
+            hi = min(replicates, lo + batch)
+            idx = rng.integers(0, n, size=(hi - lo, n)) if n else None
+            values = _metrics(
+                bct[idx] if n else np.zeros((hi - lo, 0)),
+                intime[idx] if n else np.zeros((hi - lo, 0), dtype=bool),
+                size[idx] if n else np.zeros((hi - lo, 0)),
+                arrays["duration"],
+                percentile,
+            )
+            for metric, v in zip(METRICS, values):
+                if (name, metric) in keys:
+                    out[lo:hi, keys.index((name, metric))] = v
+    return out
+
+
+def interval(samples: "np.ndarray", confidence: float) -> "np.ndarray":
+    """(2, metrics) percentile interval of bootstrap samples."""
+    import numpy as np
+
+    alpha = (1 - confidence) / 2 * 100
+    return np.nanpercentile(samples, [alpha, 100 - alpha], axis=0)
+
+
+def compare(
+    groups: Dict[str, List[str]],
+    trace_file_name: Optional[str] = None,
+    replicates: int = 10000,
+    confidence: float = 0.95,
+    percentile: float = 99,
+    seed: Optional[int] = None,
+) -> dict:
+    """
+    # compare
+
+    Bootstrap confidence intervals of the BCR, average BCT, percentile BCT and
+    goodput of groups of repeated runs, and of the difference of every group
+    to the first one.
+
+    Runs are the resampled unit: the statistic of a group is the mean over its
+    runs and the interval shows the run to run variation. A group with a
+    single run falls back to resampling its blocks.
+
+        Parameters:
+            groups (dict): {label: [result csv, ...]}, the first is the
+                baseline.
+            trace_file_name (str): trace of the runs, so missing blocks count
+                as not in time.
+            replicates (int): number of bootstrap replicates.
+            confidence (float): confidence level of the intervals.
+            percentile (float): percentile of the BCT.
+            seed (int): seed of the random generator.
+
+        Returns:
+            dict: keys, the (group, metric) pairs, and per label the
+            "estimate", "interval" and, except for the baseline, the "diff"
+            estimate, its "diff_interval" and whether it is "significant"
+            (the interval does not contain 0).
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    trace_counts = None
+    if trace_file_name is not None:
+        prio = parse_trace(trace_file_name)["prio"].to_numpy()
+        values, counts = np.unique(prio, return_counts=True)
+        trace_counts = dict(zip(values.tolist(), counts.tolist()))
+
+    runs = {
+        label: [run_arrays(f, trace_counts) for f in files]
+        for label, files in groups.items()
+    }
+    metrics = {
+        label: [run_metrics(arrays, percentile) for arrays in group]
+        for label, group in runs.items()
+    }
+    keys = sorted(
+        {key for group in metrics.values() for m in group for key in m},
+        key=lambda k: (k[0] != "all", k[0], METRICS.index(k[1])),
+    )
+
+    report = {"keys": keys}
+    samples = {}
+    for label, group in metrics.items():
+        values = np.array([[m.get(k, np.nan) for k in keys] for m in group])
+        if len(group) > 1:
+            samples[label] = bootstrap_runs(values, replicates, rng)
+        else:
+            samples[label] = bootstrap_blocks(
+                runs[label][0], keys, replicates, rng, percentile
+            )
+        report[label] = {
+            "runs": len(group),
+            "estimate": np.nanmean(values, axis=0),
+            "interval": interval(samples[label], confidence),
+        }
+
+    baseline = next(iter(groups))
+    for label in list(groups)[1:]:
+        diff = samples[label] - samples[baseline]
+        diff_interval = interval(diff, confidence)
+        report[label]["diff"] = report[label]["estimate"] - report[baseline]["estimate"]
+        report[label]["diff_interval"] = diff_interval
+        report[label]["significant"] = (diff_interval[0] > 0) | (diff_interval[1] < 0)
+    return report
@@ -0,0 +1,269 @@
+import heapq
+import math
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy as np
+    import polars as pl
+
+# schedulers of `ideal`, in the order they are reported
+SCHEDULERS = ["edf", "prio", "fifo"]
+
+
+def fluid_schedule(
+    arrival: "np.ndarray",
+    service: "np.ndarray",
+    deadline: "np.ndarray",
+    order: "np.ndarray",
+    drop: bool = True,
+) -> "np.ndarray":
+    """
+    # fluid_schedule
+
+    Completion times of blocks sent over one link as a fluid: the block first
+    in `order` among the arrived ones is sent at the full rate and preempted as
+    soon as a block before it in `order` arrives.
+
+    With `drop`, a block that cannot finish before its deadline any more is
+    cancelled when it reaches the head of the queue, like DTP does, so it does
+    not waste capacity. Blocks in arrival order (FIFO, or EDF with deadlines in
+    arrival order) are scheduled without a heap.
+
+        Parameters:
+            arrival (np.ndarray): Arrival times in seconds, non decreasing.
+            service (np.ndarray): Time to send each block at the link rate.
+            deadline (np.ndarray): Absolute deadlines in seconds.
+            order (np.ndarray): Block indices sorted by scheduling priority,
+                e.g. `np.argsort(deadline)` for EDF.
+            drop (bool): Cancel blocks that would miss their deadline.
+
+        Returns:
+            np.ndarray: Completion times, inf for cancelled blocks.
+    """
+    import numpy as np
+
+    # Busy periods of FIFO without cancelling (Lindley's recursion). Every
+    # scheduler empties the queue at the end of them as well, so a block alone
+    # in its busy period is simply sent on arrival.
+    sent = np.cumsum(service)
+    end = sent + np.maximum.accumulate(arrival - (sent - service))
+    first = np.ones(len(arrival), dtype=bool)
+    first[1:] = arrival[1:] >= end[:-1]
+    period = np.cumsum(first)
+    alone = np.bincount(period)[period] == 1
+
+    completion = arrival + service
+    if drop:
+        completion[alone & (completion >= deadline)] = math.inf
+    busy = np.flatnonzero(~alone)
+    if len(busy) > 0:
+        order = order[~alone[order]]
+        completion[busy] = _event_loop(
+            arrival[busy],
+            service[busy],
+            deadline[busy],
+            np.searchsorted(busy, order),
+            drop,
+        )
+    return completion
+
+
+def _event_loop(arrival, service, deadline, order, drop):
+    import numpy as np
+
+    n = len(arrival)
+    if np.array_equal(order, np.arange(n)):
+        return _fifo(arrival, service, deadline, drop)
+    rank = np.empty(n, dtype=np.int64)
+    rank[order] = np.arange(n)
+    # python lists are much faster than numpy scalars in the event loop
+    remaining = service.tolist()
+    deadline = deadline.tolist()
+    order = order.tolist()
+    completion = [math.inf] * n
+
+    heap = []
+    push, pop = heapq.heappush, heapq.heappop
+    t = 0.0
+    for a, r in zip(arrival.tolist(), rank.tolist()):
+        # serve the queue until the next arrival
+        while heap and t < a:
+            j = order[heap[0]]
+            f = t + remaining[j]
+            if drop and f >= deadline[j]:
+                pop(heap)
+            elif f <= a:
+                pop(heap)
+                completion[j] = f
+                t = f
+            else:
+                remaining[j] -= a - t
+                t = a
+        if t < a:
+            t = a
+        push(heap, r)
+    while heap:
+        j = order[pop(heap)]
+        f = t + remaining[j]
+        if not (drop and f >= deadline[j]):
+            completion[j] = f
+            t = f
+    return np.array(completion)
+
+
+def _fifo(arrival, service, deadline, drop):
+    """`_event_loop` when blocks are scheduled in arrival order, without a heap."""
+    import numpy as np
+
+    completion = [math.inf] * len(arrival)
+    deadline = deadline.tolist()
+    t = 0.0
+    for i, (a, s) in enumerate(zip(arrival.tolist(), service.tolist())):
+        if t < a:
+            t = a
+        f = t + s
+        if not (drop and f >= deadline[i]):
+            completion[i] = f
+            t = f
+    return np.array(completion)
+
+
+def capacity_bound(
+    arrival: "np.ndarray", service: "np.ndarray", deadline: "np.ndarray"
+) -> "np.ndarray":
+    """
+    # capacity_bound
+
+    Blocks counted in time by an upper bound of the number of blocks any
+    scheduler can complete before their deadline on one link.
+
+    A block in time is sent between its arrival and its deadline. The windows
+    of the blocks that can be in time alone on the link are merged into
+    disjoint intervals; the blocks sent in time in an interval take at most
+    its length of link time, so at most the smallest of them that fit. The
+    count is an upper bound whatever the scheduler, and it decreases with the
+    load, unlike the blocks that are feasible on their own.
+
+        Parameters:
+            arrival (np.ndarray): Arrival times in seconds, non decreasing.
+            service (np.ndarray): Time to send each block at the link rate.
+            deadline (np.ndarray): Absolute deadlines in seconds.
+
+        Returns:
+            np.ndarray: True for the blocks counted by the bound, the
+            smallest ones of each interval.
+    """
+    import numpy as np
+
+    counted = np.zeros(len(arrival), dtype=bool)
+    feasible = np.flatnonzero(arrival + service < deadline)
+    if len(feasible) == 0:
+        return counted
+    arrival = arrival[feasible]
+    service = service[feasible]
+    end = np.maximum.accumulate(deadline[feasible])
+    first = np.ones(len(arrival), dtype=bool)
+    first[1:] = arrival[1:] > end[:-1]
+    interval = np.cumsum(first) - 1
+    length = np.append(end[np.flatnonzero(first)[1:] - 1], end[-1]) - arrival[first]
+
+    # smallest blocks first in every interval
+    order = np.lexsort((service, interval))
+    interval = interval[order]
+    sent = np.cumsum(service[order])
+    begin = np.flatnonzero(np.r_[True, np.diff(interval) > 0])
+    sent -= np.repeat(np.r_[0.0, sent[begin[1:] - 1]], np.diff(np.r_[begin, len(sent)]))
+    counted[feasible[order[sent <= length[interval]]]] = True
+    return counted
+
+
+def ideal(
+    trace: "pl.DataFrame", rate: float, rtt: float = 0.0, drop: bool = True
+) -> "pl.DataFrame":
+    """
+    # ideal
+
+    Deadline feasibility of a trace on a link of `rate` Mbps, per block.
+
+    A block can at best complete `rtt / 2 + size / rate` after it is sent, when
+    it has the link to itself (`min_bct`). `bound` marks the blocks counted
+    by `capacity_bound` among the blocks of the same priority: no scheduler
+    completes more blocks of a priority in time, even if it sends that
+    priority only. A block is in time if its BCT is below its deadline, like
+    in liveshow.py.
+
+    The fluid completion times under EDF, strict priority (lower prio first,
+    EDF inside a priority) and FIFO are reference values, not bounds: they show
+    what simple schedulers achieve with the whole link for themselves, and any
+    of them may do better than the others for some priority.
+
+        Parameters:
+            trace (polars.DataFrame): Trace from `dtplib.parse.parse_trace`.
+            rate (float): Link rate in Mbps.
+            rtt (float): Round trip time in ms, half of it is added to BCTs.
+            drop (bool): Cancel blocks that would miss their deadline.
+
+        Returns:
+            polars.DataFrame: id, prio, min_bct and `<scheduler>_bct` for each
+            of SCHEDULERS, in ms (inf if the block is cancelled), with the
+            `bound` / `<scheduler>_intime` flags.
+    """
+    import numpy as np
+    import polars as pl
+
+    start = trace["start"].to_numpy().astype(np.float64)
+    ddl = trace["ddl"].to_numpy().astype(np.float64)
+    size = trace["size"].to_numpy().astype(np.float64)
+    prio = trace["prio"].to_numpy().astype(np.int64)
+
+    latency = rtt / 2 / 1000
+    service = size * 8 / (rate * 1e6)
+    # in time means bct < ddl, with bct = completion on the link + latency
+    deadline = start + ddl / 1000 - latency
+    min_bct = (latency + service) * 1000
+
+    orders = {
+        "edf": np.lexsort((np.arange(len(start)), deadline)),
+        "prio": np.lexsort((np.arange(len(start)), deadline, prio)),
+        "fifo": np.arange(len(start)),
+    }
+    counted = np.zeros(len(start), dtype=bool)
+    for value in np.unique(prio):
+        mask = np.flatnonzero(prio == value)
+        counted[mask] = capacity_bound(start[mask], service[mask], deadline[mask])
+    columns = {
+        "id": trace["id"],
+        "prio": trace["prio"],
+        "min_bct": min_bct,
+        "bound": counted,
+    }
+    for name in SCHEDULERS:
+        completion = fluid_schedule(start, service, deadline, orders[name], drop)
+        bct = (completion - start + latency) * 1000
+        columns[f"{name}_bct"] = bct
+        columns[f"{name}_intime"] = bct < ddl
+    return pl.DataFrame(columns)
+
+
+def summary(blocks: "pl.DataFrame") -> "pl.DataFrame":
+    """
+    # summary
+
+    Per priority summary of `ideal`: the number of blocks, the upper bound of
+    the BCR (`bound_bcr`) and the BCR of every fluid scheduler. Every average
+    BCT is over the blocks its BCR counts in time, like for a result file:
+    `bound_bct` is the average `min_bct` of the blocks counted by the bound.
+    """
+    import polars as pl
+
+    bound = pl.col("bound")
+    aggs = [
+        pl.count().alias("blocks"),
+        (bound.cast(pl.Float64).mean()).alias("bound_bcr"),
+        pl.col("min_bct").filter(bound).mean().alias("bound_bct"),
+    ]
+    for name in SCHEDULERS:
+        intime = pl.col(f"{name}_intime")
+        aggs.append(intime.cast(pl.Float64).mean().alias(f"{name}_bcr"))
+        aggs.append(pl.col(f"{name}_bct").filter(intime).mean().alias(f"{name}_bct"))
+    return blocks.groupby("prio").agg(aggs).sort("prio")
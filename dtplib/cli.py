@@ -0,0 +1,59 @@
+import os
+import runpy
+import sys
+from typing import List, Optional
+
+# command -> (script module, description)
+COMMANDS = {
+    "analyze": ("analyze", "analyze a result file (find_unsend, total_time, ...)"),
+    "convert_trace": (
+        "convert_trace",
+        "convert ffprobe output into a trace, or a trace text <-> binary",
+    ),
+    "gen_trace": ("gen_trace", "generate a trace from a json config"),
+    "liveshow": ("liveshow", "draw a result file while it is being written"),
+    "liveshow_tunnel": ("liveshow_tunnel", "draw the FEC log of a tunnel"),
+    "log2csv": ("log2csv", "collect client logs into csv files"),
+    "pcap": ("pcap", "decode a pcap(ng) capture"),
+    "replay": ("replay", "replay a trace over UDP on loopback"),
+    "server_log": ("server_log", "convert a server log into csv"),
+    "shards": ("shards", "merge the result shards of many connections"),
+    "store": ("store", "columnar experiment store"),
+    "tunnel_monitor": ("tunnel_monitor", "follow the FEC logs of many tunnels"),
+}
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def usage() -> str:
+    lines = ["usage: python -m dtplib <command> [args...]", "", "commands:"]
+    for name, (_, description) in COMMANDS.items():
+        lines.append(f"  {name:<16}{description}")
+    lines.append("")
+    lines.append("`python -m dtplib <command> -h` shows the arguments of a command.")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None):
+    """
+    # main
+
+    Single entry point of all scripts: `python -m dtplib analyze total_time -t trace.txt`
+    runs `analyze.py total_time -t trace.txt`.
+
+    Only the module of the selected command is imported, and the scripts import
+    polars/numpy/matplotlib inside the commands that need them, so light
+    commands start without loading them.
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ["-h", "--help"]:
+        print(usage())
+        return
+    if argv[0] not in COMMANDS:
+        raise Exception(f"unknown command {argv[0]}\n\n{usage()}")
+
+    module, _ = COMMANDS[argv[0]]
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    sys.argv = [module + ".py"] + argv[1:]
+    runpy.run_module(module, run_name="__main__", alter_sys=True)
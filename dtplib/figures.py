@@ -0,0 +1,226 @@
+from typing import List
+
+from dtplib.parse import parse_result, parse_trace
+from dtplib.stats import get_prio_groups
+
+
+def trace_hist(
+    trace_file_name: str,
+    save: bool = False,
+    save_name: List[str] = ["distribute.svg", "data.svg"],
+):
+    """
+    # trace_hist
+
+    Draw the number of blocks per priority, the sizes of the first blocks and
+    the block size of the whole trace (reduced to the resolution of the
+    figure).
+
+    目前只能绘制只有两个优先级的 trace file
+
+        Parameters:
+            trace_file_name (str): The name of the trace file.
+            save (bool): Save the figures to `save_name`.
+            save_name (list of str): Paths of the figures, the third one is
+                optional.
+    """
+    import matplotlib.pyplot as plt
+
+    import downsample
+
+    trace = parse_trace(trace_file_name)
+    prio_trace = trace.partition_by("prio")
+
+    # block size trend with block num
+    size_trace = trace["size"].to_numpy()
+    fig, ax = plt.subplots()
+    ax.bar(
+        [1],
+        [len(prio_trace[0]["prio"])],
+        color=["black"],
+        width=0.5,
+        label="high priority",
+    )
+    ax.bar(
+        [2],
+        [len(prio_trace[1]["prio"])],
+        color=["grey"],
+        width=0.5,
+        label="low priority",
+    )
+    ax.set_xlabel("priority")
+    ax.set_ylabel("block number")
+    ax.legend(ncol=2, bbox_to_anchor=(0.5, 1), loc="lower center")
+    if save:
+        fig.savefig(save_name[0])
+
+    # distribution of trace
+    fig, ax = plt.subplots()
+    size = 28
+    prio = trace["prio"].head(size).to_list()
+    xarray = [i for i in range(len(prio)) if prio[i] == 1]
+    ax.bar(xarray, size_trace[: len(xarray)], color="black", label="high prioriy")
+    xarray = [i for i in range(len(prio)) if prio[i] == 2]
+    ax.bar(xarray, size_trace[: len(xarray)], color="grey", label="low priority")
+    ax.set_xlabel("block No.")
+    ax.set_ylabel("size (bytes)")
+    ax.set_xlim((0, 25))
+    ax.legend(ncol=2, bbox_to_anchor=(0.5, 1), loc="lower center")
+    if save:
+        fig.savefig(save_name[1])
+
+    # block size of the whole trace, reduced to the resolution of the figure
+    fig, ax = plt.subplots()
+    for prio_frame, color in zip(prio_trace, ["black", "grey"]):
+        downsample.plot(
+            ax,
+            prio_frame["id"].to_numpy(),
+            prio_frame["size"].to_numpy(),
+            ".",
+            color=color,
+            markersize=1,
+            label="prio %d" % prio_frame["prio"][0],
+        )
+    ax.set_xlabel("block No.")
+    ax.set_ylabel("size (bytes)")
+    ax.legend()
+    if save and len(save_name) > 2:
+        fig.savefig(save_name[2])
+
+
+def _draw_pair(values1, values2, label1, label2, ylabel):
+    import matplotlib.pyplot as plt
+    import numpy as np
+
+    labels = ["High Priority", "Low Priority"]
+    x = np.arange(len(labels))  # the label locations
+    width = 0.30  # the width of the bars
+    fig, ax = plt.subplots()
+    ax.bar(x - width / 2, values1, width, label=label1)
+    ax.bar(x + width / 2, values2, width, label=label2)
+    ax.set_ylabel(ylabel)
+    ax.set_xticks(x)
+    ax.set_xticklabels(labels)
+    ax.legend()
+
+
+def draw_in_time_rate(
+    result_file_path1, result_file_path2, trace_file_path, label1="QUIC", label2="DTP"
+):
+    import polars as pl
+
+    trace = parse_trace(trace_file_path)
+    trace_prio1, trace_prio2 = trace.partition_by("prio")
+    bcrs = []
+    for result_file_path in [result_file_path1, result_file_path2]:
+        result = parse_result(result_file_path)
+        result_prio2, result_prio1 = result.partition_by("priority")
+        prio1_bcr = len(result_prio1.filter(pl.col("bct") <= pl.col("deadline"))) / len(
+            trace_prio1
+        )
+        prio2_bcr = len(result_prio2.filter(pl.col("bct") <= pl.col("deadline"))) / len(
+            trace_prio2
+        )
+        bcrs.append([prio1_bcr, prio2_bcr])
+    _draw_pair(bcrs[0], bcrs[1], label1, label2, "Block Completion Rate")
+
+
+def draw_avg_bct(
+    result_file_path1, result_file_path2, trace_file_path, label1="QUIC", label2="DTP"
+):
+    import numpy as np
+
+    bcts = []
+    for result_file_path in [result_file_path1, result_file_path2]:
+        result = parse_result(result_file_path)
+        result_prio2, result_prio1 = result.partition_by("priority")
+        prio1_bct = np.average(result_prio1["bct"].to_numpy())
+        prio2_bct = np.average(result_prio2["bct"].to_numpy())
+        bcts.append([prio1_bct, prio2_bct])
+    _draw_pair(bcts[0], bcts[1], label1, label2, "Average BCT")
+
+
+def draw_cmp_fig(
+    result_file_paths,
+    trace_file_path,
+    labels=[],
+    width=0.2,
+    with_total=True,
+    save=False,
+    save_name=["bcr.svg", "bct.svg"],
+    ylabel=["Block Completion Rate", "Average BCT"],
+):
+    """
+    Draw comparision figures of given result files of BCR and average BCT
+
+    Parameters:
+    - result_file_paths(list of str): a list of result .csv file paths
+    - trace_file_path(str): the path of trace file
+    - labels(list): the xlabel name of each result file, using result_file_path at default
+    - width(float): the width of hist
+    - with_total(bool): traw the figure with the Total statistic hist
+    - save(bool): save the figure with the given path of save_name
+    - save_name(list of str): two paths of to save the figures
+    - ylabel: the ylabel of each figure
+    """
+    import matplotlib.pyplot as plt
+    import numpy as np
+    import polars as pl
+
+    if not trace_file_path:
+        print("no trace file path")
+        return
+    labels = list(labels)
+    while len(labels) < len(result_file_paths):
+        labels.append(result_file_paths[len(labels)])
+    trace = parse_trace(trace_file_path)
+    trace_prios = get_prio_groups(trace, "prio")
+    trace_size = len(trace)
+    bcrs = [[] for r in result_file_paths]
+    bcts = [[] for r in result_file_paths]
+
+    for idx, result_file_path in enumerate(result_file_paths):
+        result = parse_result(result_file_path)
+        result_prios = get_prio_groups(result, "priority")
+
+        result_bcr = bcrs[idx]
+        total_bcr = len(result.filter(pl.col("bct") <= pl.col("deadline"))) / trace_size
+        if with_total:
+            result_bcr.append(total_bcr)
+
+        for i, result_prio in enumerate(result_prios):
+            prio_bcr = len(
+                result_prio.filter(pl.col("bct") <= pl.col("deadline"))
+            ) / len(trace_prios[i])
+            result_bcr.append(prio_bcr)
+
+        result_bct = bcts[idx]
+        total_bct = np.average(result["bct"].to_numpy())
+        if with_total:
+            result_bct.append(total_bct)
+
+        for i, result_prio in enumerate(result_prios):
+            prio_bct = np.average(result_prio["bct"].to_numpy())
+            result_bct.append(prio_bct)
+
+    if with_total:
+        x_labels = ["Total"]
+    else:
+        x_labels = []
+
+    for i in range(len(trace_prios)):
+        x_labels.append("prio %d" % i)
+
+    for values, name, label in zip([bcrs, bcts], save_name, ylabel):
+        x = np.arange(len(x_labels))  # the label locations
+        fig, ax = plt.subplots()
+        for idx, value in enumerate(values):
+            ax.bar(
+                x + width * (idx - len(values) // 2), value, width, label=labels[idx]
+            )
+        ax.set_ylabel(label)
+        ax.set_xticks(x)
+        ax.set_xticklabels(x_labels)
+        ax.legend(ncol=len(x_labels) + 1, bbox_to_anchor=(0.5, 1), loc="lower center")
+        if save:
+            fig.savefig(name)
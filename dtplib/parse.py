@@ -0,0 +1,228 @@
+import re
+from typing import TYPE_CHECKING, List, Optional, Union
+
+import utils
+from dtplib import tracefile
+
+if TYPE_CHECKING:
+    import polars as pl
+
+RESULT_COLUMNS = ["block_id", "bct", "size", "priority", "deadline", "duration"]
+SERVER_LOG_COLUMNS = ["block_id", "start", "complete", "cancelled", "cancelled_passed"]
+FEC_COLUMNS = [
+    "redundancy_rate",
+    "rtt",
+    "pacing_rate",
+    "remaining_time",
+    "predict_loss_rate",
+    "fec",
+]
+
+regex_fec = re.compile(
+    r"""\[INFO\]\ quiche:\ 
+    redundancy\ rate:\ (\d+\.\d+),\ 
+    rtt:\ (\d+\.\d+),\ 
+    pacing_rate:\ (\d+\.\d+),\ 
+    remaining_time:\s*(\d+(\.\d+)?),\ 
+    predict_loss_rate:\ (\d+(\.\d+)?),\ 
+    FEC:\ (\d)\ ([ \w]+)
+    """,
+    re.VERBOSE,
+)
+
+
+def stream_to_block_id(column: str = "block_id"):
+    """Expression mapping a QUIC stream id column to the block id, (x >> 2) - 1."""
+    import polars as pl
+
+    # integer division, a float one loses the low bits of large stream ids
+    return (pl.col(column).cast(pl.Int64) // 4 - 1).alias(column)
+
+
+def parse_fec_line(line: str) -> Optional[List]:
+    """The FEC_COLUMNS of a tunnel log line, None if it is not a FEC line."""
+    if (match := regex_fec.match(line)) is not None:
+        return [
+            float(match.group(1)),
+            float(match.group(2)),
+            float(match.group(3)),
+            float(match.group(4)),
+            float(match.group(6)),
+            int(match.group(8)),
+            # match.group(9),
+        ]
+    return None
+
+
+def parse_trace(trace_file_name: str) -> "pl.DataFrame":
+    """
+    # parse_trace
+
+    Parse a trace file and return a polars DataFrame.
+
+        Parameters:
+            trace_file_name (str): The name of the trace file.
+
+        Returns:
+            polars.DataFrame: id, start, gap, ddl, size, prio, where start is
+            the cumulative sum of gap.
+
+    Format of the trace file:
+        (line number as index) gap ddl size prio
+
+        Example:
+            ```
+            0.1 200 1300 1
+            0.1 200 1300 2
+            ```
+
+        or the binary format of `dtplib.tracefile`, which is memory mapped
+        instead of parsed.
+    """
+    import polars as pl
+
+    if tracefile.is_binary_trace(trace_file_name):
+        return tracefile.trace_frame(trace_file_name)
+    trace = utils.read_csv(
+        trace_file_name,
+        sep=" ",
+        has_header=False,
+        columns=[0, 1, 2, 3],
+        new_columns=["gap", "ddl", "size", "prio"],
+        dtypes=[pl.Float64, pl.Int64, pl.Int64, pl.Int64],
+    )
+    return trace.with_row_count("id").select(
+        [
+            pl.col("id").cast(pl.Int64),
+            pl.col("gap").cumsum().alias("start"),
+            "gap",
+            "ddl",
+            "size",
+            "prio",
+        ]
+    )
+
+
+def parse_server_log(server_log_file_name: Union[str, List[str]]) -> "pl.DataFrame":
+    """
+    # parse_server_log
+
+    Parse a server log file and return a polars DataFrame.
+
+        Parameters:
+            server_log_file_name (str): The name of the server log file, or
+                the list of the logs of the connections of a run, merged with
+                a conn column (see shards.py).
+
+        Returns:
+            polars.DataFrame: The parsed server log.
+
+    Format of the server log file:
+        CSV file with following columns:
+        - block_id
+        - start
+        - complete
+        - cancelled
+        - cancelled_passed
+    """
+    import polars as pl
+
+    import shards
+
+    try:
+        if not isinstance(server_log_file_name, str):
+            server_log = shards.read_merged(server_log_file_name, shards.SERVER_LOG_KEY)
+        else:
+            server_log = utils.read_csv(server_log_file_name)
+        return server_log.with_column(stream_to_block_id())
+    except:
+        columns = SERVER_LOG_COLUMNS
+        if not isinstance(server_log_file_name, str):
+            columns = columns + [shards.CONN_COLUMN]
+        return pl.DataFrame(None, columns)
+
+
+def parse_result(result_file_name: Union[str, List[str]]) -> "pl.DataFrame":
+    """
+    # parse_result
+
+    Parse a result file and return a polars DataFrame.
+
+        Parameters:
+            result_file_name (str): The name of the result file, or the list
+                of the results of the connections of a run, merged by duration
+                with a conn column (see shards.py).
+
+        Returns:
+            polars.DataFrame: The parsed result.
+
+    Format of the result file:
+        CSV file with following columns:
+        - block_id
+        - bct
+        - size
+        - priority
+        - deadline
+        - duration
+    """
+    import polars as pl
+
+    import shards
+
+    try:
+        if not isinstance(result_file_name, str):
+            result = shards.read_merged(result_file_name, shards.RESULT_KEY)
+        else:
+            result = utils.read_csv(result_file_name)
+        return result.with_column(stream_to_block_id())
+    except:
+        columns = RESULT_COLUMNS
+        if not isinstance(result_file_name, str):
+            columns = columns + [shards.CONN_COLUMN]
+        return pl.DataFrame(None, columns)
+
+
+def read_trace_chunks(trace_file_name: str, chunk_size: int = 1 << 24):
+    """
+    # read_trace_chunks
+
+    Read a trace file in chunks of about `chunk_size` bytes, so traces of any
+    size can be scanned in constant memory.
+
+        Yields:
+            (gap, ddl, size, prio): numpy arrays of the blocks of one chunk,
+            gap as float64 and the others as int64.
+    """
+    if tracefile.is_binary_trace(trace_file_name):
+        yield from tracefile.read_chunks(trace_file_name, chunk_size)
+        return
+    rest = b""
+    with utils.open_input(trace_file_name, "rb") as f:
+        while True:
+            data = f.read(chunk_size)
+            if not data:
+                break
+            data = rest + data
+            cut = data.rfind(b"\n") + 1
+            if cut == 0:
+                rest = data
+                continue
+            data, rest = data[:cut], data[cut:]
+            yield _parse_trace_text(data)
+        if rest.strip():
+            yield _parse_trace_text(rest)
+
+
+def _parse_trace_text(data: bytes):
+    import numpy as np
+
+    values = np.fromstring(data.decode(), sep=" ")
+    if len(values) % 4 != 0:
+        raise Exception("trace lines must have 4 columns: gap ddl size prio")
+    values = values.reshape(-1, 4)
+    return (
+        values[:, 0],
+        values[:, 1].astype(np.int64),
+        values[:, 2].astype(np.int64),
+        values[:, 3].astype(np.int64),
+    )
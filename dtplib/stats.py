@@ -0,0 +1,118 @@
+from typing import List
+
+from dtplib.parse import parse_result, parse_trace
+
+
+def get_prio_groups(df, prio_col_name: str) -> list:
+    """
+    Group trace rows by their priorities.
+
+    Results are like:
+
+    [DataFrame(priority 1), Dataframe(priority2), ...]
+    """
+    prio_list = df.partition_by(prio_col_name)
+    # sort
+    prio_list.sort(key=lambda x: x[prio_col_name][0])
+    return prio_list
+
+
+def get_stats(result_file_path: str, trace_file_path: str):
+    """
+    Print some basic stats like Throughput, block completion time (BCT) and block completion rate (BCR)
+    """
+    import numpy as np
+    import polars as pl
+
+    print("===============================")
+    print("stats of %s" % result_file_path)
+    trace = parse_trace(trace_file_path)
+    trace_prios = get_prio_groups(trace, "prio")
+
+    all_bytes = np.sum(trace["size"].to_numpy())
+    all_time = trace["start"][-1] + trace["ddl"][-1] * 1e-3
+    ideal_throughput = all_bytes / all_time
+    result = parse_result(result_file_path)
+    in_time = result.filter(pl.col("bct") <= pl.col("deadline"))
+    good_bytes = np.sum(in_time["size"].to_numpy())
+    total_bytes = np.sum(result["size"].to_numpy())
+    finish_time = result["duration"][-1]  # micro
+    throughput = total_bytes * 8 / finish_time  # Mbps
+    goodput = good_bytes * 8 / finish_time  # Mbps
+    avg_bct = np.average(result["bct"].to_numpy())  # ms
+    avg_bcr = 0
+
+    prio_result = get_prio_groups(result, "priority")
+
+    for idx, prio_frame in enumerate(prio_result):
+        print("------------")
+        avg_prio_bct = np.average(prio_frame["bct"].to_numpy())  # ms
+        prio_bcr = len(prio_frame.filter(pl.col("bct") <= pl.col("deadline"))) / len(
+            trace_prios[idx]
+        )
+        print("prio", prio_frame["priority"][0], "avg_bct", avg_prio_bct)
+        print("prio", prio_frame["priority"][0], "avg_bcr", prio_bcr)
+        avg_bcr += prio_bcr
+    avg_bcr /= len(trace_prios)
+    print("-------------------------")
+    print("ideal throughput: ", ideal_throughput, "Mbps")
+    print("throughput:", throughput, "Mbps")
+    print("goodput: ", goodput, "Mbps")
+    print("avg_bcr(block completion rate):", avg_bcr)
+    print("avg_bct(block completion time):", avg_bct)
+
+
+def get_table_stats(result_file_paths: List[str], labels: List[str] = []):
+    """
+    Print some basic stats like Throughput, block completion time (BCT) and block completion rate (BCR)
+    in a table-like format
+
+    Parameters:
+    - result_file_paths: a list of result .csv file paths
+    - labels: the label name of each result file, using result_file_path at default
+    """
+    import numpy as np
+    import polars as pl
+
+    print("stats of %s" % str(result_file_paths))
+    labels = list(labels)
+    while len(labels) < len(result_file_paths):
+        labels.append(result_file_paths[len(labels)])
+    result_throughput = []
+    result_goodput = []
+    result_avg_bct = []
+    result_prio1_bct = []
+    result_prio2_bct = []
+    for result_file_path in result_file_paths:
+        result = parse_result(result_file_path)
+        in_time = result.filter(pl.col("bct") <= pl.col("deadline"))
+        good_bytes = np.sum(in_time["size"].to_numpy())
+        total_bytes = np.sum(result["size"].to_numpy())
+        finish_time = result["duration"][-1]  # micro
+        throughput = total_bytes * 8 / finish_time  # Mbps
+        goodput = good_bytes * 8 / finish_time  # Mbps
+        avg_bct = np.average(result["bct"].to_numpy())  # ms
+
+        result_throughput.append(throughput)
+        result_goodput.append(goodput)
+        result_avg_bct.append(avg_bct)
+
+        prio_result = result.partition_by("priority")
+        for prio_frame in prio_result:
+            avg_prio_bct = np.average(prio_frame["bct"].to_numpy())  # ms
+            if prio_frame["priority"][0] == 1:
+                result_prio1_bct.append(avg_prio_bct)
+            elif prio_frame["priority"][0] == 2:
+                result_prio2_bct.append(avg_prio_bct)
+            else:
+                print("priority %d is not expected" % (prio_frame["priority"][0]))
+
+    def row(name, values, fmt):
+        print("| %s | %s |" % (name, " | ".join(fmt % x for x in values)))
+
+    print("|\t| %s |" % (" | ".join(labels)))
+    row("Throughput (Mbps)", result_throughput, "%0.2f")
+    row("Goodput (Mbps)", result_goodput, "%0.2f")
+    row("平均块完成时间 (ms)", map(int, result_avg_bct), "%d")
+    row("高优先级块平均完成时间 (ms)", map(int, result_prio1_bct), "%d")
+    row("低优先级块平均完成时间 (ms)", map(int, result_prio2_bct), "%d")
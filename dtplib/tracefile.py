@@ -0,0 +1,282 @@
+import mmap
+import struct
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+import utils
+
+if TYPE_CHECKING:
+    import numpy as np
+    import polars as pl
+
+# Binary trace format, version 1 (all little endian):
+#
+#   header  magic "DTPTRACE", version (u16), number of columns (u16),
+#           header size (u32), number of blocks (u64)
+#   columns one entry per column: name (16 bytes), numpy dtype such as "<f8"
+#           (8 bytes), offset of the column from the start of the file (u64)
+#   data    every column as one contiguous array, aligned to ALIGN bytes
+#
+# The columns are gap ddl size prio like the text format, each with the dtype
+# of its values, so a trace converts to text and back without loss.
+MAGIC = b"DTPTRACE"
+VERSION = 1
+ALIGN = 64
+SUFFIX = ".dtpt"
+COLUMNS = ["gap", "ddl", "size", "prio"]
+HEADER = struct.Struct("<8sHHIQ")
+COLUMN = struct.Struct("<16s8sQ")
+
+
+def _align(n: int) -> int:
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+def is_binary_name(trace_file_name: str) -> bool:
+    """Whether a trace should be written in the binary format, by its suffix."""
+    return utils.strip_compression_suffix(trace_file_name).endswith(SUFFIX)
+
+
+def is_binary_trace(trace_file_name: str) -> bool:
+    """Whether a trace file is in the binary format, by its first bytes."""
+    with utils.open_input(trace_file_name, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def _unpack_header(data) -> Tuple[int, int, int]:
+    """(number of columns, header size, number of blocks) of a binary trace."""
+    if len(data) < HEADER.size:
+        raise Exception("binary trace is truncated")
+    magic, version, ncols, header_size, count = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise Exception("not a binary trace")
+    if version > VERSION:
+        raise Exception(
+            f"binary trace version {version} is newer than the supported {VERSION}"
+        )
+    return ncols, header_size, count
+
+
+def _read_header(data) -> Tuple[int, List[Tuple[str, str, int]]]:
+    """(number of blocks, [(name, dtype, offset), ...]) of a binary trace."""
+    ncols, header_size, count = _unpack_header(data)
+    if len(data) < header_size:
+        raise Exception("binary trace is truncated")
+    columns = []
+    for i in range(ncols):
+        name, dtype, offset = COLUMN.unpack_from(data, HEADER.size + i * COLUMN.size)
+        columns.append(
+            (name.rstrip(b"\0").decode(), dtype.rstrip(b"\0").decode(), offset)
+        )
+    return count, columns
+
+
+def block_count(trace_file_name: str) -> int:
+    """Number of blocks of a text or binary trace, without reading the blocks."""
+    if not is_binary_trace(trace_file_name):
+        return utils.count_newlines(trace_file_name)
+    with utils.open_input(trace_file_name, "rb") as f:
+        head = f.read(HEADER.size)
+    return _unpack_header(head)[2]
+
+
+def load(trace_file_name: str) -> Dict[str, "np.ndarray"]:
+    """
+    # load
+
+    The columns of a binary trace as numpy arrays.
+
+    A plain file is memory mapped and the arrays are read only views of the
+    mapping, nothing is parsed or copied and the pages are only read when
+    used. A compressed file is decompressed into memory first.
+
+        Returns:
+            dict: {column: array}, see COLUMNS.
+    """
+    import numpy as np
+
+    path = utils.find_input(trace_file_name)
+    if utils.detect_compression(path) is None:
+        with open(path, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    else:
+        with utils.open_input(path, "rb") as f:
+            data = f.read()
+    count, columns = _read_header(data)
+    arrays = {}
+    for name, dtype, offset in columns:
+        dtype = np.dtype(dtype)
+        if offset + count * dtype.itemsize > len(data):
+            raise Exception(f"binary trace is truncated in column {name}")
+        arrays[name] = np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+    missing = [name for name in COLUMNS if name not in arrays]
+    if missing:
+        raise Exception(f"binary trace misses the columns {missing}")
+    return arrays
+
+
+def trace_frame(trace_file_name: str) -> "pl.DataFrame":
+    """
+    The DataFrame of `dtplib.parse.parse_trace` of a binary trace: id, start,
+    gap, ddl, size, prio. Integer columns are Int64 and the others Float64
+    like for a text trace; polars copies the mapped columns once, but nothing
+    is parsed.
+    """
+    import numpy as np
+    import polars as pl
+
+    arrays = load(trace_file_name)
+    series = []
+    for name in COLUMNS:
+        values = arrays[name]
+        if name == "gap" or values.dtype.kind == "f":
+            values = values.astype(np.float64, copy=False)
+        else:
+            values = values.astype(np.int64, copy=False)
+        series.append(pl.Series(name, values))
+    return (
+        pl.DataFrame(series)
+        .with_row_count("id")
+        .select(
+            [
+                pl.col("id").cast(pl.Int64),
+                pl.col("gap").cumsum().alias("start"),
+                "gap",
+                "ddl",
+                "size",
+                "prio",
+            ]
+        )
+    )
+
+
+def read_chunks(trace_file_name: str, chunk_size: int = 1 << 24):
+    """`dtplib.parse.read_trace_chunks` of a binary trace."""
+    import numpy as np
+
+    arrays = load(trace_file_name)
+    columns = [arrays[name] for name in COLUMNS]
+    step = max(1, chunk_size // sum(c.itemsize for c in columns))
+    for lo in range(0, len(columns[0]), step):
+        gap, ddl, size, prio = (c[lo : lo + step] for c in columns)
+        yield (
+            gap.astype(np.float64),
+            ddl.astype(np.int64),
+            size.astype(np.int64),
+            prio.astype(np.int64),
+        )
+
+
+def column_dtype(values: "np.ndarray", least: str = "<i1") -> str:
+    """
+    Smallest dtype that holds `values` exactly: "<f8" for floats, else the
+    smallest signed integer, at least `least`.
+    """
+    import numpy as np
+
+    if values.dtype.kind == "f":
+        return "<f8"
+    if values.dtype.kind not in "iub":
+        raise Exception(f"cannot store {values.dtype} in a binary trace")
+    lo, hi = (int(values.min()), int(values.max())) if len(values) else (0, 0)
+    for dtype in ["<i1", "<i2", "<i4", "<i8"]:
+        info = np.iinfo(dtype)
+        if np.dtype(dtype).itemsize >= np.dtype(least).itemsize and (
+            info.min <= lo and hi <= info.max
+        ):
+            return dtype
+    raise Exception(f"values up to {hi} do not fit in a binary trace")
+
+
+class TraceWriter:
+    """
+    # TraceWriter
+
+    Writes a binary trace of `count` blocks chunk by chunk, each column of a
+    chunk goes to its place in the file.
+
+    The dtype of a column is given in `dtypes` or chosen from its first chunk
+    (see `column_dtype`, integers take at least 4 bytes so later chunks still
+    fit). A chunk that does not fit the dtype raises an Exception instead of
+    losing precision.
+
+        Parameters:
+            trace_file_name (str): The binary trace to write.
+            count (int): Number of blocks of the trace.
+            dtypes (dict): {column: dtype}, optional.
+    """
+
+    def __init__(
+        self,
+        trace_file_name: str,
+        count: int,
+        dtypes: Optional[Dict[str, str]] = None,
+    ):
+        self.file = open(trace_file_name, "wb")
+        self.count = count
+        self.dtypes = dict(dtypes or {})
+        self.offsets = None
+        self.written = 0
+
+    def _layout(self):
+        import numpy as np
+
+        offset = _align(HEADER.size + len(COLUMNS) * COLUMN.size)
+        header = HEADER.pack(MAGIC, VERSION, len(COLUMNS), offset, self.count)
+        self.offsets = {}
+        for name in COLUMNS:
+            header += COLUMN.pack(name.encode(), self.dtypes[name].encode(), offset)
+            self.offsets[name] = offset
+            offset = _align(offset + self.count * np.dtype(self.dtypes[name]).itemsize)
+        self.file.write(header)
+        self.file.truncate(offset)
+
+    def write(self, gap, ddl, size, prio):
+        """Append the blocks of one chunk."""
+        import numpy as np
+
+        chunk = dict(zip(COLUMNS, (np.asarray(c) for c in (gap, ddl, size, prio))))
+        n = len(chunk["gap"])
+        if self.written + n > self.count:
+            raise Exception(f"binary trace has room for {self.count} blocks only")
+        if self.offsets is None:
+            for name, values in chunk.items():
+                self.dtypes.setdefault(name, column_dtype(values, "<i4"))
+            self._layout()
+        for name, values in chunk.items():
+            dtype = np.dtype(self.dtypes[name])
+            data = values.astype(dtype)
+            if data.dtype != values.dtype and not np.array_equal(data, values):
+                raise Exception(f"column {name} does not fit in {dtype.str}")
+            self.file.seek(self.offsets[name] + self.written * dtype.itemsize)
+            self.file.write(data.tobytes())
+        self.written += n
+
+    def close(self):
+        if self.offsets is None:
+            for name in COLUMNS:
+                self.dtypes.setdefault(name, "<f8" if name == "gap" else "<i4")
+            self._layout()
+        self.file.close()
+        if self.written != self.count:
+            raise Exception(
+                f"binary trace expects {self.count} blocks, {self.written} written"
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.file.close()
+
+
+def write_trace(trace_file_name: str, gap, ddl, size, prio):
+    """Write whole columns as a binary trace, each with its smallest exact dtype."""
+    import numpy as np
+
+    columns = [np.asarray(c) for c in (gap, ddl, size, prio)]
+    dtypes = {name: column_dtype(c) for name, c in zip(COLUMNS, columns)}
+    with TraceWriter(trace_file_name, len(columns[0]), dtypes) as writer:
+        writer.write(*columns)
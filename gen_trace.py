@@ -1,11 +1,17 @@
 import argparse
+import io
+import itertools
 import json
 import os
-from typing import List, Dict
+from typing import List, Dict, Optional
 import numpy as np
 
+from dtplib import tracefile
+
 MAX_BLOCK_SIZE = 10000000
 MAX_DGRAM_SIZE = 1350
+# blocks generated and written at a time
+CHUNK_SIZE = 1 << 20
 
 
 def parse_config(config_file: str):
@@ -15,6 +21,10 @@ def parse_config(config_file: str):
 
 def generate_random(random_config, size):
     rng = np.random.default_rng(random_config["seed"])
+    return draw_random(rng, random_config, size)
+
+
+def draw_random(rng: np.random.Generator, random_config, size):
     match random_config["distribution"]:
         case "integers":
             return rng.integers(low=0, high=random_config["max"], size=size)
@@ -48,59 +58,380 @@ def generate_random(random_config, size):
             )
 
 
-def generate_trace(config):
-    # block_size = min(int(config["block_size"]), MAX_BLOCK_SIZE)
-    # if block_size <= 0:
-    #     block_size = 1350
-    block_num = int(config["block_num"])
-    # block_gap = 0.001
-    # if config.get("block_gap"):
-    #     block_gap = float(config["block_gap"])
+def _streams(seed, n: int) -> List[np.random.Generator]:
+    """
+    Independent random streams of one generator. Every stream is only used
+    for one kind of draw, so the values do not depend on the chunk size.
+    """
+    return [np.random.default_rng([seed, i]) for i in range(n)]
 
-    block_size = None
-    block_gap = None
-    block_prio = None
-    block_ddl = None
 
-    match config["block_size"]:
-        case {"type": "random", "random": r}:
-            block_size = generate_random(r, block_num)
-        case {"type": "seq", "seq": s}:
-            block_size = [s[i % len(s)] for i in range(block_num)]
-        case _:
-            block_size = np.full(block_num, int(config["block_size"]))
+def _gaps(rng: np.random.Generator, distribution: str, mean, size: int):
+    match distribution:
+        case "constant":
+            return np.broadcast_to(np.asarray(mean, dtype=np.float64), size).copy()
+        case "exponential":
+            return rng.standard_exponential(size) * mean
+    raise Exception(f"unknown gap distribution {distribution}")
 
-    match config["block_gap"]:
-        case {"type": "random", "random": r}:
-            block_gap = generate_random(r, block_num)
-        case {"type": "seq", "seq": s}:
-            block_gap = [s[i % len(s)] for i in range(block_num)]
-        case _:
-            block_gap = np.full(block_num, float(config["block_gap"]))
 
-    match config["block_prio"]:
-        case {"type": "random", "random": r}:
-            block_prio = generate_random(r, block_num)
-        case {"type": "seq", "seq": s}:
-            block_prio = [s[i % len(s)] for i in range(block_num)]
-        case _:
-            block_prio = np.full(block_num, int(config["block_prio"]))
+def generate_onoff(config, sizes: List[int]):
+    """
+    # generate_onoff
+
+    On/off arrivals (block_gap): bursts of on average `on` blocks sent `gap`
+    seconds apart ("constant" or "exponential" `distribution`), separated by
+    silent periods of on average `off` seconds. Burst lengths are geometric
+    and silences exponential, i.e. a two state Markov chain.
+
+        Yields:
+            np.ndarray: gaps of each chunk of `sizes` blocks.
+    """
+    burst, silence, jitter = _streams(config["seed"], 3)
+    distribution = config.get("distribution", "constant")
+    for n in sizes:
+        gap = _gaps(jitter, distribution, config["gap"], n)
+        first = burst.random(n) < 1 / config["on"]
+        gap[first] += silence.exponential(config["off"], np.count_nonzero(first))
+        yield gap
+
+
+def generate_markov(config, sizes: List[int]):
+    """
+    # generate_markov
+
+    Markov-modulated arrivals (block_gap). Each of `states` sends on average
+    `blocks` blocks (geometric) with a mean gap of `gap` seconds, then the
+    chain moves to another state, drawn from the row of `transition` (the
+    next state in order by default). A state without any other state to move
+    to (e.g. the only one) is kept. The state sequence is built run by run,
+    the gaps of a chunk at once.
+
+        Example:
+            {
+              "seed": 1,
+              "distribution": "exponential",
+              "states": [{"gap": 0.001, "blocks": 500}, {"gap": 0.02, "blocks": 50}],
+              "transition": [[0, 1], [1, 0]]
+            }
+
+        Yields:
+            np.ndarray: gaps of each chunk of `sizes` blocks.
+    """
+    sojourn, jump, jitter = _streams(config["seed"], 3)
+    states = config["states"]
+    mean_gap = np.array([s["gap"] for s in states], dtype=np.float64)
+    # probability to leave the state after each block
+    leave = [1 / max(s["blocks"], 1) for s in states]
+    cycle = np.roll(np.eye(len(states)), 1, axis=1)
+    transition = np.array(config.get("transition", cycle), dtype=np.float64)
+    np.fill_diagonal(transition, 0)
+    # nowhere else to go: stay, instead of dividing by 0
+    stay = np.flatnonzero(transition.sum(axis=1) == 0)
+    transition[stay, stay] = 1
+    cumulative = np.cumsum(transition / transition.sum(axis=1, keepdims=True), axis=1)
+    distribution = config.get("distribution", "constant")
+
+    state = config.get("initial", 0)
+    remaining = 0
+    for n in sizes:
+        index = np.empty(n, dtype=np.int64)
+        filled = 0
+        while filled < n:
+            if remaining == 0:
+                remaining = int(sojourn.geometric(leave[state]))
+            k = min(remaining, n - filled)
+            index[filled : filled + k] = state
+            filled += k
+            remaining -= k
+            if remaining == 0:
+                state = int(
+                    np.searchsorted(cumulative[state], jump.random(), side="right")
+                )
+        yield _gaps(jitter, distribution, mean_gap[index], n)
+
+
+FRAME_TYPES = ["I", "P", "B"]
+
+
+def _frame_types(config, offset: int, n: int):
+    """Index in FRAME_TYPES of the frames offset..offset+n of a GOP video."""
+    k = (offset + np.arange(n)) % config.get("gop", 30)
+    frame = np.full(n, 2)
+    frame[k % (config.get("b_frames", 2) + 1) == 0] = 1
+    frame[k == 0] = 0
+    return frame
+
+
+def generate_gop(config, name: str, sizes: List[int]):
+    """
+    # generate_gop
+
+    GOP structured video, one block per frame. Every GOP of `gop` frames
+    starts with an I frame, followed by P frames with `b_frames` B frames
+    between them. The same config can be used for block_gap (1 / `fps`),
+    block_size and block_prio, the frame types line up.
+
+    The bytes of a GOP (`bitrate` bps over gop / fps seconds) are split
+    between its frames by the `weights` of their types, each frame is then
+    scaled by a lognormal factor of mean 1 and shape `sigma`. `prio` gives
+    the priority of each type, by default I frames are high priority (1) and
+    P / B frames low priority (2) like in convert_trace.py.
+
+        Example:
+            {
+              "seed": 1, "gop": 30, "b_frames": 2, "fps": 30, "bitrate": 4e6,
+              "weights": {"I": 8, "P": 3, "B": 1},
+              "prio": {"I": 1, "P": 2, "B": 2},
+              "sigma": 0.2
+            }
 
-    match config["block_ddl"]:
+        Yields:
+            np.ndarray: values of each chunk of `sizes` blocks.
+    """
+    (noise,) = _streams(config["seed"], 1)
+    fps = config.get("fps", 30)
+    gop = config.get("gop", 30)
+    weights = {"I": 8, "P": 3, "B": 1, **config.get("weights", {})}
+    prio = {"I": 1, "P": 2, "B": 2, **config.get("prio", {})}
+    weight = np.array([weights[t] for t in FRAME_TYPES], dtype=np.float64)
+    counts = np.bincount(_frame_types(config, 0, gop), minlength=len(FRAME_TYPES))
+    mean_size = config["bitrate"] / 8 * gop / fps * weight / np.dot(counts, weight)
+    sigma = config.get("sigma", 0.2)
+
+    offset = 0
+    for n in sizes:
+        frame = _frame_types(config, offset, n)
+        offset += n
+        match name:
+            case "block_gap":
+                yield np.full(n, 1 / fps)
+            case "block_prio":
+                yield np.array([prio[t] for t in FRAME_TYPES])[frame]
+            case "block_size":
+                scale = np.exp(sigma * noise.standard_normal(n) - sigma**2 / 2)
+                yield np.maximum(np.rint(mean_size[frame] * scale), 1).astype(np.int64)
+            case _:
+                raise Exception(f"gop does not generate {name}")
+
+
+# column of a trace -> key of the column in a class of `generate_classes`
+CLASS_KEYS = {
+    "block_gap": "gap",
+    "block_ddl": "ddl",
+    "block_size": "size",
+    "block_prio": "prio",
+}
+
+
+def generate_classes(config, name: str, sizes: List[int]):
+    """
+    # generate_classes
+
+    Correlated columns: every block belongs to one of `classes`, drawn with
+    their `probability`, and takes the gap, ddl, size and prio of its class.
+    The size is scaled by a lognormal factor of mean 1 and shape `sigma` of
+    the class. Columns generated from the same config get the same classes.
+
+        Example:
+            {
+              "seed": 1,
+              "classes": [
+                {"probability": 0.9, "prio": 1, "size": 1300, "sigma": 0.1},
+                {"probability": 0.1, "prio": 2, "size": 1000000, "sigma": 0.5}
+              ]
+            }
+
+        Yields:
+            np.ndarray: values of each chunk of `sizes` blocks.
+    """
+    choice, noise = _streams(config["seed"], 2)
+    classes = config["classes"]
+    key = CLASS_KEYS[name]
+    probability = np.array([c["probability"] for c in classes], dtype=np.float64)
+    cumulative = np.cumsum(probability / probability.sum())
+    values = np.array([c[key] for c in classes])
+    sigma = np.array([c.get("sigma", 0) for c in classes], dtype=np.float64)
+    for n in sizes:
+        index = np.minimum(
+            np.searchsorted(cumulative, choice.random(n), side="right"),
+            len(classes) - 1,
+        )
+        if name == "block_size":
+            s = sigma[index]
+            scale = np.exp(s * noise.standard_normal(n) - s**2 / 2)
+            yield np.maximum(np.rint(values[index] * scale), 1).astype(np.int64)
+        else:
+            yield values[index]
+
+
+# values used when a column is missing from the config
+DEFAULTS = {"block_gap": 0.001, "block_ddl": 200, "block_size": 1350, "block_prio": 0}
+
+
+def generate_column(spec, name: str, sizes: List[int]):
+    """Yield the values of one column of the trace in chunks of `sizes` blocks."""
+    match spec:
         case {"type": "random", "random": r}:
-            block_ddl = generate_random(r, block_num)
+            rng = np.random.default_rng(r["seed"])
+            for n in sizes:
+                yield draw_random(rng, r, n)
         case {"type": "seq", "seq": s}:
-            block_ddl = [s[i % len(s)] for i in range(block_num)]
+            # ints and floats mixed: keep the python values, an int is
+            # written as an int like before
+            mixed = len({type(v) for v in s}) > 1
+            s = np.array(s, dtype=object if mixed else None)
+            offset = 0
+            for n in sizes:
+                yield s[(offset + np.arange(n)) % len(s)]
+                offset += n
+        case {"type": "onoff", "onoff": c}:
+            yield from generate_onoff(c, sizes)
+        case {"type": "markov", "markov": c}:
+            yield from generate_markov(c, sizes)
+        case {"type": "gop", "gop": c}:
+            yield from generate_gop(c, name, sizes)
+        case {"type": "classes", "classes": c}:
+            yield from generate_classes(c, name, sizes)
         case _:
-            block_ddl = np.full(block_num, int(config["block_ddl"]))
-
-    with open(config["trace_file_name"], "w") as f:
-        for i in range(block_num):
-            block_size_i = block_size[i] if block_size is not None else 1350
-            block_gap_i = block_gap[i] if block_gap is not None else 0.001
-            block_prio_i = block_prio[i] if block_prio is not None else 0
-            block_ddl_i = block_ddl[i] if block_ddl is not None else 200
-            f.write(f"{block_gap_i} {block_ddl_i} {block_size_i} {block_prio_i}\n")
+            value = float(spec) if name == "block_gap" else int(spec)
+            for n in sizes:
+                yield np.full(n, value)
+
+
+# 1, 10, 100, ... 10^18
+POW10 = 10 ** np.arange(19, dtype=np.int64)
+# text of 0000 ... 9999
+DIGITS = np.array([list(b"%04d" % i) for i in range(10000)], dtype=np.uint8)
+
+
+def _int_text(values: np.ndarray) -> np.ndarray:
+    """(n, width) uint8 matrix of the text of ints, padded with zeros."""
+    magnitude = np.abs(values)
+    groups = -(-len(str(np.max(magnitude, initial=0))) // 4)
+    if groups > 4:
+        # not block sizes or deadlines any more
+        return values.astype("S20").view(np.uint8).reshape(len(values), 20)
+    # 4 digits per lookup instead of a division per digit
+    text = np.concatenate(
+        [DIGITS[magnitude // POW10[4 * g] % 10000] for g in range(groups - 1, -1, -1)],
+        axis=1,
+    )
+    # leading zeros become padding, the last digit of 0 stays
+    powers = POW10[4 * groups - 1 : 0 : -1]
+    text[:, :-1][magnitude[:, None] < powers] = 0
+    if np.any(values < 0):
+        sign = np.where(values < 0, ord("-"), 0).astype(np.uint8)[:, None]
+        text = np.concatenate([sign, text], axis=1)
+    return text
+
+
+def _table_text(values: np.ndarray) -> Optional[np.ndarray]:
+    """
+    (n, width) uint8 matrix of the text of a column with few distinct values
+    (constants, seq, priorities, ...), written like python writes them. None
+    if there are too many of them.
+    """
+    low, high = (values.min(), values.max()) if len(values) else (0, 0)
+    if low == high:
+        unique, inverse = values[:1], np.zeros(len(values), dtype=np.int64)
+    elif values.dtype.kind in "iu" and high - low < 1 << 16:
+        # small range of ints, no sort needed
+        offset = values - low
+        present = np.bincount(offset) > 0
+        unique = np.flatnonzero(present) + low
+        inverse = (np.cumsum(present) - 1)[offset]
+    else:
+        sample = values[: 1 << 12]
+        if len(np.unique(sample)) > len(sample) // 2:
+            return None
+        unique, inverse = np.unique(values, return_inverse=True)
+        if len(unique) > 1 << 16:
+            return None
+    cast = float if values.dtype.kind == "f" else int
+    table = np.array([repr(cast(v)).encode() for v in unique])
+    return table.view(np.uint8).reshape(len(unique), -1)[inverse]
+
+
+def _float_text(values: np.ndarray) -> np.ndarray:
+    """(n, width) uint8 matrix of the text of many distinct floats."""
+    import polars as pl
+
+    # polars writes many distinct floats faster than python
+    buffer = io.BytesIO()
+    pl.DataFrame({"value": values}).write_csv(buffer, has_header=False)
+    text = np.array(buffer.getvalue().split(b"\n")[: len(values)])
+    return text.view(np.uint8).reshape(len(values), -1)
+
+
+def format_lines(*columns) -> bytes:
+    """
+    Text of blocks, one line of space separated `columns` each.
+
+    The values are written into a byte matrix padded with zeros and the
+    padding is dropped at once, which is several times faster than the csv
+    writer of polars. Columns of floats with many distinct values still go
+    through polars (which writes 1e-06 as 1.0e-6), columns of python values
+    (a seq of ints and floats) are written value by value.
+    """
+    parts = []
+    for i, values in enumerate(columns):
+        values = np.asarray(values)
+        if values.dtype == object:
+            text = np.array([str(v).encode() for v in values.tolist()])
+            text = text.view(np.uint8).reshape(len(values), -1)
+        else:
+            text = _table_text(values)
+        if text is None and values.dtype.kind == "f":
+            text = _float_text(values)
+        if text is None:
+            text = _int_text(values.astype(np.int64))
+        parts.append(text)
+        separator = " " if i < len(columns) - 1 else "\n"
+        parts.append(np.full((len(values), 1), ord(separator), np.uint8))
+    text = np.concatenate(parts, axis=1)
+    return text[text != 0].tobytes()
+
+
+def write_chunk(f, gap, ddl, size, prio):
+    """Append blocks to an open trace file, one `gap ddl size prio` line each."""
+    f.write(format_lines(gap, ddl, size, prio))
+
+
+def generate_trace(config, chunk_size: int = CHUNK_SIZE):
+    """
+    # generate_trace
+
+    Generate the trace described by `config` into `config["trace_file_name"]`.
+
+    Columns are generated and written `chunk_size` blocks at a time, so the
+    memory does not depend on `block_num` and the output does not depend on
+    `chunk_size`. A `trace_file_name` ending with `.dtpt` is written in the
+    binary format of dtplib.tracefile.
+    """
+    block_num = int(config["block_num"])
+    sizes = [min(chunk_size, block_num - i) for i in range(0, block_num, chunk_size)]
+    columns = [
+        generate_column(config.get(name, DEFAULTS[name]), name, sizes)
+        for name in ["block_gap", "block_ddl", "block_size", "block_prio"]
+    ]
+    # the first chunk is generated (and formatted) before the file is
+    # truncated, so a bad config does not destroy a trace generated before
+    chunks = zip(*columns)
+    first = next(chunks, None)
+    if tracefile.is_binary_name(config["trace_file_name"]):
+        with tracefile.TraceWriter(config["trace_file_name"], block_num) as writer:
+            for chunk in itertools.chain([first] if first else [], chunks):
+                # python values of a mixed seq are stored as floats
+                writer.write(
+                    *(c.astype(np.float64) if c.dtype == object else c for c in chunk)
+                )
+        return
+    text = format_lines(*first) if first else b""
+    with open(config["trace_file_name"], "wb") as f:
+        f.write(text)
+        for gap, ddl, size, prio in chunks:
+            write_chunk(f, gap, ddl, size, prio)
 
 
 parser = argparse.ArgumentParser(description="Generate trace for testing")
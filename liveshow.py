@@ -1,6 +1,11 @@
 import argparse
+import math
 import os
 import re
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 
 import matplotlib.pyplot as plt
 import numpy as np
@@ -8,6 +13,15 @@ import polars as pl
 from matplotlib.animation import FuncAnimation
 from matplotlib.axes import Axes
 
+import downsample
+import rolling
+import shards
+import sketch
+import utils
+from dtplib import parse as dtplib_parse
+from dtplib import tracefile
+from plotting import SeriesBuffer, full_redraw, grow_limit, set_text
+
 plt.rcParams["font.sans-serif"] = ["Noto Sans CJK JP"]
 
 
@@ -30,9 +44,15 @@ def parse_trace(trace_file_name: str) -> pl.DataFrame:
             ```
             0.1 200 1300 1
             0.1 200 1300 2
+
+        or a binary trace (see dtplib.tracefile)
     """
+    if tracefile.is_binary_trace(trace_file_name):
+        return tracefile.trace_frame(trace_file_name).select(
+            ["id", "start", "ddl", "size", "prio"]
+        )
     trace = []
-    with open(trace_file_name, "r") as f:
+    with utils.open_input(trace_file_name, "r") as f:
         lines = f.readlines()
         for idx, line in enumerate(lines):
             info = re.split(r"\s+", line)
@@ -50,14 +70,15 @@ def parse_trace(trace_file_name: str) -> pl.DataFrame:
     return trace
 
 
-def parse_result(result_file_name: str) -> pl.DataFrame:
+def parse_result(result_file_name) -> pl.DataFrame:
     """
     # parse_result
 
     Parse a result file and return a polars DataFrame.
 
         Parameters:
-            result_file_name (str): The name of the result file.
+            result_file_name (str): The name of the result file, or a list of
+                the results of the connections of a run (see shards.py).
 
         Returns:
             polars.DataFrame: The parsed result.
@@ -71,8 +92,10 @@ def parse_result(result_file_name: str) -> pl.DataFrame:
         - deadline
         - duration
     """
+    if not isinstance(result_file_name, str):
+        return dtplib_parse.parse_result(result_file_name)
     try:
-        result = pl.read_csv(result_file_name)
+        result = utils.read_csv(result_file_name)
         result["block_id"] = result["block_id"].apply(lambda x: (x >> 2) - 1)
         return result
     except:
@@ -81,14 +104,15 @@ def parse_result(result_file_name: str) -> pl.DataFrame:
         )
 
 
-def parse_server_log(server_log_file_name: str) -> pl.DataFrame:
+def parse_server_log(server_log_file_name) -> pl.DataFrame:
     """
     # parse_server_log
 
     Parse a server log file and return a polars DataFrame.
 
         Parameters:
-            server_log_file_name (str): The name of the server log file.
+            server_log_file_name (str): The name of the server log file, or a
+                list of the logs of the connections of a run.
 
         Returns:
             polars.DataFrame: The parsed server log.
@@ -101,8 +125,10 @@ def parse_server_log(server_log_file_name: str) -> pl.DataFrame:
         - cancelled
         - cancelled_passed
     """
+    if not isinstance(server_log_file_name, str):
+        return dtplib_parse.parse_server_log(server_log_file_name)
     try:
-        server_log = pl.read_csv(server_log_file_name)
+        server_log = utils.read_csv(server_log_file_name)
         server_log["block_id"] = server_log["block_id"].apply(lambda x: (x >> 2) - 1)
         return server_log
     except:
@@ -111,6 +137,300 @@ def parse_server_log(server_log_file_name: str) -> pl.DataFrame:
         )
 
 
+TABLE_CELLS = [
+    (1, 0, "arrive", "{:.2f}%", 100),
+    (1, 1, "high arrive", "{:.2f}%", 100),
+    (1, 2, "low arrive", "{:.2f}%", 100),
+    (2, 0, "avg", "{:.2f}ms", 1),
+    (2, 1, "high", "{:.2f}ms", 1),
+    (2, 2, "low", "{:.2f}ms", 1),
+]
+# BCT quantile rows, e.g. (3, 1, "high p50", ...)
+for _row, _q in enumerate(sketch.QUANTILES, start=3):
+    for _col, _group in enumerate(["", "high ", "low "]):
+        TABLE_CELLS.append(
+            (_row, _col, _group + sketch.quantile_name(_q), "{:.2f}ms", 1)
+        )
+TABLE_ROWS = ["块到达率", "平均完成时间"] + [
+    f"{sketch.quantile_name(q)} 完成时间" for q in sketch.QUANTILES
+]
+
+
+# priorities with a rolling window BCR curve
+WINDOW_PRIOS = (1, 2)
+
+
+def quantile_values(quantiles: sketch.PrioritySketches) -> dict:
+    """Table values of the BCT sketches: overall, high (1) and low (2)."""
+    values = {}
+    for group, name in [("", "all"), ("high ", "1"), ("low ", "2")]:
+        for q in sketch.QUANTILES:
+            values[group + sketch.quantile_name(q)] = quantiles.get(name).quantile(q)
+    return values
+
+
+def per_connection(trace: pl.DataFrame, *frames: pl.DataFrame, connections=None):
+    """
+    (trace, join keys): with the merged shards of several connections (in the
+    result or server log `frames`) the trace is repeated for every connection
+    and blocks are joined on (id, conn), otherwise on id alone. The number of
+    connections is `connections` if given, so shards without rows count too.
+    """
+    counts = [
+        df[shards.CONN_COLUMN].max()
+        for df in frames
+        if shards.CONN_COLUMN in df.columns
+    ]
+    if not counts:
+        return trace, ["id"]
+    n = connections or max([int(c) + 1 for c in counts if c is not None], default=1)
+    conns = pl.DataFrame(
+        {
+            "id": np.tile(np.arange(len(trace)), n),
+            shards.CONN_COLUMN: np.repeat(np.arange(n), len(trace)),
+        }
+    )
+    return trace.join(conns, on="id", how="left"), ["id", shards.CONN_COLUMN]
+
+
+class PlaybackData:
+    """
+    # PlaybackData
+
+    Everything playback needs, computed once from the finished files.
+
+    Blocks are kept as numpy arrays sorted by their deadline timestamp, and the
+    table statistics as cumulative sums sorted by arrival, so the data of any
+    frame is a few `searchsorted` and `cumsum` calls instead of re-joining the
+    DataFrames every tick.
+
+    With a rolling `window` the curves also have the windowed BCR of each
+    priority, and the alerts of a frame are found from the blocks added since
+    the previous one.
+    """
+
+    def __init__(
+        self,
+        trace: pl.DataFrame,
+        result: pl.DataFrame,
+        server_log: pl.DataFrame,
+        window: rolling.RollingBCR = None,
+    ):
+        self.window = window
+        trace, keys = per_connection(trace, result, server_log)
+        blocks = (
+            trace.join(
+                result, left_on=keys, right_on=["block_id", *keys[1:]], how="left"
+            )
+            .join(
+                server_log,
+                left_on=keys,
+                right_on=["block_id", *keys[1:]],
+                how="left",
+                suffix="_s",
+            )
+            .select(
+                [
+                    "prio",
+                    pl.col("bct").fill_null(-1),
+                    (pl.col("bct") < pl.col("ddl"))
+                    .fill_null(False)
+                    .cast(pl.UInt8)
+                    .alias("intime"),
+                    (pl.col("duration") / 1000).fill_null(np.inf).alias("arrival"),
+                    pl.col("cancelled").is_not_null().cast(pl.UInt8).alias("cancelled"),
+                    (pl.col("ddl") / 1000 + pl.col("start_s") / 1000000).alias(
+                        "timestamp"
+                    ),
+                ]
+            )
+        )
+        prio = blocks["prio"].to_numpy().astype(np.int64)
+        bct = blocks["bct"].to_numpy().astype(np.float64)
+        intime = blocks["intime"].to_numpy().astype(bool)
+        arrival = blocks["arrival"].to_numpy().astype(np.float64)
+        cancelled = blocks["cancelled"].to_numpy().astype(bool)
+        timestamp = blocks["timestamp"].to_numpy().astype(np.float64)
+
+        # curve points: blocks with a server start time, ordered by deadline
+        order = np.argsort(timestamp[~np.isnan(timestamp)], kind="stable")
+        sent = np.flatnonzero(~np.isnan(timestamp))[order]
+        self.timestamp = timestamp[sent]
+        self.timestamp_ms = self.timestamp * 1000
+        self.prio = prio[sent]
+        self.intime = intime[sent]
+        self.arrival = arrival[sent]
+        self.cancelled = cancelled[sent]
+        # curves with the final state of every block, frames are prefixes
+        self.curves = self._curves(
+            self.prio, self.intime, self.cancelled, self.timestamp, window
+        )
+        # windowed BCR and window sizes for the alerts
+        self.windows = [
+            window.series(self.prio, self.intime, self.timestamp, p)
+            for p in WINDOW_PRIOS
+            if window is not None
+        ]
+        self.alert_n = 0
+        # in time blocks that arrived after their deadline timestamp (clock
+        # skew between sender and receiver), a frame before their arrival
+        # does not count them in time
+        late = self.intime & (self.arrival >= self.timestamp_ms)
+        self.late = np.flatnonzero(late)
+        self.late_ms = self.timestamp_ms[late]
+        self.max_lag = np.max(self.arrival[late] - self.late_ms, initial=0)
+        # blocks of priority 0-2 so far, to correct the curves of a frame
+        self.counts = np.cumsum([self.prio == j for j in range(3)], axis=1)
+
+        # table statistics: cumulative over blocks ordered by arrival
+        arrived = np.flatnonzero(np.isfinite(arrival))
+        arrived = arrived[np.argsort(arrival[arrived], kind="stable")]
+        self.arrival_sorted = arrival[arrived]
+        valid = bct[arrived] < 1000000
+        self.table_sums = {}
+        for name, group in [
+            ("", np.ones(len(prio), dtype=bool)),
+            ("high", prio == 1),
+            ("low", prio == 2),
+        ]:
+            # the arrive ratio is relative to all blocks of the trace
+            mask = group[arrived]
+            self.table_sums[name] = (
+                np.sum(group),
+                np.cumsum(mask & intime[arrived]),
+                np.cumsum(mask & valid),
+                np.cumsum(np.where(mask & valid, bct[arrived], 0)),
+            )
+
+        # BCT sketches, fed in arrival order as the playback advances
+        self.arrived_prio = prio[arrived][valid]
+        self.arrived_bct = bct[arrived][valid]
+        self.valid_arrival = self.arrival_sorted[valid]
+        self.quantiles = sketch.PrioritySketches()
+        self.quantile_n = 0
+
+        self.end = max(
+            np.max(self.timestamp, initial=0) * 1000,
+            np.max(self.arrival_sorted, initial=0),
+        )
+
+    def table(self, timer: float) -> dict:
+        """Statistics of the blocks that arrived before `timer` (ms)."""
+        n = np.searchsorted(self.arrival_sorted, timer, side="left")
+        agg = {}
+        for name, (total, intime, valid, bct) in self.table_sums.items():
+            arrive_name = (name + " arrive").strip()
+            bct_name = name if name else "avg"
+            if n == 0 or total == 0:
+                agg[arrive_name] = None
+            else:
+                agg[arrive_name] = intime[n - 1] / total
+            if n == 0 or valid[n - 1] == 0:
+                agg[bct_name] = None
+            else:
+                agg[bct_name] = bct[n - 1] / valid[n - 1]
+
+        n = np.searchsorted(self.valid_arrival, timer, side="left")
+        if n < self.quantile_n:
+            # went back in time, start over
+            self.quantiles = sketch.PrioritySketches()
+            self.quantile_n = 0
+        self.quantiles.add_many(
+            self.arrived_prio[self.quantile_n : n],
+            self.arrived_bct[self.quantile_n : n],
+        )
+        self.quantile_n = n
+        agg.update(quantile_values(self.quantiles))
+        return agg
+
+    def frame(self, timer: float):
+        """
+        Curve data of the blocks whose deadline passed before `timer` (ms).
+
+        The curves precomputed with the final state of each block are right
+        except for the in time blocks that had not arrived yet at `timer`, only
+        these are taken out of them, so the history is not scanned again.
+        """
+        m = np.searchsorted(self.timestamp_ms, timer, side="left")
+        lo = np.searchsorted(self.late_ms, timer - self.max_lag, side="left")
+        hi = np.searchsorted(self.late, m, side="left")
+        pending = self.late[lo:hi]
+        pending = pending[self.arrival[pending] >= timer]
+        if len(pending) == 0:
+            return self.timestamp[:m], self.curves[:, :m]
+        y = self.curves[:, :m].copy()
+        for j in range(3):
+            start = pending[self.prio[pending] == j]
+            self._uncount(y[j], start, np.full(len(start), m), self.counts[j, :m])
+        for j, (p, (_, blocks)) in enumerate(zip(WINDOW_PRIOS, self.windows)):
+            # a block leaves the window after `window.blocks` blocks of its
+            # priority, or `window.seconds` after its timestamp
+            start = pending[self.prio[pending] == p]
+            if self.window.blocks is not None:
+                end = np.searchsorted(
+                    self.counts[p], self.counts[p, start] + self.window.blocks
+                )
+            else:
+                end = np.searchsorted(
+                    self.timestamp, self.timestamp[start] + self.window.seconds
+                )
+            self._uncount(y[6 + j], start, np.minimum(end, m), blocks[:m])
+        return self.timestamp[:m], y
+
+    def frame_view(self, timer: float):
+        """
+        Like `frame`, but returns views of curves precomputed with the final
+        state of each block. A block whose deadline passed before `timer` but
+        that arrived in time only after `timer` (clock skew between sender and
+        receiver) is already counted as in time.
+        """
+        m = np.searchsorted(self.timestamp_ms, timer, side="left")
+        return self.timestamp[:m], self.curves[:, :m]
+
+    def alert(self, alerter: rolling.Alerter, timer: float):
+        """Check the windows of the blocks whose deadline passed since the last call."""
+        m = np.searchsorted(self.timestamp_ms, timer, side="left")
+        if m < self.alert_n:
+            # went back in time, start over
+            alerter.reset()
+            self.alert_n = 0
+        for p, (bcr, blocks) in zip(WINDOW_PRIOS, self.windows):
+            alerter.check_many(
+                p,
+                self.timestamp[self.alert_n : m],
+                bcr[self.alert_n : m],
+                blocks[self.alert_n : m],
+            )
+        self.alert_n = m
+
+    @staticmethod
+    def _uncount(row, start, end, count):
+        """Take the blocks counted in time in `row[start:end]` out of `row`."""
+        diff = np.zeros(len(row) + 1)
+        np.add.at(diff, start, 1)
+        np.add.at(diff, end, -1)
+        removed = np.cumsum(diff[:-1])
+        row -= np.divide(removed, count, out=np.zeros(len(row)), where=count > 0)
+
+    @staticmethod
+    def _curves(prio, intime, cancelled, timestamp, window=None):
+        # rows: BCR of prio 0-2, cancelled ratio of prio 0-2, windowed BCR of
+        # WINDOW_PRIOS
+        y = np.full((6 + len(WINDOW_PRIOS), len(prio)), np.nan)
+        for j in range(3):
+            onehot = prio == j
+            count = np.cumsum(onehot)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                y[j] = np.where(count > 0, np.cumsum(onehot & intime) / count, np.nan)
+                y[j + 3] = np.where(
+                    count > 0, np.cumsum(onehot & cancelled) / count, np.nan
+                )
+        if window is not None:
+            for j, p in enumerate(WINDOW_PRIOS):
+                y[6 + j] = window.series(prio, intime, timestamp, p)[0]
+        return y
+
+
 class UpdateData:
     def __init__(
         self,
@@ -120,23 +440,59 @@ class UpdateData:
         server_file_name: str,
         title: str,
         playback: bool,
+        playback_data: PlaybackData = None,
+        window: rolling.RollingBCR = None,
+        alerter: rolling.Alerter = None,
     ):
-        self.trace = parse_trace(trace_file_name)
         self.result_file_name = result_file_name
-        self.server_log = parse_server_log(server_file_name)
         self.playback = playback
+        self.alerter = alerter
+        if playback:
+            # playback files are finished, parse them only once
+            self.playback_data = playback_data or PlaybackData(
+                parse_trace(trace_file_name),
+                parse_result(result_file_name),
+                parse_server_log(server_file_name),
+                window,
+            )
+            self.window = self.playback_data.window
+        else:
+            self.trace = parse_trace(trace_file_name)
+            self.trace_prio = self.trace["prio"].to_numpy().astype(np.int64)
+            self.trace_ddl = self.trace["ddl"].to_numpy().astype(np.float64)
+            self.trace_start = self.trace["start"].to_numpy().astype(np.float64)
+            # rows appended to the result file, for the BCT sketches and the
+            # rolling windows
+            self.follower = shards.follow(result_file_name)
+            self.quantiles = sketch.PrioritySketches()
+            self.window = window
         self.timer = 0
+        self.interval = 500
         self.ax = ax
         self.lines = []
         for i in range(2):
             self.lines.append(self.ax.plot([], [], label=f"Prio {i}")[0])
         for i in range(2):
             self.lines.append(self.ax.plot([], [], label=f"Prio {i} unsent")[0])
+        if self.window is not None:
+            for i in range(2):
+                self.lines.append(
+                    self.ax.plot(
+                        [],
+                        [],
+                        "--",
+                        color=self.lines[i].get_color(),
+                        label=f"Prio {i} window ({self.window.describe()})",
+                    )[0]
+                )
+            if not playback:
+                # windowed BCR after every received block, in arrival order
+                self.window_buffer = SeriesBuffer(self.lines[4:6])
         self.table = self.ax.table(
             colLabels=("整体", "高优先", "低优先"),
-            rowLabels=["块到达率", "平均块完成时间"],
-            cellText=[["NA", "NA", "NA"], ["NA", "NA", "NA"]],
-            bbox=[0.1, -0.4, 0.9, 0.2],
+            rowLabels=TABLE_ROWS,
+            cellText=[["NA", "NA", "NA"] for _ in TABLE_ROWS],
+            bbox=[0.2, -0.85, 0.8, 0.62],
         )
 
         # plot parameters
@@ -148,35 +504,105 @@ class UpdateData:
         self.ax.legend()
 
     def __call__(self, frame):
-        self.timer += 500
+        self.timer += self.interval
+        return self.draw()
+
+    def draw(self):
         x, y = self.calculate()
-        self.lines[0].set_data(x, y[1])
-        self.lines[1].set_data(x, y[2])
+        width = downsample.pixel_width(self.ax)
+        self.lines[0].set_data(*downsample.reduce(x, y[1], width))
+        self.lines[1].set_data(*downsample.reduce(x, y[2], width))
         if self.playback:
-            self.lines[2].set_data(x, y[4])
-            self.lines[3].set_data(x, y[5])
+            self.lines[2].set_data(*downsample.reduce(x, y[4], width))
+            self.lines[3].set_data(*downsample.reduce(x, y[5], width))
+            for line, values in zip(self.lines[4:], y[6:]):
+                line.set_data(*downsample.reduce(x, values, width))
         # print(x)
-        xlim = max(np.max(x) * 1.1, 1)
+        xlim = max(np.max(x, initial=0) * 1.1, 1)
         self.ax.set_xlim(0, xlim)
         return self.lines
 
+    def set_table(self, agg) -> bool:
+        changed = False
+        for row, col, name, fmt, scale in TABLE_CELLS:
+            value = agg[name] if agg is not None else None
+            changed |= set_text(
+                self.table[row, col].get_text(),
+                fmt.format(value * scale) if value is not None else "NA",
+            )
+        return changed
+
+    def follow_result(self):
+        """Feed the rows appended to the result file to the BCT sketches and windows."""
+        lines = self.follower.read_lines()
+        if self.follower.truncated:
+            self.quantiles = sketch.PrioritySketches()
+            self.reset_window()
+        points = []
+        for line in lines:
+            row = line.split(",")
+            if len(row) < 6:
+                continue
+            bct = int(row[1])
+            if bct < 1000000:
+                self.quantiles.add(int(row[3]), bct)
+            block = (int(row[0]) >> 2) - 1
+            if self.window is not None and 0 <= block < len(self.trace_prio):
+                points.append(self.add_to_window(block, bct))
+        if points:
+            points = np.array(points)
+            self.window_buffer.insert(points[:, 0], points[:, 1:].T)
+
+    def reset_window(self):
+        if self.window is None:
+            return
+        self.window.clear()
+        self.window_buffer.clear()
+        if self.alerter is not None:
+            self.alerter.reset()
+
+    def add_to_window(self, block: int, bct: int):
+        """
+        Add a received block to the rolling windows and check the alerts.
+        Returns the point of the window curves: (timestamp, BCR of each of
+        WINDOW_PRIOS).
+        """
+        timestamp = self.trace_ddl[block] / 1000 + self.trace_start[block]
+        self.window.add(self.trace_prio[block], timestamp, bct < self.trace_ddl[block])
+        point = [timestamp]
+        for p in WINDOW_PRIOS:
+            bcr, blocks = self.window.get(p)
+            if self.alerter is not None:
+                self.alerter.check(p, timestamp, bcr, blocks)
+            point.append(bcr)
+        return point
+
     def calculate(self):
+        if self.playback:
+            self.set_table(self.playback_data.table(self.timer))
+            if self.alerter is not None:
+                self.playback_data.alert(self.alerter, self.timer)
+            x, y = self.playback_data.frame(self.timer)
+            if len(x) == 0:
+                return np.array([0]), np.empty((6 + len(WINDOW_PRIOS), 0))
+            return x, y
+
         # 一个简单粗暴的版本，没有增量更新
         # 其实可以做，但是直接复制比较无脑
+        # 多个连接的分片按 duration 合并，每个连接都有一份完整的 trace
         result = parse_result(self.result_file_name)
-        if self.playback:
-            result = result.filter(pl.col("duration") / 1000 < self.timer)
+        self.follow_result()
 
         if result.is_empty():
-            self.table[1, 0].get_text().set_text("NA")
-            self.table[1, 1].get_text().set_text("NA")
-            self.table[1, 2].get_text().set_text("NA")
-            self.table[2, 0].get_text().set_text("NA")
-            self.table[2, 1].get_text().set_text("NA")
-            self.table[2, 2].get_text().set_text("NA")
+            self.set_table(None)
             return np.array([0]), np.array([[], [], [], [], [], []])
 
-        result = result.join(self.trace, left_on="block_id", right_on="id", how="outer")
+        trace, keys = per_connection(
+            self.trace, result, connections=shards.connections(self.result_file_name)
+        )
+        result = result.join(
+            trace, left_on=["block_id"] + keys[1:], right_on=keys, how="outer"
+        )
 
         agg = result.select(
             [
@@ -214,131 +640,445 @@ class UpdateData:
             ]
         )
 
-        self.table[1, 0].get_text().set_text(
-            "{:.2f}%".format(agg["arrive"][0] * 100) if agg["arrive"][0] else "NA"
-        )
-        self.table[1, 1].get_text().set_text(
-            "{:.2f}%".format(agg["high arrive"][0] * 100)
-            if agg["high arrive"][0]
-            else "NA"
-        )
-        self.table[1, 2].get_text().set_text(
-            "{:.2f}%".format(agg["low arrive"][0] * 100)
-            if agg["low arrive"][0]
-            else "NA"
-        )
-        self.table[2, 0].get_text().set_text(
-            "{:.2f}ms".format(agg["avg"][0]) if agg["avg"][0] else "NA"
-        )
-        self.table[2, 1].get_text().set_text(
-            "{:.2f}ms".format(agg["high"][0]) if agg["high"][0] else "NA"
-        )
-        self.table[2, 2].get_text().set_text(
-            "{:.2f}ms".format(agg["low"][0]) if agg["low"][0] else "NA"
+        values = quantile_values(self.quantiles)
+        self.set_table(
+            {
+                name: agg[name][0] if name in agg.columns else values[name]
+                for _, _, name, _, _ in TABLE_CELLS
+            }
         )
 
-        if self.playback:
-            result = result.join(
-                self.server_log, on="block_id", how="outer", suffix="_s"
-            )
-            result = result.select(
+        result = (
+            result.filter(pl.col("duration") != None)
+            .select(
                 [
-                    (pl.col("bct") < pl.col("ddl")).alias("intime"),
-                    # (pl.col("duration") == None).alias("unsent"),
                     "block_id",
+                    (pl.col("bct") < pl.col("ddl")).alias("intime"),
                     "prio",
-                    "bct",
-                    "duration",
-                    "complete",
-                    "cancelled",
-                    (pl.col("ddl") / 1000 + pl.col("start_s") / 1000000).alias(
-                        "timestamp"
-                    ),
+                    "ddl",
+                    (pl.col("ddl") / 1000 + pl.col("start")).alias("timestamp"),
                 ]
-            ).filter(pl.col("timestamp") * 1000 < self.timer)
-            if result.is_empty():
-                self.table[1, 0].get_text().set_text("NA")
-                self.table[1, 1].get_text().set_text("NA")
-                self.table[1, 2].get_text().set_text("NA")
-                self.table[2, 0].get_text().set_text("NA")
-                self.table[2, 1].get_text().set_text("NA")
-                self.table[2, 2].get_text().set_text("NA")
-                return np.array([0]), np.array([[], [], [], [], [], []])
-
-            # print(result)
-
-            x = result["timestamp"].to_numpy()
-            y = np.zeros((6, len(x)))
-            y_count = np.zeros(3)
-            y_intime = np.zeros(3)
-            y_unsent = np.zeros(3)
-            qoe = 0
-            qoe_theory = 0
-            for i in range(len(x)):
-                y_count[result["prio"][i]] += 1
-                qoe_theory += 0.9 * (3 - result["prio"][i]) / 2 + 0.1
-                if result["intime"][i]:
-                    y_intime[result["prio"][i]] += 1
-                    qoe += 0.9 * (3 - result["prio"][i]) / 2 + 0.1
-                if result["cancelled"][i]:
-                    y_unsent[result["prio"][i]] += 1
-                for j in range(3):
-                    y[j][i] = y_intime[j] / y_count[j] if y_count[j] > 0 else None
-                    y[j + 3][i] = y_unsent[j] / y_count[j] if y_count[j] > 0 else None
-
-            print(
-                "qoe {qoe} qoe_theory {qoe_theory}".format(
-                    qoe=qoe, qoe_theory=qoe_theory
-                )
             )
+            .sort("timestamp")
+        )
+        x = result["timestamp"].to_numpy()
+        y = np.zeros((3, len(x)))
+        y_count = np.zeros(3)
+        y_intime = np.zeros(3)
+        for i in range(len(x)):
+            y_count[result["prio"][i]] += 1
+            if result["intime"][i]:
+                y_intime[result["prio"][i]] += 1
+            for j in range(3):
+                y[j][i] = y_intime[j] / y_count[j] if y_count[j] > 0 else None
 
-            return x, y
+        return x, y
+
+
+class BlitUpdateData(UpdateData):
+    """
+    # BlitUpdateData
+
+    UpdateData for `FuncAnimation(..., blit=True)`.
+
+    Only the lines are animated. They are backed by preallocated buffers that
+    are filled in place: in live mode with the rows appended to the result
+    file since the last frame, in playback mode with views of the precomputed
+    curves. The axes limits grow geometrically and the table is only touched
+    when one of its values changed; both trigger a full redraw, every other
+    frame only blits the lines.
+
+    In live mode the points of each frame are merged into the curves by
+    timestamp (deadline), so the x values stay sorted for downsampling; only
+    the ratios after the earliest new point are computed again. With the
+    shards of several
+    connections the arrive ratios are relative to the blocks of all of them.
+    """
+
+    def __init__(self, *args, table_interval: float = 500, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.xlim = 1
+        self.table_interval = table_interval
+        self.table_timer = -table_interval
+        if self.playback:
+            return
+
+        # rows: BCR of prio 1 and 2, then prio and intime of every point
+        self.buffer = SeriesBuffer(self.lines[:2], rows=4)
+        self._reset_counters()
+
+    def _reset_counters(self):
+        self.count = np.zeros(3)
+        self.intime = np.zeros(3)
+        # table: overall, high (1), low (2)
+        self.totals = np.array(
+            [
+                len(self.trace_prio),
+                np.sum(self.trace_prio == 1),
+                np.sum(self.trace_prio == 2),
+            ]
+        ) * shards.connections(self.result_file_name)
+        self.table_intime = np.zeros(3)
+        self.table_valid = np.zeros(3)
+        self.table_bct = np.zeros(3)
+
+    def read_new_blocks(self):
+        lines = self.follower.read_lines()
+        if self.follower.truncated:
+            self.buffer.clear()
+            self._reset_counters()
+            self.quantiles = sketch.PrioritySketches()
+            self.reset_window()
+        x = np.empty(len(lines))
+        marks = np.empty((2, len(lines)))
+        windowed = np.empty((1 + len(WINDOW_PRIOS), len(lines)))
+        n = 0
+        for line in lines:
+            row = line.split(",")
+            if len(row) < 6:
+                continue
+            block = (int(row[0]) >> 2) - 1
+            bct = int(row[1])
+            if block < 0 or block >= len(self.trace_prio):
+                continue
+            prio = self.trace_prio[block]
+            ddl = self.trace_ddl[block]
+            intime = bct < ddl
+
+            groups = (0, prio) if prio in (1, 2) else (0,)
+            for g in groups:
+                self.table_intime[g] += intime
+                if bct < 1000000:
+                    self.table_valid[g] += 1
+                    self.table_bct[g] += bct
+            if bct < 1000000:
+                self.quantiles.add(prio, bct)
+
+            if prio < 3:
+                self.count[prio] += 1
+                self.intime[prio] += intime
+            x[n] = ddl / 1000 + self.trace_start[block]
+            marks[:, n] = prio, intime
+            if self.window is not None:
+                windowed[:, n] = self.add_to_window(block, bct)
+            n += 1
+        self.insert_points(x[:n], marks[:, :n])
+        if self.window is not None:
+            self.window_buffer.insert(windowed[0, :n], windowed[1:, :n])
+        return n
+
+    def insert_points(self, x: np.ndarray, marks: np.ndarray):
+        """
+        Merge new points (`marks`: prio and intime of each) into the BCR
+        curves by timestamp. The ratios from the first point after the
+        earliest new one on are computed again in timestamp order, starting
+        from the counts (already updated with the new points) without the
+        points that follow it.
+        """
+        buffer = self.buffer
+        if len(x) == 0:
+            return
+        start = int(np.searchsorted(buffer.x[: buffer.n], x.min(), side="right"))
+        x = np.concatenate([buffer.x[start : buffer.n], x])
+        marks = np.concatenate([buffer.y[2:, start : buffer.n], marks], axis=1)
+        order = np.argsort(x, kind="stable")
+        x, (prio, intime) = x[order], marks[:, order]
+        y = np.empty((4, len(x)))
+        y[2:] = prio, intime
+        for j, p in enumerate((1, 2)):
+            mine = prio == p
+            count = self.count[p] - mine.sum() + np.cumsum(mine)
+            hits = mine & (intime > 0)
+            intime_count = self.intime[p] - hits.sum() + np.cumsum(hits)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                y[j] = np.where(count > 0, intime_count / count, np.nan)
+        buffer.splice(start, x, y)
+
+    def table_values(self):
+        if self.table_valid[0] == 0 and self.table_intime[0] == 0:
+            return None
+        with np.errstate(invalid="ignore", divide="ignore"):
+            arrive = self.table_intime / self.totals
+            bct = self.table_bct / self.table_valid
+        return {
+            "arrive": arrive[0],
+            "high arrive": arrive[1],
+            "low arrive": arrive[2],
+            "avg": bct[0] if self.table_valid[0] else None,
+            "high": bct[1] if self.table_valid[1] else None,
+            "low": bct[2] if self.table_valid[2] else None,
+            **quantile_values(self.quantiles),
+        }
+
+    def draw(self):
+        redraw = False
+        if self.playback:
+            x, y = self.playback_data.frame_view(self.timer)
+            width = downsample.pixel_width(self.ax)
+            for line, k in zip(self.lines, (1, 2, 4, 5, 6, 7)):
+                line.set_data(*downsample.reduce(x, y[k], width))
+            if self.alerter is not None:
+                self.playback_data.alert(self.alerter, self.timer)
+            xmax = x[-1] if len(x) else 0
+            agg = self.playback_data.table
         else:
-            result = (
-                result.filter(pl.col("duration") != None)
-                .select(
-                    [
-                        "block_id",
-                        (pl.col("bct") < pl.col("ddl")).alias("intime"),
-                        "prio",
-                        "ddl",
-                        (pl.col("ddl") / 1000 + pl.col("start")).alias("timestamp"),
-                    ]
-                )
-                .sort("timestamp")
+            self.read_new_blocks()
+            xmax = self.buffer.xmax()
+            agg = None
+
+        if self.timer - self.table_timer >= self.table_interval:
+            self.table_timer = self.timer
+            redraw |= self.set_table(
+                agg(self.timer) if agg is not None else self.table_values()
             )
-            x = result["timestamp"].to_numpy()
-            y = np.zeros((3, len(x)))
-            y_count = np.zeros(3)
-            y_intime = np.zeros(3)
-            for i in range(len(x)):
-                y_count[result["prio"][i]] += 1
-                if result["intime"][i]:
-                    y_intime[result["prio"][i]] += 1
-                for j in range(3):
-                    y[j][i] = y_intime[j] / y_count[j] if y_count[j] > 0 else None
 
-            return x, y
+        xlim = grow_limit(self.xlim, xmax * 1.1)
+        if xlim != self.xlim:
+            self.xlim = xlim
+            self.ax.set_xlim(0, xlim)
+            redraw = True
+
+        if redraw:
+            full_redraw(self.ax)
+        return self.lines
+
+
+_render_state = None
+
+
+def _render_init(playback_data: PlaybackData, title: str, dpi: int):
+    global _render_state
+    plt.switch_backend("Agg")
+    fig, ax = plt.subplots()
+    plt.subplots_adjust(bottom=0.5)
+    update_data = UpdateData(ax, None, None, None, title, True, playback_data)
+    _render_state = (fig, update_data, dpi)
+
+
+def _render_frames(frames):
+    fig, update_data, dpi = _render_state
+    for timer, path in frames:
+        update_data.timer = timer
+        update_data.draw()
+        fig.savefig(path, dpi=dpi)
+    return len(frames)
+
+
+def render(
+    playback_data: PlaybackData,
+    title: str,
+    output: str,
+    fps: float = 10,
+    speed: float = 1.0,
+    jobs: int = None,
+    dpi: int = 100,
+):
+    """
+    # render
+
+    Render a playback without a window, as fast as the CPU allows.
+
+    Frames are drawn with the Agg backend by a pool of processes, each of them
+    owning its own figure, and then assembled into the output.
+
+        Parameters:
+            playback_data (PlaybackData): The precomputed playback.
+            title (str): Title of the figure.
+            output (str): `.gif` or `.mp4` file, or a directory for a png
+                sequence. mp4 output needs `ffmpeg` in PATH.
+            fps (float): Frames per second of the output.
+            speed (float): Playback seconds shown per second of output.
+            jobs (int): Number of worker processes, all cores by default.
+            dpi (int): Resolution of the frames.
+    """
+    ext = os.path.splitext(output)[1].lower()
+    frame_dir = tempfile.mkdtemp() if ext in (".gif", ".mp4") else output
+    os.makedirs(frame_dir, exist_ok=True)
+
+    step = 1000 * speed / fps
+    n = math.ceil(playback_data.end / step) + 1
+    frames = [
+        ((i + 1) * step, os.path.join(frame_dir, f"frame_{i:05d}.png"))
+        for i in range(n)
+    ]
+    jobs = jobs or os.cpu_count()
+    chunk = max(1, math.ceil(n / (jobs * 4)))
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=_render_init,
+        initargs=(playback_data, title, dpi),
+    ) as pool:
+        done = 0
+        for count in pool.map(
+            _render_frames, [frames[i : i + chunk] for i in range(0, n, chunk)]
+        ):
+            done += count
+            print(f"\rrendered {done}/{n} frames", end="", flush=True)
+    print()
+
+    match ext:
+        case ".gif":
+            from PIL import Image
+
+            images = [Image.open(path) for _, path in frames]
+            images[0].save(
+                output,
+                save_all=True,
+                append_images=images[1:],
+                duration=int(1000 / fps),
+                loop=0,
+            )
+            shutil.rmtree(frame_dir)
+        case ".mp4":
+            subprocess.run(
+                [
+                    "ffmpeg",
+                    "-y",
+                    "-loglevel",
+                    "error",
+                    "-framerate",
+                    str(fps),
+                    "-i",
+                    os.path.join(frame_dir, "frame_%05d.png"),
+                    "-vf",
+                    "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+                    "-pix_fmt",
+                    "yuv420p",
+                    output,
+                ],
+                check=True,
+            )
+            shutil.rmtree(frame_dir)
 
 
 parser = argparse.ArgumentParser(description="Live Show DTP trace transport")
 parser.add_argument("-t", "--trace", type=str, help="trace file", default="trace.txt")
 parser.add_argument(
-    "-r", "--result", type=str, help="result file", default="result.csv"
+    "-r",
+    "--result",
+    type=str,
+    nargs="+",
+    help="result file, or the result files of the connections of a run",
+    default=["result.csv"],
 )
 parser.add_argument(
-    "-s", "--server-log", type=str, help="server log file", default="server.csv"
+    "-s",
+    "--server-log",
+    type=str,
+    nargs="+",
+    help="server log file, or the server logs of the connections in -r order",
+    default=["server.csv"],
 )
 parser.add_argument("--title", type=str, help="title", default="Live Show")
 parser.add_argument("--playback", type=bool, help="playback", default=False)
+parser.add_argument(
+    "--render",
+    type=str,
+    help="render the playback without a window to a .gif, .mp4 or png directory",
+)
+parser.add_argument("--fps", type=float, help="frames per second (render)", default=10)
+parser.add_argument(
+    "--speed", type=float, help="speed-up factor of the playback (render)", default=1
+)
+parser.add_argument("--jobs", type=int, help="worker processes (render)")
+parser.add_argument("--dpi", type=int, help="resolution (render)", default=100)
+parser.add_argument(
+    "--blit",
+    action="store_true",
+    help="only redraw the lines every frame, for high frame rates",
+)
+parser.add_argument(
+    "--interval", type=int, help="milliseconds between frames", default=500
+)
+parser.add_argument(
+    "--window-blocks",
+    type=int,
+    help="also draw the BCR of the last N blocks of each priority",
+)
+parser.add_argument(
+    "--window-seconds",
+    type=float,
+    help="also draw the BCR of the blocks of the last T seconds",
+)
+parser.add_argument(
+    "--alert-threshold",
+    type=str,
+    help="alert when the windowed BCR drops below it, e.g. 0.9 or 1:0.9,2:0.5",
+)
+parser.add_argument(
+    "--alert",
+    type=str,
+    help="alert target: stderr, a file, udp://host:port or unix:/path",
+    default="stderr",
+)
+parser.add_argument(
+    "--alert-min-blocks",
+    type=int,
+    help="no alerts while the window has fewer blocks",
+    default=10,
+)
 
 if __name__ == "__main__":
     args = parser.parse_args()
+    # several files are the shards of the connections of one run
+    if len(args.result) == 1:
+        args.result = args.result[0]
+    if len(args.server_log) == 1:
+        args.server_log = args.server_log[0]
+    if (args.playback or args.render is not None) and shards.connections(
+        args.result
+    ) != shards.connections(args.server_log):
+        raise Exception("playback needs one server log per result file")
+
+    window = None
+    if args.window_blocks is not None or args.window_seconds is not None:
+        window = rolling.RollingBCR(args.window_blocks, args.window_seconds)
+    alerter = None
+    if args.alert_threshold is not None:
+        if window is None:
+            raise Exception(
+                "--alert-threshold needs --window-blocks or --window-seconds"
+            )
+        alerter = rolling.Alerter(
+            rolling.parse_thresholds(args.alert_threshold),
+            args.alert,
+            args.alert_min_blocks,
+            window.describe(),
+        )
+
+    if args.render is not None:
+        playback_data = PlaybackData(
+            parse_trace(args.trace),
+            parse_result(args.result),
+            parse_server_log(args.server_log),
+            window,
+        )
+        if alerter is not None:
+            # frames are drawn out of order, report the alerts of the whole run
+            playback_data.alert(alerter, math.inf)
+        render(
+            playback_data,
+            args.title,
+            args.render,
+            args.fps,
+            args.speed,
+            args.jobs,
+            args.dpi,
+        )
+        exit(0)
 
     fig, ax = plt.subplots()
-    plt.subplots_adjust(bottom=0.3)
-    update_data = UpdateData(
-        ax, args.trace, args.result, args.server_log, args.title, args.playback
+    plt.subplots_adjust(bottom=0.5)
+    update_data = (BlitUpdateData if args.blit else UpdateData)(
+        ax,
+        args.trace,
+        args.result,
+        args.server_log,
+        args.title,
+        args.playback,
+        window=window,
+        alerter=alerter,
     )
-    anim = FuncAnimation(fig, update_data, interval=500)
+    update_data.interval = args.interval
+    anim = FuncAnimation(fig, update_data, interval=args.interval, blit=args.blit)
     plt.show()
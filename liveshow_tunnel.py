@@ -1,6 +1,4 @@
 import argparse
-import re
-from turtle import update
 from typing import Any, List, Tuple
 
 import matplotlib.pyplot as plt
@@ -11,69 +9,35 @@ from matplotlib.axes import Axes
 import matplotlib.patches as mpatches
 from matplotlib.gridspec import GridSpec
 
+import downsample
+import utils
+from dtplib.parse import FEC_COLUMNS
+from dtplib.parse import parse_fec_line as parse_line
+from plotting import SeriesBuffer, full_redraw, grow_limit, set_text
+
 plt.rcParams["font.sans-serif"] = ["Noto Sans CJK JP"]
 
-regex_fec = re.compile(
-    r"""\[INFO\]\ quiche:\ 
-    redundancy\ rate:\ (\d+\.\d+),\ 
-    rtt:\ (\d+\.\d+),\ 
-    pacing_rate:\ (\d+\.\d+),\ 
-    remaining_time:\s*(\d+(\.\d+)?),\ 
-    predict_loss_rate:\ (\d+(\.\d+)?),\ 
-    FEC:\ (\d)\ ([ \w]+)
-    """,
-    re.VERBOSE,
-)
+FEC_STATES = {
+    0: ("目前 FEC 状态：启用，时间不足", "tab:red"),
+    1: ("目前 FEC 状态：启用，带宽充裕", "tab:orange"),
+    2: ("目前 FEC 状态：未启用", "tab:green"),
+}
 
 
 def parse_log(log_file_name: str) -> Tuple[pl.DataFrame, List[Any]]:
     data = []
     try:
-        with open(log_file_name, "r") as log_file:
+        with utils.open_input(log_file_name, "r") as log_file:
             for line in log_file:
-                if (match := regex_fec.match(line)) is not None:
-                    data.append(
-                        [
-                            float(match.group(1)),
-                            float(match.group(2)),
-                            float(match.group(3)),
-                            float(match.group(4)),
-                            float(match.group(6)),
-                            int(match.group(8)),
-                            # match.group(9),
-                        ]
-                    )
-                else:
-                    continue
-
-        df = pl.DataFrame(
-            data,
-            columns=[
-                "redundancy_rate",
-                "rtt",
-                "pacing_rate",
-                "remaining_time",
-                "predict_loss_rate",
-                "fec",
-                # "fec_note",
-            ],
-        )
+                if (row := parse_line(line)) is not None:
+                    data.append(row)
+
+        df = pl.DataFrame(data, columns=FEC_COLUMNS)
 
         return (df, data[-1])
     except:
         return (
-            pl.DataFrame(
-                None,
-                columns=[
-                    "redundancy_rate",
-                    "rtt",
-                    "pacing_rate",
-                    "remaining_time",
-                    "predict_loss_rate",
-                    "fec",
-                    # "fec_note",
-                ],
-            ),
+            pl.DataFrame(None, columns=FEC_COLUMNS),
             [],
         )
 
@@ -106,22 +70,21 @@ class UpdateData:
 
         # print(x, rtt, loss_rate)
 
-        self.lines[0].set_data(x, rtt)
-        self.lines[1].set_data(x, loss_rate)
+        self.lines[0].set_data(
+            *downsample.reduce(x, rtt, downsample.pixel_width(self.ax[0, 1]))
+        )
+        self.lines[1].set_data(
+            *downsample.reduce(x, loss_rate, downsample.pixel_width(self.ax[1, 1]))
+        )
         self.ax[0, 1].set_xlim(0, len(x) + 1)
         self.ax[0, 1].set_ylim(0, max(rtt) + 1)
         self.ax[1, 1].set_xlim(0, len(x) + 1)
         self.ax[1, 1].set_ylim(0, np.max(loss_rate))
 
-        if last[-1] == 0:
-            self.text.set_text("目前 FEC 状态：启用，时间不足")
-            self.circle.set_color("tab:red")
-        elif last[-1] == 1:
-            self.text.set_text("目前 FEC 状态：启用，带宽充裕")
-            self.circle.set_color("tab:orange")
-        elif last[-1] == 2:
-            self.text.set_text("目前 FEC 状态：未启用")
-            self.circle.set_color("tab:green")
+        if last[-1] in FEC_STATES:
+            text, color = FEC_STATES[last[-1]]
+            self.text.set_text(text)
+            self.circle.set_color(color)
         else:
             print("what?")
 
@@ -131,8 +94,76 @@ class UpdateData:
         pass
 
 
+class BlitUpdateData(UpdateData):
+    """
+    UpdateData for `FuncAnimation(..., blit=True)`.
+
+    Only the lines appended to the log since the last frame are parsed and
+    written into preallocated buffers. The limits of the axes grow
+    geometrically and the FEC status is only redrawn when the state changes.
+    """
+
+    def __init__(self, ax: Axes, ax_btm: Axes, log_file_name: str):
+        super().__init__(ax, ax_btm, log_file_name)
+        self.follower = utils.FileFollower(log_file_name)
+        self.rtt = SeriesBuffer(self.lines[:1])
+        self.loss_rate = SeriesBuffer(self.lines[1:])
+        self.limits = {}
+        self.state = None
+
+    def _grow(self, ax: Axes, xmax: float, ymax: float) -> bool:
+        xlim, ylim = self.limits.get(ax, (1, 1e-3))
+        new = (grow_limit(xlim, xmax + 1), grow_limit(ylim, ymax, 1e-3))
+        if new == (xlim, ylim):
+            return False
+        self.limits[ax] = new
+        ax.set_xlim(0, new[0])
+        ax.set_ylim(0, new[1])
+        return True
+
+    def __call__(self, frame):
+        lines = self.follower.read_lines()
+        if self.follower.truncated:
+            self.rtt.clear()
+            self.loss_rate.clear()
+        rows = [row for line in lines if (row := parse_line(line)) is not None]
+
+        redraw = False
+        if rows:
+            data = np.array(rows)
+            x = np.arange(len(self.rtt), len(self.rtt) + len(rows))
+            self.rtt.extend(x, data[None, :, 1])
+            self.loss_rate.extend(x, data[None, :, 4])
+            redraw |= self._grow(self.ax[0, 1], len(self.rtt), self.rtt.ymax(0))
+            redraw |= self._grow(
+                self.ax[1, 1], len(self.loss_rate), self.loss_rate.ymax(0)
+            )
+
+            state = rows[-1][-1]
+            if state != self.state:
+                self.state = state
+                text, color = FEC_STATES.get(
+                    state, ("当前 FEC 状态：无数据", "tab:gray")
+                )
+                set_text(self.text, text)
+                self.circle.set_color(color)
+                redraw = True
+
+        if redraw:
+            full_redraw(self.ax[0, 1])
+        return self.lines
+
+
 parser = argparse.ArgumentParser(description="Live Show DTP tunnel transport")
 parser.add_argument("-l", "--log", type=str, help="log file name")
+parser.add_argument(
+    "--blit",
+    action="store_true",
+    help="only redraw the lines every frame, for high frame rates",
+)
+parser.add_argument(
+    "--interval", type=int, help="milliseconds between frames", default=1000
+)
 
 if __name__ == "__main__":
     args = parser.parse_args()
@@ -155,6 +186,6 @@ if __name__ == "__main__":
         ]
     )
     ax_btm = fig.add_subplot(gs[2, 0:])
-    update_data = UpdateData(ax, ax_btm, args.log)
-    anim = FuncAnimation(fig, update_data, interval=1000)
+    update_data = (BlitUpdateData if args.blit else UpdateData)(ax, ax_btm, args.log)
+    anim = FuncAnimation(fig, update_data, interval=args.interval, blit=args.blit)
     plt.show()
@@ -8,6 +8,8 @@ import re
 from tqdm import tqdm
 import pandas as pd
 
+import utils
+
 CLIENT_LOG_PATTERN = re.compile(
     r'connection closed, recv=(-?\d+) sent=(-?\d+) lost=(-?\d+) rtt=(?:(?:(\d|.+)ms)|(?:(-1))) cwnd=(-?\d+), total_bytes=(-?\d+), complete_bytes=(-?\d+), good_bytes=(-?\d+), total_time=(-?\d+)')
 CLIENT_STAT_INDEXES = ["c_recv", "c_sent", "c_lost",
@@ -31,7 +33,7 @@ def parse_client_log(dir_path):
     for index in CLIENT_STAT_INDEXES:
         client_stat_dict[index] = []
 
-    with open(os.path.join(dir_path, "client.log")) as client:
+    with utils.open_input(os.path.join(dir_path, "client.log")) as client:
         client_lines = client.readlines()
 
         for line in client_lines[4:-1]:
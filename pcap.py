@@ -0,0 +1,371 @@
+import argparse
+import ipaddress
+import mmap
+import struct
+from typing import Dict, Iterator, List
+
+import numpy as np
+
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_IDB = 0x00000001
+PCAPNG_EPB = 0x00000006
+PCAPNG_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+
+PCAP_MAGIC_US = 0xA1B2C3D4
+PCAP_MAGIC_NS = 0xA1B23C4D
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86DD
+ETHERTYPE_VLAN = 0x8100
+
+IPPROTO_TCP = 6
+IPPROTO_UDP = 17
+
+COLUMNS = [
+    "ts",
+    "size",
+    "caplen",
+    "version",
+    "tos",
+    "dscp",
+    "proto",
+    "src",
+    "dst",
+    "sport",
+    "dport",
+]
+
+
+class PcapReader:
+    """
+    # PcapReader
+
+    Stream the packets of a pcapng or legacy pcap file as columnar numpy
+    arrays.
+
+    The file is memory mapped. Walking the blocks is the only per-packet Python
+    work; the link, IP and transport headers of a whole chunk are then decoded
+    at once by gathering bytes out of the mapped buffer with numpy.
+
+        Parameters:
+            file_name (str): The name of the capture file.
+            chunk_size (int): Number of packets per yielded chunk.
+
+    Columns of each chunk:
+        - ts: timestamp in seconds (float64)
+        - size: original length of the packet on the wire
+        - caplen: captured length
+        - version: IP version, 0 for non IP packets
+        - tos: IPv4 ToS byte or IPv6 traffic class
+        - dscp: tos >> 2
+        - proto: IP protocol / IPv6 next header
+        - src, dst: 16 byte addresses, IPv4 is mapped into ::ffff:0:0/96
+        - sport, dport: TCP/UDP ports, 0 otherwise
+    """
+
+    def __init__(self, file_name: str, chunk_size: int = 1 << 16):
+        self.file_name = file_name
+        self.chunk_size = chunk_size
+
+    def __iter__(self) -> Iterator[Dict[str, np.ndarray]]:
+        with open(self.file_name, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                buf = np.frombuffer(mm, dtype=np.uint8)
+                try:
+                    (magic,) = struct.unpack_from("<I", mm, 0)
+                    if magic == PCAPNG_SHB:
+                        records = self._walk_pcapng(mm)
+                    else:
+                        records = self._walk_pcap(mm)
+                    for chunk in records:
+                        yield decode(buf, *chunk)
+                finally:
+                    # the mapping can only be closed once no array refers to it
+                    del buf
+
+    def read(self) -> Dict[str, np.ndarray]:
+        """Read the whole file into one set of columns."""
+        chunks = list(self)
+        if not chunks:
+            return {k: np.array([]) for k in COLUMNS}
+        return {k: np.concatenate([c[k] for c in chunks]) for k in COLUMNS}
+
+    def _walk_pcapng(self, mm):
+        ts_raw, offsets, caplens, origlens, ifaces = [], [], [], [], []
+        # index into linktypes/resolutions of each interface of the section
+        interfaces: List[int] = []
+        linktypes, resolutions = [], []
+        endian = "<"
+        offset = 0
+        end = len(mm)
+
+        while offset + 12 <= end:
+            (block_type,) = struct.unpack_from(endian + "I", mm, offset)
+            if block_type == PCAPNG_SHB:
+                (bom,) = struct.unpack_from("<I", mm, offset + 8)
+                endian = "<" if bom == PCAPNG_BYTE_ORDER_MAGIC else ">"
+                interfaces = []
+            (block_len,) = struct.unpack_from(endian + "I", mm, offset + 4)
+            if block_len < 12 or offset + block_len > end:
+                break
+
+            if block_type == PCAPNG_EPB:
+                iface, hi, lo, caplen, origlen = struct.unpack_from(
+                    endian + "IIIII", mm, offset + 8
+                )
+                ts_raw.append((hi << 32) | lo)
+                offsets.append(offset + 28)
+                caplens.append(caplen)
+                origlens.append(origlen)
+                ifaces.append(interfaces[iface])
+                if len(offsets) >= self.chunk_size:
+                    yield ts_raw, offsets, caplens, origlens, ifaces, linktypes, resolutions
+                    ts_raw, offsets, caplens, origlens, ifaces = [], [], [], [], []
+            elif block_type == PCAPNG_IDB:
+                (linktype,) = struct.unpack_from(endian + "H", mm, offset + 8)
+                resolution = _parse_tsresol(
+                    mm, endian, offset + 16, offset + block_len - 4
+                )
+                # interfaces are numbered globally so chunks can refer to
+                # interfaces of previous sections
+                interfaces.append(len(linktypes))
+                linktypes.append(linktype)
+                resolutions.append(resolution)
+
+            offset += block_len
+
+        if offsets:
+            yield ts_raw, offsets, caplens, origlens, ifaces, linktypes, resolutions
+
+    def _walk_pcap(self, mm):
+        (magic,) = struct.unpack_from("<I", mm, 0)
+        if magic in (PCAP_MAGIC_US, PCAP_MAGIC_NS):
+            endian = "<"
+        elif struct.unpack_from(">I", mm, 0)[0] in (PCAP_MAGIC_US, PCAP_MAGIC_NS):
+            endian = ">"
+            (magic,) = struct.unpack_from(">I", mm, 0)
+        else:
+            raise Exception(f"{self.file_name} is not a pcap or pcapng file")
+        tick = 1e-9 if magic == PCAP_MAGIC_NS else 1e-6
+        (linktype,) = struct.unpack_from(endian + "I", mm, 20)
+        # legacy pcap stores seconds and sub-seconds separately, so the raw
+        # timestamp is rebuilt in ticks
+        scale = 1_000_000_000 if magic == PCAP_MAGIC_NS else 1_000_000
+        link = ([linktype], [tick])
+
+        ts_raw, offsets, caplens, origlens = [], [], [], []
+        offset = 24
+        end = len(mm)
+        while offset + 16 <= end:
+            sec, frac, caplen, origlen = struct.unpack_from(endian + "IIII", mm, offset)
+            if offset + 16 + caplen > end:
+                break
+            ts_raw.append(sec * scale + frac)
+            offsets.append(offset + 16)
+            caplens.append(caplen)
+            origlens.append(origlen)
+            offset += 16 + caplen
+            if len(offsets) >= self.chunk_size:
+                yield ts_raw, offsets, caplens, origlens, [0] * len(offsets), *link
+                ts_raw, offsets, caplens, origlens = [], [], [], []
+        if offsets:
+            yield ts_raw, offsets, caplens, origlens, [0] * len(offsets), *link
+
+
+def _parse_tsresol(mm, endian: str, offset: int, end: int) -> float:
+    """Return the seconds per timestamp tick from the if_tsresol option."""
+    while offset + 4 <= end:
+        code, length = struct.unpack_from(endian + "HH", mm, offset)
+        if code == 0:
+            break
+        if code == 9 and length >= 1:
+            value = mm[offset + 4]
+            if value & 0x80:
+                return 2.0 ** -(value & 0x7F)
+            return 10.0**-value
+        offset += 4 + ((length + 3) & ~3)
+    return 1e-6
+
+
+def _be16(buf: np.ndarray, idx: np.ndarray) -> np.ndarray:
+    return (buf[idx].astype(np.int64) << 8) | buf[idx + 1]
+
+
+def decode(
+    buf: np.ndarray,
+    ts_raw: List[int],
+    offsets: List[int],
+    caplens: List[int],
+    origlens: List[int],
+    ifaces: List[int],
+    linktypes: List[int],
+    resolutions: List[float],
+) -> Dict[str, np.ndarray]:
+    """
+    # decode
+
+    Decode the headers of a chunk of packets at once.
+
+    Only the first IPv6 header is decoded, packets with IPv6 extension headers
+    report the extension as `proto` and no ports.
+    """
+    n = len(offsets)
+    offset = np.array(offsets, dtype=np.int64)
+    caplen = np.array(caplens, dtype=np.int64)
+    iface = np.array(ifaces, dtype=np.int64)
+    linktype = np.array(linktypes, dtype=np.int64)[iface]
+    ts = (
+        np.array(ts_raw, dtype=np.uint64).astype(np.float64)
+        * np.array(resolutions, dtype=np.float64)[iface]
+    )
+    last = offset + caplen
+    # every gather below is clipped to the buffer, the results of packets that
+    # are too short are masked out afterwards
+    limit = len(buf) - 2
+
+    def gather(idx):
+        return buf[np.minimum(idx, limit)]
+
+    def gather16(idx):
+        return _be16(buf, np.minimum(idx, limit))
+
+    ethertype = np.zeros(n, dtype=np.int64)
+    net = offset.copy()
+
+    is_eth = linktype == LINKTYPE_ETHERNET
+    ethertype[is_eth] = gather16(offset[is_eth] + 12)
+    net[is_eth] += 14
+    vlan = is_eth & (ethertype == ETHERTYPE_VLAN)
+    ethertype[vlan] = gather16(offset[vlan] + 16)
+    net[vlan] += 4
+
+    is_sll = linktype == LINKTYPE_LINUX_SLL
+    ethertype[is_sll] = gather16(offset[is_sll] + 14)
+    net[is_sll] += 16
+
+    is_sll2 = linktype == LINKTYPE_LINUX_SLL2
+    ethertype[is_sll2] = gather16(offset[is_sll2])
+    net[is_sll2] += 20
+
+    is_null = linktype == LINKTYPE_NULL
+    net[is_null] += 4
+
+    # raw links carry no ethertype, the version nibble decides
+    is_raw = np.isin(
+        linktype, [LINKTYPE_NULL, LINKTYPE_RAW, LINKTYPE_IPV4, LINKTYPE_IPV6]
+    )
+    first = gather(net).astype(np.int64)
+    nibble = first >> 4
+    version = np.zeros(n, dtype=np.int64)
+    v4 = ((ethertype == ETHERTYPE_IPV4) | is_raw) & (nibble == 4) & (net + 20 <= last)
+    v6 = ((ethertype == ETHERTYPE_IPV6) | is_raw) & (nibble == 6) & (net + 40 <= last)
+    version[v4] = 4
+    version[v6] = 6
+
+    second = gather(net + 1).astype(np.int64)
+    tos = np.zeros(n, dtype=np.int64)
+    tos[v4] = second[v4]
+    tos[v6] = ((first[v6] & 0x0F) << 4) | (second[v6] >> 4)
+
+    proto = np.zeros(n, dtype=np.int64)
+    proto[v4] = gather(net[v4] + 9)
+    proto[v6] = gather(net[v6] + 6)
+
+    transport = np.zeros(n, dtype=np.int64)
+    transport[v4] = net[v4] + (first[v4] & 0x0F) * 4
+    transport[v6] = net[v6] + 40
+
+    src = np.zeros((n, 16), dtype=np.uint8)
+    dst = np.zeros((n, 16), dtype=np.uint8)
+    src[v4, 10:12] = 0xFF
+    dst[v4, 10:12] = 0xFF
+    src[v4, 12:] = gather(net[v4, None] + 12 + np.arange(4))
+    dst[v4, 12:] = gather(net[v4, None] + 16 + np.arange(4))
+    src[v6] = gather(net[v6, None] + 8 + np.arange(16))
+    dst[v6] = gather(net[v6, None] + 24 + np.arange(16))
+
+    has_ports = (
+        (version > 0)
+        & ((proto == IPPROTO_TCP) | (proto == IPPROTO_UDP))
+        & (transport + 4 <= last)
+    )
+    sport = np.zeros(n, dtype=np.int64)
+    dport = np.zeros(n, dtype=np.int64)
+    sport[has_ports] = gather16(transport[has_ports])
+    dport[has_ports] = gather16(transport[has_ports] + 2)
+
+    return {
+        "ts": ts,
+        "size": np.array(origlens, dtype=np.int64),
+        "caplen": caplen,
+        "version": version.astype(np.uint8),
+        "tos": tos.astype(np.uint8),
+        "dscp": (tos >> 2).astype(np.uint8),
+        "proto": proto.astype(np.uint8),
+        "src": src.view("S16").ravel(),
+        "dst": dst.view("S16").ravel(),
+        "sport": sport.astype(np.uint16),
+        "dport": dport.astype(np.uint16),
+    }
+
+
+def format_addr(addr: np.ndarray) -> np.ndarray:
+    """
+    # format_addr
+
+    Convert a column of 16 byte addresses into strings. Every distinct address
+    is formatted only once.
+    """
+    # numpy strips trailing zero bytes of S16 values, pad them back
+    unique, inverse = np.unique(addr, return_inverse=True)
+    names = []
+    for a in unique:
+        ip = ipaddress.IPv6Address(a.ljust(16, b"\0"))
+        names.append(str(ip.ipv4_mapped or ip))
+    return np.array(names, dtype=object)[inverse]
+
+
+parser = argparse.ArgumentParser(description="Read packets from pcap/pcapng")
+parser.add_argument("file", type=str, help="capture file")
+parser.add_argument("--head", type=int, help="number of packets to print", default=10)
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    packets = 0
+    total = 0
+    tos = {}
+    for chunk in PcapReader(args.file):
+        if packets < args.head:
+            head = min(args.head - packets, len(chunk["ts"]))
+            src = format_addr(chunk["src"][:head])
+            dst = format_addr(chunk["dst"][:head])
+            for i in range(head):
+                print(
+                    "{:.6f} {} {}:{} -> {}:{} proto {} tos {:#04x} len {}".format(
+                        chunk["ts"][i],
+                        chunk["version"][i],
+                        src[i],
+                        chunk["sport"][i],
+                        dst[i],
+                        chunk["dport"][i],
+                        chunk["proto"][i],
+                        chunk["tos"][i],
+                        chunk["size"][i],
+                    )
+                )
+        packets += len(chunk["ts"])
+        total += int(chunk["size"].sum())
+        for value, count in zip(*np.unique(chunk["tos"], return_counts=True)):
+            tos[int(value)] = tos.get(int(value), 0) + int(count)
+    print(f"packets {packets} bytes {total}")
+    for value in sorted(tos):
+        print(f"tos {value:#04x} dscp {value >> 2}: {tos[value]} packets")
@@ -0,0 +1,118 @@
+import numpy as np
+from matplotlib.axes import Axes
+
+import downsample
+
+
+class SeriesBuffer:
+    """
+    # SeriesBuffer
+
+    Preallocated x and y buffers shared by several lines.
+
+    Points are written in place and the lines get views of the filled part, so
+    appending does not rebuild the arrays every frame. The capacity doubles
+    when it is exhausted. Long series are reduced to the pixel width of the
+    axes before they are handed to the lines.
+
+    `rows` (at least one per line) keeps extra per point values after the
+    rows of the lines, they are not drawn.
+    """
+
+    def __init__(self, lines, capacity: int = 1 << 12, rows: int = None):
+        self.lines = lines
+        self.n = 0
+        self.x = np.empty(capacity)
+        self.y = np.full((len(lines) if rows is None else rows, capacity), np.nan)
+
+    def __len__(self):
+        return self.n
+
+    def _reserve(self, n: int):
+        capacity = len(self.x)
+        if n <= capacity:
+            return
+        while capacity < n:
+            capacity *= 2
+        x = np.empty(capacity)
+        x[: self.n] = self.x[: self.n]
+        y = np.full((len(self.y), capacity), np.nan)
+        y[:, : self.n] = self.y[:, : self.n]
+        self.x, self.y = x, y
+
+    def extend(self, x, y):
+        """Append points, `y` has one row per row of the buffer."""
+        if len(x) == 0:
+            return
+        self.splice(self.n, x, y)
+
+    def splice(self, start: int, x, y):
+        """Replace the points from index `start` on."""
+        k = len(x)
+        self._reserve(start + k)
+        self.x[start : start + k] = x
+        self.y[:, start : start + k] = y
+        self.n = start + k
+        self.update_lines()
+
+    def insert(self, x, y):
+        """
+        Add points keeping the buffer sorted by x (points with the same x stay
+        in the order they were added). Only the points after the smallest new
+        x are moved, so points that arrive almost in order are cheap.
+        """
+        if len(x) == 0:
+            return
+        start = int(np.searchsorted(self.x[: self.n], np.min(x), side="right"))
+        x = np.concatenate([self.x[start : self.n], x])
+        y = np.concatenate([self.y[:, start : self.n], y], axis=1)
+        order = np.argsort(x, kind="stable")
+        self.splice(start, x[order], y[:, order])
+
+    def clear(self):
+        self.n = 0
+        self.update_lines()
+
+    def update_lines(self):
+        for i, line in enumerate(self.lines):
+            line.set_data(
+                *downsample.reduce(
+                    self.x[: self.n],
+                    self.y[i, : self.n],
+                    downsample.pixel_width(line.axes),
+                )
+            )
+
+    def xmax(self):
+        return np.max(self.x[: self.n], initial=0)
+
+    def ymax(self, i: int):
+        return np.nanmax(self.y[i, : self.n], initial=0)
+
+
+def grow_limit(current: float, value: float, minimum: float = 1) -> float:
+    """
+    Return a new upper limit if `value` does not fit under `current`.
+
+    The limit grows geometrically so axes (and the blit background) are only
+    redrawn a logarithmic number of times.
+    """
+    if value <= current:
+        return current
+    return max(current * 2, value * 1.1, minimum)
+
+
+def set_text(artist, text: str) -> bool:
+    """Set the text of an artist, return whether it actually changed."""
+    if artist.get_text() == text:
+        return False
+    artist.set_text(text)
+    return True
+
+
+def full_redraw(ax: Axes):
+    """
+    Redraw everything that is not animated, e.g. ticks and tables after their
+    values changed. FuncAnimation then caches the new background of `ax`.
+    """
+    ax.figure.canvas.draw()
@@ -0,0 +1,359 @@
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import struct
+import sys
+import time
+
+import numpy as np
+
+from dtplib.parse import read_trace_chunks
+from gen_trace import MAX_DGRAM_SIZE
+
+# stream id, monotonic ns the block was released at, block size, offset of the
+# fragment in the block, deadline (ms), priority
+HEADER = struct.Struct("!QqIIIi")
+PAYLOAD = MAX_DGRAM_SIZE - HEADER.size
+# stream id 0 is never a block, it ends the replay (size: number of blocks)
+END = 0
+RESULT_HEADER = "block_id,bct,size,priority,deadline,duration\n"
+
+
+def _div_round(ns: int, unit: int) -> int:
+    """`ns` in `unit` (1000 for µs, 1_000_000 for ms), rounded half up."""
+    return (ns + unit // 2) // unit
+
+
+def stream_id(block_id: int) -> int:
+    """The QUIC stream id of a block, the inverse of (x >> 2) - 1."""
+    return ((block_id + 1) << 2) + 1
+
+
+def load_trace(trace_file_name: str):
+    """(start, ddl, size, prio) arrays of a text or binary trace."""
+    chunks = list(read_trace_chunks(trace_file_name))
+    if not chunks:
+        return tuple(np.zeros(0, dtype=np.int64) for _ in range(4))
+    gap, ddl, size, prio = (np.concatenate(c) for c in zip(*chunks))
+    return np.cumsum(gap), ddl, size, prio
+
+
+async def sleep_until(deadline_ns: int, spin_ns: int):
+    """
+    # sleep_until
+
+    Wait until `time.monotonic_ns()` reaches `deadline_ns`.
+
+    asyncio timers only wake up with about a millisecond of accuracy, so the
+    coroutine sleeps until `spin_ns` before the deadline and busy waits the
+    rest. The busy wait yields the CPU to other processes (e.g. the receiver)
+    but not to the event loop.
+    """
+    remaining = deadline_ns - time.monotonic_ns()
+    if remaining > spin_ns:
+        await asyncio.sleep((remaining - spin_ns) / 1e9)
+    while time.monotonic_ns() < deadline_ns:
+        os.sched_yield()
+
+
+class Sender:
+    """
+    # Sender
+
+    Replays a trace over UDP: block i is released at the cumulative start time
+    of the trace and sent at once as datagrams of at most MAX_DGRAM_SIZE bytes.
+
+    The sender writes the log lines of the quiche server that server_log.py
+    reads: `<stream>,start,<µs>` when a block is released and `stream <stream>
+    send complete,<µs>` after its last datagram. A block released after its
+    deadline is cancelled like by the DTP scheduler: its start line has its
+    scheduled time, followed by `block <stream> is canceled, passed <ms>,<µs>`
+    with the ms since then. Times are µs since the start of the replay, all
+    of them rounded to the nearest µs or ms.
+
+        Parameters:
+            trace_file_name (str): Text or binary trace.
+            server_log (str): Log written by the sender, optional.
+            spin (float): Milliseconds busy waited before each release.
+            lead (float): Seconds between the start and the first block.
+    """
+
+    def __init__(
+        self,
+        trace_file_name: str,
+        server_log: str = None,
+        spin: float = 1.0,
+        lead: float = 0.01,
+    ):
+        self.start, self.ddl, self.size, self.prio = load_trace(trace_file_name)
+        self.server_log = server_log
+        self.spin_ns = int(spin * 1e6)
+        self.lead_ns = int(lead * 1e9)
+        # ns each block was released after its scheduled time, -1 if cancelled
+        self.lateness = np.full(len(self.start), -1, dtype=np.int64)
+        self.elapsed = 0.0
+
+    async def run(self, host: str, port: int):
+        loop = asyncio.get_running_loop()
+        transport, _ = await loop.create_datagram_endpoint(
+            asyncio.DatagramProtocol, remote_addr=(host, port)
+        )
+        log = open(self.server_log, "w") if self.server_log else None
+        payload = bytes(PAYLOAD)
+        epoch = time.monotonic_ns() + self.lead_ns
+        due = epoch + np.round(self.start * 1e9).astype(np.int64)
+        try:
+            for i in range(len(due)):
+                await sleep_until(int(due[i]), self.spin_ns)
+                now = time.monotonic_ns()
+                late = now - int(due[i])
+                stream = stream_id(i)
+                ddl = int(self.ddl[i])
+                if late > ddl * 1_000_000:
+                    if log:
+                        log.write(
+                            f"{stream},start,{_div_round(int(due[i]) - epoch, 1000)}\n"
+                            "[INFO] quiche::scheduler::dtp_scheduler: "
+                            f"block {stream} is canceled, passed "
+                            f"{_div_round(late, 1_000_000)},"
+                            f"{_div_round(now - epoch, 1000)}\n"
+                        )
+                    continue
+                self.lateness[i] = late
+                size = int(self.size[i])
+                prio = int(self.prio[i])
+                if log:
+                    log.write(f"{stream},start,{_div_round(now - epoch, 1000)}\n")
+                for offset in range(0, max(size, 1), PAYLOAD):
+                    n = min(PAYLOAD, size - offset)
+                    transport.sendto(
+                        HEADER.pack(stream, now, size, offset, ddl, prio) + payload[:n]
+                    )
+                if log:
+                    log.write(
+                        f"[INFO] quiche: stream {stream} send complete,"
+                        f"{_div_round(time.monotonic_ns() - epoch, 1000)}\n"
+                    )
+                if transport.get_write_buffer_size():
+                    # let the event loop flush what the socket did not take
+                    await asyncio.sleep(0)
+            transport.sendto(HEADER.pack(END, 0, len(due), 0, 0, 0))
+            await asyncio.sleep(0)
+        finally:
+            self.elapsed = (time.monotonic_ns() - epoch) / 1e9
+            transport.close()
+            if log:
+                log.close()
+
+    def report(self) -> dict:
+        """Blocks sent and cancelled, and the lateness of the releases (µs)."""
+        sent = self.lateness[self.lateness >= 0] / 1000
+        report = {
+            "blocks": len(self.lateness),
+            "sent": len(sent),
+            "cancelled": int((self.lateness < 0).sum()),
+            "elapsed": self.elapsed,
+        }
+        if len(sent):
+            report.update(
+                {
+                    "mean": float(sent.mean()),
+                    "p50": float(np.percentile(sent, 50)),
+                    "p99": float(np.percentile(sent, 99)),
+                    "max": float(sent.max()),
+                    "over_1ms": int((sent > 1000).sum()),
+                }
+            )
+        return report
+
+
+def print_report(report: dict, file=sys.stdout):
+    print(
+        "sender: {blocks} blocks, {sent} sent, {cancelled} cancelled in "
+        "{elapsed:.3f}s".format(**report),
+        file=file,
+    )
+    if report["sent"]:
+        print(
+            "lateness (µs): mean {mean:.1f}, p50 {p50:.1f}, p99 {p99:.1f}, "
+            "max {max:.1f}, over 1 ms: {over_1ms}".format(**report),
+            file=file,
+        )
+
+
+class Receiver(asyncio.DatagramProtocol):
+    """
+    # Receiver
+
+    Reassembles the blocks of a Sender and writes a client result csv:
+    block_id (stream id), bct (ms from the release of the block to its last
+    datagram), size, priority, deadline (ms) and duration (µs since the first
+    datagram), rounded to the nearest ms / µs like the sender log. Rows are
+    written as blocks complete, so liveshow.py can follow the file.
+
+    The BCT compares monotonic clocks of the two processes, so sender and
+    receiver must run on the same host.
+
+        Parameters:
+            result (str): Result csv written by the receiver.
+            timeout (float): Seconds without datagrams after which the
+                receiver stops if the end of the replay was lost.
+    """
+
+    def __init__(self, result: str, timeout: float = 5.0):
+        self.file = open(result, "w")
+        self.file.write(RESULT_HEADER)
+        self.file.flush()
+        self.timeout = timeout
+        # stream -> bytes received
+        self.partial = {}
+        self.epoch = None
+        self.last = time.monotonic()
+        self.flushed = self.last
+        self.completed = 0
+        self.expected = None
+        self.done = asyncio.get_running_loop().create_future()
+
+    def datagram_received(self, data: bytes, addr):
+        now = time.monotonic_ns()
+        self.last = now / 1e9
+        stream, sent, size, offset, ddl, prio = HEADER.unpack_from(data)
+        if stream == END:
+            self.expected = size
+            if not self.done.done():
+                self.done.set_result(None)
+            return
+        if self.epoch is None:
+            self.epoch = now
+        received = self.partial.get(stream, 0) + len(data) - HEADER.size
+        if received < size:
+            self.partial[stream] = received
+            return
+        self.partial.pop(stream, None)
+        self.completed += 1
+        self.file.write(
+            f"{stream},{_div_round(now - sent, 1_000_000)},{size},{prio},{ddl},"
+            f"{_div_round(now - self.epoch, 1000)}\n"
+        )
+        if self.last - self.flushed > 0.05:
+            self.file.flush()
+            self.flushed = self.last
+
+    async def wait(self):
+        """Until the end of the replay, or `timeout` seconds without datagrams."""
+        while not self.done.done():
+            try:
+                await asyncio.wait_for(asyncio.shield(self.done), self.timeout)
+            except asyncio.TimeoutError:
+                if time.monotonic() - self.last > self.timeout and self.epoch:
+                    break
+        self.file.close()
+
+    def report(self) -> dict:
+        return {
+            "completed": self.completed,
+            "incomplete": len(self.partial),
+            "expected": self.expected,
+        }
+
+
+async def receive(
+    result: str, host: str, port: int, timeout: float = 5.0, ready=None
+) -> dict:
+    loop = asyncio.get_running_loop()
+    transport, receiver = await loop.create_datagram_endpoint(
+        lambda: Receiver(result, timeout), local_addr=(host, port)
+    )
+    sock = transport.get_extra_info("socket")
+    # room for the datagrams of large blocks while the receiver waits for the CPU
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 23)
+    if ready is not None:
+        ready.set()
+    try:
+        await receiver.wait()
+    finally:
+        transport.close()
+    return receiver.report()
+
+
+def print_receiver_report(report: dict, file=sys.stdout):
+    expected = report["expected"]
+    print(
+        "receiver: {completed} blocks completed, {incomplete} incomplete".format(
+            **report
+        )
+        + ("" if expected is None else f", {expected} expected"),
+        file=file,
+        flush=True,
+    )
+
+
+def _receive_process(result, host, port, timeout, ready):
+    print_receiver_report(asyncio.run(receive(result, host, port, timeout, ready)))
+
+
+parser = argparse.ArgumentParser(
+    description="Replay a trace over UDP on loopback, without the quiche testbed"
+)
+parser.add_argument(
+    "command",
+    type=str,
+    choices=["run", "send", "recv"],
+    help="run: receiver and sender at once, send: sender only, recv: receiver only",
+)
+parser.add_argument("-t", "--trace", type=str, help="trace file (send, run)")
+parser.add_argument(
+    "-r",
+    "--result",
+    type=str,
+    help="client result csv (recv, run)",
+    default="client.csv",
+)
+parser.add_argument(
+    "-s",
+    "--server-log",
+    type=str,
+    help="server log, read by server_log.py (send, run)",
+    default="server.log",
+)
+parser.add_argument("--host", type=str, help="receiver address", default="127.0.0.1")
+parser.add_argument("--port", type=int, help="receiver port", default=5555)
+parser.add_argument(
+    "--spin",
+    type=float,
+    help="milliseconds busy waited before each release",
+    default=1.0,
+)
+parser.add_argument(
+    "--timeout",
+    type=float,
+    help="seconds without datagrams before the receiver gives up",
+    default=5.0,
+)
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    match args.command:
+        case "recv":
+            _receive_process(args.result, args.host, args.port, args.timeout, None)
+        case "send" | "run":
+            if args.trace is None:
+                raise Exception("the sender needs a trace (-t)")
+            receiver = None
+            if args.command == "run":
+                ready = multiprocessing.Event()
+                receiver = multiprocessing.Process(
+                    target=_receive_process,
+                    args=(args.result, args.host, args.port, args.timeout, ready),
+                )
+                receiver.start()
+                if not ready.wait(10):
+                    raise Exception("the receiver did not start")
+            sender = Sender(args.trace, args.server_log, args.spin)
+            asyncio.run(sender.run(args.host, args.port))
+            if receiver is not None:
+                receiver.join()
+            print_report(sender.report())
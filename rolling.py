@@ -0,0 +1,221 @@
+import json
+import math
+import socket
+import sys
+import time
+from collections import deque
+from typing import Dict, Optional
+
+import numpy as np
+
+
+class RollingBCR:
+    """
+    # RollingBCR
+
+    Block completion rate of each priority over a sliding window, either the
+    last `blocks` blocks of the priority or the blocks of the last `seconds`
+    seconds (by block timestamp).
+
+    Blocks are added one by one with `add`, which keeps the number of blocks
+    and of in time blocks of every window, so each block costs O(1)
+    (amortized, for the time window) whatever the length of the run. `series`
+    computes the same values for whole arrays at once.
+
+        Parameters:
+            blocks (int): Length of the window in blocks.
+            seconds (float): Length of the window in seconds.
+    """
+
+    def __init__(self, blocks: Optional[int] = None, seconds: Optional[float] = None):
+        if (blocks is None) == (seconds is None):
+            raise Exception("rolling window needs either blocks or seconds")
+        if (blocks is not None and blocks <= 0) or (
+            seconds is not None and seconds <= 0
+        ):
+            raise Exception("rolling window must be positive")
+        self.blocks = blocks
+        self.seconds = seconds
+        self.clear()
+
+    def clear(self):
+        # prio -> deque of (timestamp, intime)
+        self.windows: Dict[int, deque] = {}
+        self.intime: Dict[int, int] = {}
+        self.latest = -math.inf
+
+    def describe(self) -> str:
+        if self.blocks is not None:
+            return f"{self.blocks} blocks"
+        return "{:g} s".format(self.seconds)
+
+    def add(self, prio: int, timestamp: float, intime: bool):
+        """Add one block, `timestamp` in seconds."""
+        window = self.windows.get(prio)
+        if window is None:
+            window = self.windows[prio] = deque()
+            self.intime[prio] = 0
+        window.append((timestamp, intime))
+        self.intime[prio] += intime
+        if self.blocks is not None:
+            if len(window) > self.blocks:
+                self.intime[prio] -= window.popleft()[1]
+            return
+        # the time window moves for every priority
+        self.latest = max(self.latest, timestamp)
+        limit = self.latest - self.seconds
+        for p, window in self.windows.items():
+            while window and window[0][0] <= limit:
+                self.intime[p] -= window.popleft()[1]
+
+    def get(self, prio: int):
+        """(BCR, number of blocks) of the window of `prio`, NaN if empty."""
+        window = self.windows.get(prio)
+        if not window:
+            return math.nan, 0
+        return self.intime[prio] / len(window), len(window)
+
+    def series(self, prio, intime, timestamp, p: int):
+        """
+        The (BCR, number of blocks) of the window of priority `p` after each
+        of the blocks, as if they were added in order. For a time window the
+        timestamps must be sorted.
+        """
+        onehot = prio == p
+        count = np.cumsum(onehot)
+        sums = np.concatenate([[0], np.cumsum(intime[onehot])])
+        if self.blocks is not None:
+            lo = np.maximum(count - self.blocks, 0)
+        else:
+            times = timestamp[onehot]
+            lo = np.searchsorted(times, timestamp - self.seconds, side="right")
+            lo = np.minimum(lo, count)
+        n = count - lo
+        with np.errstate(invalid="ignore", divide="ignore"):
+            ratio = np.where(n > 0, (sums[count] - sums[lo]) / n, np.nan)
+        return ratio, n
+
+
+def parse_thresholds(text: str) -> Dict[Optional[int], float]:
+    """
+    "0.9" -> the same threshold for every priority,
+    "1:0.9,2:0.5" -> one threshold per priority.
+    """
+    thresholds = {}
+    for item in text.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        if ":" in item:
+            prio, value = item.split(":", 1)
+            thresholds[int(prio)] = float(value)
+        else:
+            thresholds[None] = float(item)
+    return thresholds
+
+
+class Alerter:
+    """
+    # Alerter
+
+    Emits an alert when the windowed BCR of a priority drops below its
+    threshold, and another one when it recovers. Only crossings are reported,
+    not every block below the threshold.
+
+    Alerts are JSON lines with the wall clock `time`, the `timestamp` of the
+    block in the run, `prio`, `bcr`, `threshold`, the number of `blocks` in
+    the window and the `state` ("below" or "recovered").
+
+        Parameters:
+            thresholds (dict): {prio: threshold}, None for every priority, see
+                `parse_thresholds`.
+            target (str): "stderr", "udp://host:port", "unix:/path/to/socket"
+                (datagram socket) or a file the alerts are appended to.
+            min_blocks (int): Windows with fewer blocks are ignored, so the
+                first blocks of a run do not raise alerts.
+            window (str): Description of the window, copied to the alerts.
+    """
+
+    def __init__(
+        self,
+        thresholds: Dict[Optional[int], float],
+        target: str = "stderr",
+        min_blocks: int = 1,
+        window: str = "",
+    ):
+        self.thresholds = thresholds
+        self.target = target
+        self.min_blocks = min_blocks
+        self.window = window
+        self.below: Dict[int, bool] = {}
+        self.file = None
+        self.socket = None
+        if target in ("stderr", "-"):
+            self.file = sys.stderr
+        elif target.startswith("udp://"):
+            host, port = target[len("udp://") :].rsplit(":", 1)
+            self.address = (host, int(port))
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        elif target.startswith("unix:"):
+            self.address = target[len("unix:") :]
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        else:
+            self.file = open(target, "a", buffering=1)
+
+    def threshold(self, prio: int) -> Optional[float]:
+        return self.thresholds.get(prio, self.thresholds.get(None))
+
+    def reset(self):
+        """Forget the state, e.g. when the input starts over."""
+        self.below = {}
+
+    def check(self, prio: int, timestamp: float, bcr: float, blocks: int):
+        threshold = self.threshold(prio)
+        if threshold is None or blocks < self.min_blocks or math.isnan(bcr):
+            return
+        below = bcr < threshold
+        if below != self.below.get(prio, False):
+            self.below[prio] = below
+            self.emit(prio, timestamp, bcr, blocks, below)
+
+    def check_many(self, prio: int, timestamp, bcr, blocks):
+        """`check` for arrays, only the crossings are visited in python."""
+        threshold = self.threshold(prio)
+        if threshold is None:
+            return
+        valid = np.flatnonzero((blocks >= self.min_blocks) & ~np.isnan(bcr))
+        if len(valid) == 0:
+            return
+        below = bcr[valid] < threshold
+        previous = np.concatenate([[self.below.get(prio, False)], below[:-1]])
+        for i in valid[below != previous]:
+            self.below[prio] = bool(bcr[i] < threshold)
+            self.emit(prio, timestamp[i], bcr[i], blocks[i], self.below[prio])
+
+    def emit(self, prio: int, timestamp: float, bcr: float, blocks: int, below: bool):
+        line = json.dumps(
+            {
+                "time": round(time.time(), 3),
+                "timestamp": round(float(timestamp), 6),
+                "prio": int(prio),
+                "bcr": round(float(bcr), 4),
+                "threshold": self.threshold(prio),
+                "window": self.window,
+                "blocks": int(blocks),
+                "state": "below" if below else "recovered",
+            }
+        )
+        if self.socket is not None:
+            try:
+                self.socket.sendto(line.encode(), self.address)
+            except OSError:
+                # nobody listening, alerts are best effort
+                pass
+        else:
+            print(line, file=self.file, flush=True)
+
+    def close(self):
+        if self.socket is not None:
+            self.socket.close()
+        elif self.file is not sys.stderr:
+            self.file.close()
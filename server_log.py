@@ -3,6 +3,8 @@ import re
 
 import argparse
 
+import utils
+
 parser = argparse.ArgumentParser()
 parser.add_argument("file", type=str, help="file to parse")
 
@@ -40,7 +42,7 @@ if __name__ == "__main__":
 
     print("hello world")
 
-    with open(args.file, "r") as f:
+    with utils.open_input(args.file, "r") as f:
         for line in f:
             if line.startswith("block_id"):
                 continue
@@ -60,7 +62,7 @@ if __name__ == "__main__":
             else:
                 continue
 
-    with open(args.file + ".csv", "w") as f:
+    with open(utils.strip_compression_suffix(args.file) + ".csv", "w") as f:
         writer = csv.writer(f)
         writer.writerow(
             ["block_id", "start", "complete", "cancelled", "cancelled_passed"]
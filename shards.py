@@ -0,0 +1,221 @@
+import argparse
+import heapq
+import io
+import math
+import sys
+import time
+from collections import deque
+from typing import Iterator, List, Tuple, Union
+
+import utils
+
+# column the shards of each kind of file are ordered by
+RESULT_KEY = "duration"
+SERVER_LOG_KEY = "start"
+CONN_COLUMN = "conn"
+
+
+def _key(value: str) -> float:
+    """Rows without a key (e.g. blocks that never completed) sort last."""
+    try:
+        return float(value)
+    except ValueError:
+        return math.inf
+
+
+def _shard_lines(file_name: str, conn: int, key: str):
+    """(key, line with its connection id appended) of the rows of one shard."""
+    with utils.open_input(file_name, "r") as f:
+        header = f.readline().rstrip("\r\n").split(",")
+        if key not in header:
+            raise Exception(f"{file_name} has no {key} column")
+        index = header.index(key)
+        for line in f:
+            line = line.rstrip("\r\n")
+            if line:
+                yield _key(line.split(",")[index]), f"{line},{conn}"
+
+
+def _header(file_name: str) -> str:
+    with utils.open_input(file_name, "r") as f:
+        return f.readline().rstrip("\r\n")
+
+
+def merge_lines(file_names: List[str], key: str = RESULT_KEY) -> Tuple[str, Iterator]:
+    """
+    # merge_lines
+
+    Merge csv shards that are each ordered by `key` into one stream ordered by
+    `key`, the connection id (the index of the shard in `file_names`) appended
+    to every row as the CONN_COLUMN column.
+
+    The shards are read lazily, one row ahead each, so the memory does not
+    depend on their length. Rows with the same key keep the order of the
+    shards.
+
+        Returns:
+            (header, lines): the csv header and an iterator of the merged rows.
+    """
+    header = f"{_header(file_names[0])},{CONN_COLUMN}"
+    merged = heapq.merge(
+        *(_shard_lines(f, conn, key) for conn, f in enumerate(file_names)),
+        key=lambda item: item[0],
+    )
+    return header, (line for _, line in merged)
+
+
+def read_merged(file_names: List[str], key: str = RESULT_KEY):
+    """The merged shards (see `merge_lines`) as a polars DataFrame."""
+    import polars as pl
+
+    header, lines = merge_lines(file_names, key)
+    text = io.StringIO()
+    text.write(header + "\n")
+    for line in lines:
+        text.write(line + "\n")
+    if text.tell() == len(header) + 1:
+        return pl.DataFrame(None, header.split(","))
+    return pl.read_csv(io.BytesIO(text.getvalue().encode()))
+
+
+def shard_list(file_names: Union[str, List[str]]) -> List[str]:
+    """A file name or a list of shards, as a list."""
+    return [file_names] if isinstance(file_names, str) else list(file_names)
+
+
+def connections(file_names: Union[str, List[str]]) -> int:
+    """Number of connections of a result: 1 for a file, the shards of a list."""
+    return len(shard_list(file_names))
+
+
+class ShardFollower:
+    """
+    # ShardFollower
+
+    `utils.FileFollower` over shards that are still being written: each call
+    of `read_lines` returns the rows appended to any of the shards since the
+    last call, merged in `key` order, with the connection id appended.
+
+    A row is only released once every shard has reached its key, so a shard
+    that lags behind does not break the order. A shard without new rows for
+    `idle` seconds (finished, stalled or not created yet) no longer holds the
+    others back. If a shard is truncated all of them are read again from the
+    start and `truncated` is set.
+
+        Parameters:
+            file_names (list): result (or server log) csv shards.
+            key (str): column the shards are ordered by.
+            idle (float): seconds after which a quiet shard is not waited for.
+    """
+
+    def __init__(self, file_names: List[str], key: str = RESULT_KEY, idle=1.0):
+        self.file_names = file_names
+        self.key = key
+        self.idle = idle
+        self.truncated = False
+        self._reset()
+
+    def _reset(self):
+        self.followers = [utils.FileFollower(f) for f in self.file_names]
+        self.index = [None] * len(self.file_names)
+        # rows read but not released yet, (key, line) in key order per shard
+        self.pending = [deque() for _ in self.file_names]
+        self.last = [-math.inf] * len(self.file_names)
+        self.updated = [time.monotonic()] * len(self.file_names)
+
+    def _read(self, now: float) -> bool:
+        """Read every shard, False if one of them was truncated."""
+        for conn, follower in enumerate(self.followers):
+            lines = follower.read_lines()
+            if follower.truncated:
+                return False
+            for line in lines:
+                if self.index[conn] is None:
+                    header = line.split(",")
+                    if self.key not in header:
+                        raise Exception(f"{self.file_names[conn]} has no {self.key}")
+                    self.index[conn] = header.index(self.key)
+                    continue
+                if not line:
+                    continue
+                key = _key(line.split(",")[self.index[conn]])
+                self.pending[conn].append((key, f"{line},{conn}"))
+                self.last[conn] = key
+            if lines:
+                self.updated[conn] = now
+        return True
+
+    def read_lines(self) -> List[str]:
+        self.truncated = False
+        now = time.monotonic()
+        if not self._read(now):
+            self._reset()
+            self.truncated = True
+            self._read(now)
+        active = [
+            last
+            for last, updated in zip(self.last, self.updated)
+            if now - updated < self.idle
+        ]
+        watermark = min(active, default=math.inf)
+        ready = []
+        for pending in self.pending:
+            rows = []
+            while pending and pending[0][0] <= watermark:
+                rows.append(pending.popleft())
+            ready.append(rows)
+        return [line for _, line in heapq.merge(*ready, key=lambda item: item[0])]
+
+
+def follow(file_names: Union[str, List[str]], key: str = RESULT_KEY):
+    """A follower of the rows of one result file or of the merged shards of a list."""
+    if isinstance(file_names, str):
+        return utils.FileFollower(file_names, skip_header=True)
+    return ShardFollower(file_names, key)
+
+
+parser = argparse.ArgumentParser(
+    description="Merge the result (or server log) csv shards of the connections of "
+    "a run into one csv ordered by duration (or start), with a conn column"
+)
+parser.add_argument("shards", metavar="FILE", type=str, nargs="+", help="csv shards")
+parser.add_argument("-o", "--output", type=str, help="merged csv, stdout by default")
+parser.add_argument(
+    "--key",
+    type=str,
+    help=f"column the shards are ordered by, {RESULT_KEY} for results and "
+    f"{SERVER_LOG_KEY} for server logs",
+    default=RESULT_KEY,
+)
+parser.add_argument(
+    "-f",
+    "--follow",
+    action="store_true",
+    help="keep merging the rows appended to the shards",
+)
+parser.add_argument(
+    "--interval", type=float, help="seconds between two reads (follow)", default=0.5
+)
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    out = open(args.output, "w") if args.output else sys.stdout
+    try:
+        if args.follow:
+            out.write(f"{_header(args.shards[0])},{CONN_COLUMN}\n")
+            follower = ShardFollower(args.shards, args.key)
+            while True:
+                lines = follower.read_lines()
+                if follower.truncated:
+                    raise Exception("a shard was truncated, merge again")
+                out.writelines(line + "\n" for line in lines)
+                out.flush()
+                time.sleep(args.interval)
+        header, lines = merge_lines(args.shards, args.key)
+        out.write(header + "\n")
+        out.writelines(line + "\n" for line in lines)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if out is not sys.stdout:
+            out.close()
@@ -0,0 +1,237 @@
+import json
+import math
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+QUANTILES = [0.5, 0.9, 0.99, 0.999]
+
+
+def quantile_name(q: float) -> str:
+    """0.5 -> p50, 0.999 -> p99.9"""
+    return "p" + "{:g}".format(q * 100)
+
+
+class QuantileSketch:
+    """
+    # QuantileSketch
+
+    Mergeable quantile sketch over log-spaced buckets (DDSketch).
+
+    A value v > 0 is counted in bucket ceil(log_gamma(v)) with
+    gamma = (1 + a) / (1 - a), so every quantile is returned with a relative
+    error of at most `a`. Memory only depends on the ratio between the largest
+    and the smallest value: BCTs between 1 ms and 1000 s need ~700 buckets at
+    1% accuracy. If `max_buckets` is exceeded the lowest buckets are collapsed,
+    which keeps the upper (tail) quantiles accurate.
+
+        Parameters:
+            relative_accuracy (float): The relative error `a` of quantiles.
+            max_buckets (int): Upper bound of the number of buckets.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, max_buckets: int = 2048):
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.offset = 0
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def __len__(self):
+        return self.count
+
+    def _reserve(self, lo: int, hi: int):
+        """Make room for the keys lo..hi (inclusive)."""
+        if len(self.counts) == 0:
+            size = max(hi - lo + 1, 64)
+            self.counts = np.zeros(size, dtype=np.int64)
+            self.offset = lo
+            return
+        cur_lo, cur_hi = self.offset, self.offset + len(self.counts) - 1
+        if lo >= cur_lo and hi <= cur_hi:
+            return
+        # grow geometrically so scalar adds are amortized O(1)
+        new_lo = min(lo, cur_lo)
+        new_hi = max(hi, cur_hi)
+        grow = max(len(self.counts) // 2, 16)
+        if lo < cur_lo:
+            new_lo -= grow
+        if hi > cur_hi:
+            new_hi += grow
+        counts = np.zeros(new_hi - new_lo + 1, dtype=np.int64)
+        counts[cur_lo - new_lo : cur_lo - new_lo + len(self.counts)] = self.counts
+        self.counts = counts
+        self.offset = new_lo
+
+    def _collapse(self):
+        nonzero = np.flatnonzero(self.counts)
+        if len(nonzero) == 0:
+            return
+        first, last = nonzero[0], nonzero[-1]
+        if last - first + 1 <= self.max_buckets:
+            return
+        cut = last - self.max_buckets + 1
+        self.counts[cut] += self.counts[first:cut].sum()
+        self.counts[first:cut] = 0
+
+    def key(self, value: float) -> int:
+        return math.ceil(math.log(value) / self.log_gamma)
+
+    def add(self, value: float):
+        """Add a single value in O(1)."""
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if value <= 0:
+            self.zero_count += 1
+            return
+        k = self.key(value)
+        self._reserve(k, k)
+        self.counts[k - self.offset] += 1
+        if len(self.counts) > self.max_buckets:
+            self._collapse()
+
+    def add_many(self, values: Iterable[float]):
+        """Add an array of values at once."""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        self.count += len(values)
+        self.sum += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        positive = values[values > 0]
+        self.zero_count += len(values) - len(positive)
+        if len(positive) == 0:
+            return
+        keys = np.ceil(np.log(positive) / self.log_gamma).astype(np.int64)
+        lo, hi = int(keys.min()), int(keys.max())
+        self._reserve(lo, hi)
+        self.counts[lo - self.offset : hi - self.offset + 1] += np.bincount(
+            keys - lo, minlength=hi - lo + 1
+        )
+        if len(self.counts) > self.max_buckets:
+            self._collapse()
+
+    def merge(self, other: "QuantileSketch"):
+        """Add all values of `other`, e.g. the sketch of another run."""
+        if not math.isclose(self.gamma, other.gamma):
+            raise Exception("cannot merge sketches with different accuracy")
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.zero_count += other.zero_count
+        if len(other.counts) == 0:
+            return
+        lo, hi = other.offset, other.offset + len(other.counts) - 1
+        self._reserve(lo, hi)
+        self.counts[lo - self.offset : hi - self.offset + 1] += other.counts
+        if len(self.counts) > self.max_buckets:
+            self._collapse()
+
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else None
+
+    def quantile(self, q: float) -> float:
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return max(self.min, 0.0)
+        cumulative = np.cumsum(self.counts)
+        idx = int(np.searchsorted(cumulative, rank - self.zero_count, side="right"))
+        idx = min(idx, len(self.counts) - 1)
+        value = 2 * self.gamma ** (idx + self.offset) / (self.gamma + 1)
+        return min(max(value, self.min), self.max)
+
+    def quantiles(self, qs: List[float] = QUANTILES) -> Dict[str, float]:
+        return {quantile_name(q): self.quantile(q) for q in qs}
+
+    def to_dict(self) -> dict:
+        nonzero = np.flatnonzero(self.counts)
+        start = int(nonzero[0]) if len(nonzero) else 0
+        end = int(nonzero[-1]) + 1 if len(nonzero) else 0
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "max_buckets": self.max_buckets,
+            "offset": self.offset + start,
+            "counts": self.counts[start:end].tolist(),
+            "zero_count": self.zero_count,
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "QuantileSketch":
+        sketch = cls(data["relative_accuracy"], data["max_buckets"])
+        sketch.counts = np.array(data["counts"], dtype=np.int64)
+        sketch.offset = data["offset"]
+        sketch.zero_count = data["zero_count"]
+        sketch.count = data["count"]
+        sketch.sum = data["sum"]
+        if sketch.count:
+            sketch.min = data["min"]
+            sketch.max = data["max"]
+        return sketch
+
+
+class PrioritySketches:
+    """
+    # PrioritySketches
+
+    One QuantileSketch per priority plus one over all blocks ("all").
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.relative_accuracy = relative_accuracy
+        self.sketches: Dict[str, QuantileSketch] = {}
+
+    def get(self, prio) -> QuantileSketch:
+        name = str(prio)
+        if name not in self.sketches:
+            self.sketches[name] = QuantileSketch(self.relative_accuracy)
+        return self.sketches[name]
+
+    def add(self, prio: int, value: float):
+        self.get("all").add(value)
+        self.get(prio).add(value)
+
+    def add_many(self, prio: np.ndarray, values: np.ndarray):
+        prio = np.asarray(prio)
+        values = np.asarray(values, dtype=np.float64)
+        self.get("all").add_many(values)
+        for p in np.unique(prio):
+            self.get(int(p)).add_many(values[prio == p])
+
+    def merge(self, other: "PrioritySketches"):
+        for name, sketch in other.sketches.items():
+            self.get(name).merge(sketch)
+
+    def names(self) -> List[str]:
+        prios = sorted((n for n in self.sketches if n != "all"), key=int)
+        return (["all"] if "all" in self.sketches else []) + prios
+
+    def save(self, file_name: str):
+        with open(file_name, "w") as f:
+            json.dump({k: v.to_dict() for k, v in self.sketches.items()}, f)
+
+    @classmethod
+    def load(cls, file_name: str) -> "PrioritySketches":
+        with open(file_name, "r") as f:
+            data = json.load(f)
+        sketches = cls()
+        for name, value in data.items():
+            sketches.sketches[name] = QuantileSketch.from_dict(value)
+            sketches.relative_accuracy = sketches.sketches[name].relative_accuracy
+        return sketches
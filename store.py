@@ -0,0 +1,365 @@
+import argparse
+import datetime
+import hashlib
+import os
+import re
+from typing import List, Optional
+
+import polars as pl
+
+import utils
+from dtplib import tracefile
+from dtplib.parse import stream_to_block_id
+
+INDEX_FILE_NAME = "index.ipc"
+INDEX_COLUMNS = [
+    "run_id",
+    "trace",
+    "scheduler",
+    "loss",
+    "tos",
+    "window",
+    "tags",
+    "date",
+    "blocks",
+    "source",
+]
+TABLES = ["result", "server", "stats"]
+
+regex_loss = re.compile(r"loss(\d+)")
+
+
+def read_trace(trace_file_name: str) -> pl.DataFrame:
+    """
+    # read_trace
+
+    Read a trace file with the csv reader of polars instead of parsing it
+    line by line.
+
+        Parameters:
+            trace_file_name (str): The name of the trace file.
+
+        Returns:
+            polars.DataFrame: id, gap, start, ddl, size, prio
+    """
+    if tracefile.is_binary_trace(trace_file_name):
+        return tracefile.trace_frame(trace_file_name).select(
+            ["id", "gap", "ddl", "size", "prio", "start"]
+        )
+    trace = utils.read_csv(
+        trace_file_name,
+        sep=" ",
+        has_header=False,
+        columns=[0, 1, 2, 3],
+        new_columns=["gap", "ddl", "size", "prio"],
+        dtypes=[pl.Float64, pl.Int64, pl.Int64, pl.Int64],
+    )
+    return trace.with_row_count("id").with_columns(
+        [pl.col("id").cast(pl.Int64), pl.col("gap").cumsum().alias("start")]
+    )
+
+
+def infer_metadata(result_file_name: str) -> dict:
+    """
+    # infer_metadata
+
+    Guess the run metadata from the name of a result file, e.g.
+    `client_ai_t_n_fifo.csv` or `client_video_loss0_window_basic_tos.csv`.
+
+    Everything that is not understood is kept in `tags` so nothing is lost.
+    """
+    name = os.path.splitext(
+        os.path.basename(utils.strip_compression_suffix(result_file_name))
+    )[0]
+    tokens = name.split("_")
+    if tokens and tokens[0] == "client":
+        tokens = tokens[1:]
+
+    meta = {"scheduler": "dtp", "loss": None, "tos": False, "window": False}
+    tags = []
+    for token in tokens:
+        if token == "fifo":
+            meta["scheduler"] = "fifo"
+        elif token == "tos":
+            meta["tos"] = True
+        elif token == "window":
+            meta["window"] = True
+        elif (match := regex_loss.fullmatch(token)) is not None:
+            meta["loss"] = float(match.group(1))
+        else:
+            tags.append(token)
+    meta["tags"] = "_".join(tags)
+    return meta
+
+
+class ExperimentStore:
+    """
+    # ExperimentStore
+
+    A directory of compressed Arrow IPC files with a small run index.
+
+    Layout:
+        <root>/index.ipc                 one row per run (see INDEX_COLUMNS)
+        <root>/traces/<trace>.ipc        traces, shared by all runs using them
+        <root>/runs/<run_id>/<table>.ipc result, server and stats tables
+
+    All files are read with memory mapping, so loading a run only touches the
+    pages of the columns that are actually used. Writing with
+    `compression="uncompressed"` makes the mapped buffers zero-copy.
+    """
+
+    def __init__(self, root: str, compression: str = "zstd"):
+        self.root = root
+        self.compression = compression
+        self.index_file_name = os.path.join(root, INDEX_FILE_NAME)
+        self._index = None
+
+    @property
+    def index(self) -> pl.DataFrame:
+        if self._index is None:
+            if os.path.exists(self.index_file_name):
+                self._index = pl.read_ipc(self.index_file_name, memory_map=False)
+            else:
+                self._index = pl.DataFrame(
+                    {
+                        "run_id": pl.Series([], dtype=pl.Utf8),
+                        "trace": pl.Series([], dtype=pl.Utf8),
+                        "scheduler": pl.Series([], dtype=pl.Utf8),
+                        "loss": pl.Series([], dtype=pl.Float64),
+                        "tos": pl.Series([], dtype=pl.Boolean),
+                        "window": pl.Series([], dtype=pl.Boolean),
+                        "tags": pl.Series([], dtype=pl.Utf8),
+                        "date": pl.Series([], dtype=pl.Utf8),
+                        "blocks": pl.Series([], dtype=pl.Int64),
+                        "source": pl.Series([], dtype=pl.Utf8),
+                    }
+                )
+        return self._index
+
+    def _write(self, df: pl.DataFrame, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write to a temporary file first so a crash never leaves a torn file
+        df.write_ipc(path + ".tmp", compression=self.compression)
+        os.replace(path + ".tmp", path)
+
+    def trace_path(self, trace: str) -> str:
+        return os.path.join(self.root, "traces", trace + ".ipc")
+
+    def table_path(self, run_id: str, table: str) -> str:
+        return os.path.join(self.root, "runs", run_id, table + ".ipc")
+
+    def ingest_trace(self, trace_file_name: str) -> str:
+        """
+        Store a trace under its file name without extension (`trace.txt.gz`
+        -> `trace`). Another trace with the same name but a different content
+        (e.g. the `trace.txt` of another experiment) gets a digest of its
+        content appended to the name instead of being mixed up with it.
+        """
+        trace = os.path.splitext(
+            os.path.basename(utils.strip_compression_suffix(trace_file_name))
+        )[0]
+        df = read_trace(trace_file_name)
+        if os.path.exists(self.trace_path(trace)):
+            if self.load_trace(trace).frame_equal(df):
+                return trace
+            digest = hashlib.sha1()
+            for column in df.get_columns():
+                digest.update(column.to_numpy().tobytes())
+            trace = f"{trace}-{digest.hexdigest()[:8]}"
+        if not os.path.exists(self.trace_path(trace)):
+            self._write(df, self.trace_path(trace))
+        return trace
+
+    def ingest(
+        self,
+        result_file_name: str,
+        trace_file_name: Optional[str] = None,
+        server_file_name: Optional[str] = None,
+        stats_file_name: Optional[str] = None,
+        **metadata,
+    ) -> str:
+        """
+        # ingest
+
+        Convert one run into columnar files and add it to the index.
+
+            Parameters:
+                result_file_name (str): client result csv.
+                trace_file_name (str): trace file used by the sender.
+                server_file_name (str): `.csv.csv` produced by server_log.py.
+                stats_file_name (str): `stats.csv` produced by log2csv.py.
+                metadata: overrides of the inferred run metadata
+                    (scheduler, loss, tos, window, tags, date).
+
+            Returns:
+                str: the run id.
+        """
+        meta = infer_metadata(result_file_name)
+        meta.update({k: v for k, v in metadata.items() if v is not None})
+        if "date" not in meta:
+            meta["date"] = datetime.date.fromtimestamp(
+                os.path.getmtime(result_file_name)
+            ).isoformat()
+
+        run_id = "{:06d}".format(
+            int(self.index["run_id"].cast(pl.Int64).max() or 0) + 1
+            if len(self.index) > 0
+            else 0
+        )
+
+        result = utils.read_csv(result_file_name)
+        result = result.with_column(stream_to_block_id())
+        self._write(result, self.table_path(run_id, "result"))
+
+        if server_file_name is not None:
+            server = utils.read_csv(server_file_name)
+            server = server.with_column(stream_to_block_id())
+            self._write(server, self.table_path(run_id, "server"))
+
+        if stats_file_name is not None:
+            self._write(
+                utils.read_csv(stats_file_name),
+                self.table_path(run_id, "stats"),
+            )
+
+        trace = (
+            self.ingest_trace(trace_file_name) if trace_file_name is not None else None
+        )
+
+        row = pl.DataFrame(
+            {
+                "run_id": [run_id],
+                "trace": pl.Series([trace], dtype=pl.Utf8),
+                "scheduler": [meta["scheduler"]],
+                "loss": pl.Series([meta["loss"]], dtype=pl.Float64),
+                "tos": [bool(meta["tos"])],
+                "window": [bool(meta["window"])],
+                "tags": [meta["tags"]],
+                "date": [meta["date"]],
+                "blocks": [len(result)],
+                "source": [os.path.abspath(result_file_name)],
+            }
+        )
+        self._index = pl.concat([self.index, row])
+        self._write(self._index, self.index_file_name)
+        return run_id
+
+    def query(self, **filters) -> pl.DataFrame:
+        """
+        # query
+
+        Filter the run index, e.g. `store.query(trace="trace_tos_3", scheduler="dtp")`.
+        A list value matches any of its items.
+        """
+        index = self.index
+        for column, value in filters.items():
+            if value is None:
+                continue
+            if column not in INDEX_COLUMNS:
+                raise Exception(f"unknown index column {column}")
+            if isinstance(value, (list, tuple, set)):
+                index = index.filter(pl.col(column).is_in(list(value)))
+            else:
+                index = index.filter(pl.col(column) == value)
+        return index
+
+    def load_trace(self, trace: str, columns: Optional[List[str]] = None):
+        return pl.read_ipc(self.trace_path(trace), columns=columns, memory_map=True)
+
+    def load(
+        self, run_id: str, table: str = "result", columns: Optional[List[str]] = None
+    ) -> pl.DataFrame:
+        if table not in TABLES:
+            raise Exception(f"unknown table {table}")
+        return pl.read_ipc(
+            self.table_path(run_id, table), columns=columns, memory_map=True
+        )
+
+    def load_runs(
+        self, table: str = "result", columns: Optional[List[str]] = None, **filters
+    ) -> pl.DataFrame:
+        """
+        # load_runs
+
+        Load one table of every run matching `filters` into a single DataFrame
+        with an extra `run_id` column, e.g. all DTP results on one trace:
+
+            store.load_runs("result", trace="trace_tos_3", scheduler="dtp")
+        """
+        frames = []
+        for run_id in self.query(**filters)["run_id"]:
+            if not os.path.exists(self.table_path(run_id, table)):
+                continue
+            df = self.load(run_id, table, columns)
+            frames.append(df.with_column(pl.lit(run_id).alias("run_id")))
+        if not frames:
+            return pl.DataFrame([])
+        return pl.concat(frames)
+
+
+parser = argparse.ArgumentParser(description="Columnar experiment store")
+parser.add_argument(
+    "command",
+    metavar="cmd",
+    type=str,
+    choices=["ingest", "query", "load"],
+)
+parser.add_argument("--store", type=str, help="store directory", default="store")
+parser.add_argument(
+    "-r", "--result_file", metavar="result", type=str, nargs="*", help="result files"
+)
+parser.add_argument("-t", "--trace_file", metavar="trace", type=str, help="trace file")
+parser.add_argument("-s", "--server_log", type=str, help="server log csv file")
+parser.add_argument("--stats", type=str, help="stats.csv generated by log2csv.py")
+parser.add_argument(
+    "--compression",
+    type=str,
+    choices=["uncompressed", "lz4", "zstd"],
+    default="zstd",
+    help="uncompressed files can be memory mapped without copying",
+)
+parser.add_argument("--trace", type=str, help="trace name (query)")
+parser.add_argument("--scheduler", type=str, help="scheduler, e.g. dtp or fifo")
+parser.add_argument("--loss", type=float, help="loss rate")
+parser.add_argument("--tos", type=int, choices=[0, 1], help="ToS enabled")
+parser.add_argument("--window", type=int, choices=[0, 1], help="window enabled")
+parser.add_argument("--date", type=str, help="date of the run (YYYY-MM-DD)")
+parser.add_argument("--run", type=str, help="run id (load)")
+parser.add_argument(
+    "--table", type=str, choices=TABLES, default="result", help="table (load)"
+)
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    store = ExperimentStore(args.store, args.compression)
+    flags = {
+        "scheduler": args.scheduler,
+        "loss": args.loss,
+        "tos": None if args.tos is None else bool(args.tos),
+        "window": None if args.window is None else bool(args.window),
+        "date": args.date,
+    }
+
+    match args.command:
+        case "ingest":
+            for result_file in args.result_file or []:
+                print(
+                    result_file,
+                    "->",
+                    store.ingest(
+                        result_file,
+                        args.trace_file,
+                        args.server_log,
+                        args.stats,
+                        **flags,
+                    ),
+                )
+        case "query":
+            print(store.query(trace=args.trace, **flags))
+        case "load":
+            if args.run is not None:
+                print(store.load(args.run, args.table))
+            else:
+                print(store.load_runs(args.table, trace=args.trace, **flags))
+        case _:
+            raise Exception("Unknown command")
@@ -0,0 +1,39 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import gen_trace
+
+
+def test_mixed_seq_with_random_float_column(tmp_path):
+    # a mixed seq is an object column, the lognormal sizes go through polars
+    config = {
+        "trace_file_name": str(tmp_path / "mixed.txt"),
+        "block_num": 3000,
+        "block_gap": {"type": "seq", "seq": [0.001, 1, 0.5]},
+        "block_size": {
+            "type": "random",
+            "random": {"seed": 1, "distribution": "lognormal", "max": 1},
+        },
+    }
+    gen_trace.generate_trace(config)
+    lines = (tmp_path / "mixed.txt").read_text().splitlines()
+    assert len(lines) == 3000
+    assert [line.split()[0] for line in lines[:4]] == ["0.001", "1", "0.5", "0.001"]
+    assert all(len(line.split()) == 4 for line in lines)
+
+
+def test_failed_config_keeps_previous_trace(tmp_path):
+    path = tmp_path / "trace.txt"
+    path.write_text("0.001 200 1300 0\n")
+    config = {
+        "trace_file_name": str(path),
+        "block_num": 10,
+        "block_gap": {"type": "unknown"},
+    }
+    try:
+        gen_trace.generate_trace(config)
+    except Exception:
+        pass
+    assert path.read_text() == "0.001 200 1300 0\n"
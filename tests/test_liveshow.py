@@ -0,0 +1,65 @@
+import os
+import sys
+
+import numpy as np
+import polars as pl
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import liveshow
+import rolling
+
+
+def playback(window):
+    rng = np.random.default_rng(3)
+    n = 2000
+    trace = pl.DataFrame(
+        {
+            "id": np.arange(n),
+            "start": np.cumsum(np.full(n, 0.001)),
+            "ddl": np.full(n, 200),
+            "size": np.full(n, 1300),
+            "prio": rng.integers(0, 3, n),
+        }
+    )
+    bct = rng.integers(10, 400, n)
+    start = np.arange(n) * 1000 + rng.integers(0, 500, n)
+    # receiver clock off by up to a few hundred ms
+    duration = (start / 1000 + bct + rng.normal(0, 150, n)) * 1000
+    result = pl.DataFrame(
+        {
+            "block_id": np.arange(n),
+            "bct": bct,
+            "size": np.full(n, 1300),
+            "priority": trace["prio"].to_numpy(),
+            "deadline": np.full(n, 200),
+            "duration": duration.astype(np.int64),
+        }
+    )
+    server_log = pl.DataFrame(
+        {
+            "block_id": np.arange(n),
+            "start": start,
+            "complete": start,
+            "cancelled": pl.Series([1 if i % 7 == 0 else None for i in range(n)]),
+        }
+    )
+    return liveshow.PlaybackData(trace, result, server_log, window)
+
+
+@pytest.mark.parametrize(
+    "window",
+    [None, rolling.RollingBCR(blocks=50), rolling.RollingBCR(seconds=0.3)],
+)
+def test_frame_matches_recomputed_prefix(window):
+    data = playback(window)
+    assert len(data.late) > 0
+    for timer in np.arange(0, data.end + 500, 97.0):
+        x, y = data.frame(timer)
+        m = len(x)
+        intime = data.intime[:m] & (data.arrival[:m] < timer)
+        expected = data._curves(
+            data.prio[:m], intime, data.cancelled[:m], data.timestamp[:m], window
+        )
+        assert np.allclose(y, expected, equal_nan=True, rtol=0, atol=1e-12)
@@ -0,0 +1,15 @@
+import os
+import sys
+
+import polars as pl
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from dtplib.parse import stream_to_block_id
+
+
+def test_stream_to_block_id_is_exact_for_large_ids():
+    streams = [4, 5, 7, 8, (1 << 60) + 7]
+    df = pl.DataFrame({"block_id": streams}).with_column(stream_to_block_id())
+    assert df["block_id"].dtype == pl.Int64
+    assert df["block_id"].to_list() == [(s >> 2) - 1 for s in streams]
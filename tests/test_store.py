@@ -0,0 +1,28 @@
+import gzip
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import store
+
+
+def test_ingest_trace_keeps_traces_with_the_same_name_apart(tmp_path):
+    lines = "".join(f"0.001 200 1300 {i % 3}\n" for i in range(100))
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    (tmp_path / "a" / "trace.txt").write_text(lines)
+    with gzip.open(tmp_path / "a" / "trace.txt.gz", "wt") as f:
+        f.write(lines)
+    (tmp_path / "b" / "trace.txt").write_text(lines[: len(lines) // 2])
+
+    s = store.ExperimentStore(str(tmp_path / "store"))
+    first = s.ingest_trace(str(tmp_path / "a" / "trace.txt"))
+    assert first == "trace"
+    # the same content, compressed
+    assert s.ingest_trace(str(tmp_path / "a" / "trace.txt.gz")) == "trace"
+    other = s.ingest_trace(str(tmp_path / "b" / "trace.txt"))
+    assert other.startswith("trace-")
+    assert s.ingest_trace(str(tmp_path / "b" / "trace.txt")) == other
+    assert len(s.load_trace(first)) == 100
+    assert len(s.load_trace(other)) == 50
@@ -0,0 +1,29 @@
+import gzip
+import os
+import sys
+
+import polars as pl
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import utils
+
+HEADER = "block_id,bct,size,priority,deadline,duration\n"
+
+
+def test_read_csv_block_boundary_on_dtype_change(tmp_path):
+    # integer bct in the first block, float bct in the second one
+    ints = "".join(f"{i * 4 + 5},{i % 50},1300,1,200,{i}\n" for i in range(100))
+    floats = "".join(
+        f"{i * 4 + 5},{i % 50}.5,1300,1,200,{i}\n" for i in range(100, 200)
+    )
+    plain = tmp_path / "r4.csv"
+    plain.write_text(HEADER + ints + floats)
+    with gzip.open(tmp_path / "r4.csv.gz", "wt") as f:
+        f.write(HEADER + ints + floats)
+
+    result = utils.read_csv(str(tmp_path / "r4.csv.gz"), block_size=len(HEADER + ints))
+    expected = pl.read_csv(str(plain), infer_schema_length=None)
+    assert result["bct"].dtype == pl.Float64
+    assert result.dtypes == expected.dtypes
+    assert result.frame_equal(expected)
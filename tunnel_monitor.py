@@ -0,0 +1,381 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import numpy as np
+
+import utils
+from dtplib.parse import FEC_COLUMNS, parse_fec_line
+
+# numeric columns of the FEC lines, kept as series
+SERIES = FEC_COLUMNS[:-1]
+
+
+class TunnelState:
+    """
+    # TunnelState
+
+    Series and FEC state of one tunnel.
+
+    Samples are appended by the monitor thread and read by the renderer or the
+    HTTP endpoint. The arrays are only ever appended to in place or replaced
+    by new ones, so `snapshot` can return views without copying.
+
+        Parameters:
+            name (str): Name of the tunnel.
+            path (str): Log file of the tunnel.
+            keep (int): Keep only about the last `keep` samples, 0 keeps all.
+    """
+
+    def __init__(self, name: str, path: str, keep: int = 0):
+        self.name = name
+        self.path = path
+        self.keep = keep
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self.data = np.empty((len(SERIES), 1 << 10))
+        self.n = 0
+        # index of the first kept sample since the start of the log
+        self.first = 0
+        self.fec = None
+        self.updated = None
+
+    def extend(self, rows: np.ndarray):
+        """Append (k, FEC_COLUMNS) rows."""
+        if len(rows) == 0:
+            return
+        values = rows[:, :-1].T
+        with self.lock:
+            total = self.n + len(rows)
+            start = total - self.keep if self.keep and total > 2 * self.keep else 0
+            if total > self.data.shape[1] or start > 0:
+                old = self.data[:, min(start, self.n) : self.n]
+                new = values[:, max(start - self.n, 0) :]
+                size = old.shape[1] + new.shape[1]
+                data = np.empty(
+                    (len(SERIES), max(1 << (size - 1).bit_length(), 1 << 10))
+                )
+                data[:, : old.shape[1]] = old
+                data[:, old.shape[1] : size] = new
+                self.data = data
+                self.first += start
+                self.n = size
+            else:
+                self.data[:, self.n : total] = values
+                self.n = total
+            self.fec = int(rows[-1, -1])
+            self.updated = time.time()
+
+    def snapshot(self, since: int = 0):
+        """(index of the first sample, (SERIES, samples) view) from sample `since` on."""
+        with self.lock:
+            lo = min(max(since - self.first, 0), self.n)
+            return self.first + lo, self.data[:, lo : self.n]
+
+    @property
+    def samples(self) -> int:
+        return self.first + self.n
+
+    def summary(self) -> dict:
+        with self.lock:
+            last = self.data[:, self.n - 1] if self.n else [None] * len(SERIES)
+            return {
+                "name": self.name,
+                "path": self.path,
+                "samples": self.first + self.n,
+                "fec": self.fec,
+                "updated": self.updated,
+                **{name: _json_value(v) for name, v in zip(SERIES, last)},
+            }
+
+
+def _json_value(value):
+    if value is None or not math.isfinite(value):
+        return None
+    return float(value)
+
+
+def tunnel_names(paths: List[str]) -> Dict[str, str]:
+    """
+    {name: path}, a path may be given as `name=path`, otherwise the file name
+    (the path if two file names collide).
+    """
+    items = [p.split("=", 1) if "=" in p else (None, p) for p in paths]
+    basenames = [os.path.basename(path) for _, path in items]
+    tunnels = {}
+    for (name, path), base in zip(items, basenames):
+        if name is None:
+            name = base if basenames.count(base) == 1 else path
+        if name in tunnels:
+            raise Exception(f"duplicated tunnel name {name}")
+        tunnels[name] = path
+    return tunnels
+
+
+class Monitor:
+    """
+    # Monitor
+
+    Follows the logs of many tunnels at once with asyncio.
+
+    Every log has its own task that polls the file every `poll` seconds; the
+    reading and the regex parsing of the new lines run in worker threads, so
+    neither the event loop (and its HTTP endpoint) nor a matplotlib window
+    waits for them. A log that is truncated starts its tunnel over.
+
+        Parameters:
+            paths (list of str): Tunnel logs, see `tunnel_names`.
+            poll (float): Seconds between two reads of a log.
+            keep (int): Samples kept per tunnel, 0 keeps all.
+    """
+
+    def __init__(self, paths: List[str], poll: float = 0.2, keep: int = 0):
+        self.poll = poll
+        self.tunnels = {
+            name: TunnelState(name, path, keep)
+            for name, path in tunnel_names(paths).items()
+        }
+
+    @staticmethod
+    def _read(follower: utils.FileFollower):
+        lines = follower.read_lines()
+        rows = [row for line in lines if (row := parse_fec_line(line)) is not None]
+        return follower.truncated, np.array(rows).reshape(-1, len(FEC_COLUMNS))
+
+    async def follow(self, tunnel: TunnelState):
+        follower = utils.FileFollower(tunnel.path)
+        while True:
+            truncated, rows = await asyncio.to_thread(self._read, follower)
+            if truncated:
+                with tunnel.lock:
+                    tunnel.clear()
+            tunnel.extend(rows)
+            await asyncio.sleep(self.poll)
+
+    async def run(self, host: Optional[str] = None, port: Optional[int] = None):
+        """Follow every log, and serve the state over HTTP if `port` is set."""
+        tasks = [self.follow(tunnel) for tunnel in self.tunnels.values()]
+        if port is not None:
+            server = await asyncio.start_server(self.handle, host, port)
+            print(f"serving on http://{host}:{port}/tunnels", flush=True)
+            tasks.append(server.serve_forever())
+        await asyncio.gather(*tasks)
+
+    def start(self, host: Optional[str] = None, port: Optional[int] = None):
+        """`run` in a daemon thread, for a caller that owns the main thread."""
+        thread = threading.Thread(
+            target=asyncio.run, args=(self.run(host, port),), daemon=True
+        )
+        thread.start()
+        return thread
+
+    def route(self, target: str):
+        """
+        (status, body) of a GET request:
+
+        - `/tunnels`: summary of every tunnel, its last values and FEC state
+        - `/tunnels/<name>?since=k&last=n`: series of one tunnel from sample
+          `since` on, or only its last `n` samples
+        """
+        url = urlsplit(target)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        parts = [unquote(p) for p in url.path.split("/") if p]
+        if parts in ([], ["tunnels"]):
+            return 200, {
+                "series": SERIES,
+                "tunnels": [t.summary() for t in self.tunnels.values()],
+            }
+        if len(parts) == 2 and parts[0] == "tunnels" and parts[1] in self.tunnels:
+            tunnel = self.tunnels[parts[1]]
+            since = int(query.get("since", 0))
+            if "last" in query:
+                since = max(since, tunnel.samples - int(query["last"]))
+            first, data = tunnel.snapshot(since)
+            return 200, {
+                **tunnel.summary(),
+                "first": first,
+                **{name: data[i].tolist() for i, name in enumerate(SERIES)},
+            }
+        return 404, {"error": f"not found: {url.path}"}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request = (await reader.readline()).decode(errors="replace").split()
+            while (await reader.readline()).strip():
+                # headers are not used
+                pass
+            if len(request) < 2 or request[0] != "GET":
+                status, body = 405, {"error": "only GET is supported"}
+            else:
+                status, body = self.route(request[1])
+        except Exception as e:
+            status, body = 400, {"error": str(e)}
+        payload = json.dumps(body).encode()
+        reason = {
+            200: "OK",
+            400: "Bad Request",
+            404: "Not Found",
+            405: "Method Not Allowed",
+        }.get(status, "")
+        # a 405 response must list the allowed methods
+        allow = "Allow: GET\r\n" if status == 405 else ""
+        writer.write(
+            (
+                f"HTTP/1.1 {status} {reason}\r\n"
+                f"{allow}"
+                "Content-Type: application/json\r\n"
+                f"Content-Length: {len(payload)}\r\n"
+                "Access-Control-Allow-Origin: *\r\n"
+                "Connection: close\r\n\r\n"
+            ).encode()
+            + payload
+        )
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+
+def grid(
+    monitor: Monitor,
+    series: List[str],
+    cols: Optional[int] = None,
+    interval: int = 1000,
+    host: Optional[str] = None,
+    port: Optional[int] = None,
+):
+    """
+    # grid
+
+    Draw every tunnel of `monitor` in one window, one axes per tunnel with the
+    first of `series` on the left axis and the second one (if any) on the
+    right axis. The title shows the FEC state with the colors of
+    liveshow_tunnel.py.
+    """
+    import matplotlib.patches as mpatches
+    import matplotlib.pyplot as plt
+    from matplotlib.animation import FuncAnimation
+
+    import downsample
+    from liveshow_tunnel import FEC_STATES
+    from plotting import grow_limit
+
+    names = list(monitor.tunnels)
+    cols = cols or math.ceil(math.sqrt(len(names)))
+    rows = math.ceil(len(names) / cols)
+    fig, axes = plt.subplots(rows, cols, squeeze=False, figsize=(4 * cols, 2.5 * rows))
+    cells = []
+    for ax, name in zip(axes.flat, names):
+        lines = [ax.plot([], [], color="tab:blue")[0]]
+        ax.set_ylabel(series[0])
+        twin = None
+        if len(series) > 1:
+            twin = ax.twinx()
+            lines.append(twin.plot([], [], color="tab:orange")[0])
+            twin.set_ylabel(series[1])
+        title = ax.set_title(f"{name}: 无数据", color="tab:gray", fontsize="medium")
+        cells.append((monitor.tunnels[name], ax, twin, lines, title, {}))
+    for ax in axes.flat[len(names) :]:
+        ax.set_axis_off()
+    fig.legend(
+        handles=[
+            mpatches.Patch(color=color, label=text)
+            for text, color in FEC_STATES.values()
+        ],
+        loc="lower center",
+        ncol=len(FEC_STATES),
+    )
+    fig.tight_layout(rect=(0, 0.05, 1, 1))
+    columns = [SERIES.index(s) for s in series]
+
+    def update(frame):
+        for tunnel, ax, twin, lines, title, limits in cells:
+            first, data = tunnel.snapshot()
+            x = np.arange(first, first + data.shape[1])
+            width = downsample.pixel_width(ax)
+            for line, target, column in zip(lines, (ax, twin), columns):
+                line.set_data(*downsample.reduce(x, data[column], width))
+                ymax = np.max(data[column], initial=0)
+                ylim = grow_limit(limits.get(target, 1e-3), ymax, 1e-3)
+                if ylim != limits.get(target):
+                    limits[target] = ylim
+                    target.set_ylim(0, ylim)
+            ax.set_xlim(x[0] if len(x) else 0, max(x[-1] if len(x) else 0, 1))
+            if tunnel.fec is not None:
+                text, color = FEC_STATES.get(tunnel.fec, ("FEC: ?", "tab:gray"))
+                title.set_text(f"{tunnel.name}: {text.split('：', 1)[-1]}")
+                title.set_color(color)
+
+    monitor.start(host, port)
+    anim = FuncAnimation(fig, update, interval=interval)
+    plt.show()
+    return anim
+
+
+parser = argparse.ArgumentParser(
+    description="Monitor the FEC logs of many tunnels at once"
+)
+parser.add_argument(
+    "command",
+    type=str,
+    choices=["grid", "serve"],
+    help="grid: draw all tunnels in one window, serve: HTTP/JSON endpoint",
+)
+parser.add_argument(
+    "-l",
+    "--log",
+    type=str,
+    nargs="+",
+    required=True,
+    help="tunnel log files, optionally as name=path",
+)
+parser.add_argument(
+    "--series",
+    type=str,
+    nargs="+",
+    choices=SERIES,
+    default=["rtt", "predict_loss_rate"],
+    help="one or two series drawn per tunnel (grid)",
+)
+parser.add_argument("--cols", type=int, help="columns of the grid (grid)")
+parser.add_argument(
+    "--interval", type=int, help="milliseconds between frames (grid)", default=1000
+)
+parser.add_argument(
+    "--poll", type=float, help="seconds between two reads of a log", default=0.2
+)
+parser.add_argument(
+    "--keep", type=int, help="samples kept per tunnel, 0 keeps all", default=0
+)
+parser.add_argument("--host", type=str, help="HTTP address", default="127.0.0.1")
+parser.add_argument(
+    "--port", type=int, help="HTTP port (serve, optional for grid)", default=None
+)
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    monitor = Monitor(args.log, args.poll, args.keep)
+
+    match args.command:
+        case "grid":
+            grid(
+                monitor,
+                args.series[:2],
+                args.cols,
+                args.interval,
+                args.host,
+                args.port,
+            )
+        case "serve":
+            try:
+                asyncio.run(monitor.run(args.host, args.port or 8765))
+            except KeyboardInterrupt:
+                pass
@@ -1,3 +1,17 @@
+import io
+import os
+import queue
+import threading
+
+# leading bytes of the compressed formats we archive logs and traces with
+COMPRESSION_MAGIC = {
+    b"\x1f\x8b": "gzip",
+    b"\xfd7zXZ\x00": "xz",
+    b"BZh": "bz2",
+}
+COMPRESSION_SUFFIXES = {".gz": "gzip", ".xz": "xz", ".bz2": "bz2"}
+
+
 def count_newlines(file_path):
     """
     Counts the number of newlines in a file.
@@ -9,5 +23,262 @@ def count_newlines(file_path):
             yield b
             b = reader(2**16)
 
+    if detect_compression(file_path) is not None:
+        with open_input(file_path, "rb") as f:
+            return sum(buf.count(b"\n") for buf in _make_gen(f.read))
+
     with open(file_path, "rb") as f:
         return sum(buf.count(b"\n") for buf in _make_gen(f.raw.read))
+
+
+def detect_compression(file_path):
+    """
+    Returns "gzip", "xz", "bz2" or None, from the first bytes of the file.
+    """
+    with open(file_path, "rb") as f:
+        head = f.read(6)
+    for magic, name in COMPRESSION_MAGIC.items():
+        if head.startswith(magic):
+            return name
+    return None
+
+
+def find_input(file_path):
+    """
+    Returns `file_path`, or its compressed copy (e.g. `client.log.xz`) if only
+    that one exists.
+    """
+    if os.path.exists(file_path):
+        return file_path
+    for suffix in COMPRESSION_SUFFIXES:
+        if os.path.exists(file_path + suffix):
+            return file_path + suffix
+    return file_path
+
+
+def strip_compression_suffix(file_path):
+    """`server.log.gz` -> `server.log`"""
+    root, ext = os.path.splitext(file_path)
+    return root if ext in COMPRESSION_SUFFIXES else file_path
+
+
+class DecompressingReader(io.RawIOBase):
+    """
+    Decompresses a file in a background thread.
+
+    zlib and lzma release the GIL, so decompressing the next chunks overlaps
+    with parsing the current one. At most `depth` chunks of `chunk_size`
+    bytes are buffered. An error of the thread is raised by the read that
+    reaches it and by every read after it.
+    """
+
+    def __init__(self, file_path, compression, chunk_size=1 << 20, depth=8):
+        self.file_path = file_path
+        self.compression = compression
+        self.chunk_size = chunk_size
+        self.chunks = queue.Queue(depth)
+        self.stopped = threading.Event()
+        self.current = memoryview(b"")
+        self.eof = False
+        self.error = None
+        self.thread = threading.Thread(target=self._decompress, daemon=True)
+        self.thread.start()
+
+    def _open(self):
+        match self.compression:
+            case "gzip":
+                import gzip
+
+                return gzip.open(self.file_path, "rb")
+            case "xz":
+                import lzma
+
+                return lzma.open(self.file_path, "rb")
+            case "bz2":
+                import bz2
+
+                return bz2.open(self.file_path, "rb")
+            case _:
+                raise Exception(f"unknown compression {self.compression}")
+
+    def _put(self, item):
+        while not self.stopped.is_set():
+            try:
+                self.chunks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _decompress(self):
+        try:
+            with self._open() as f:
+                while chunk := f.read(self.chunk_size):
+                    if not self._put(chunk):
+                        return
+        except Exception as e:
+            self._put(e)
+            return
+        self._put(b"")
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self.error is not None:
+            raise self.error
+        if not self.current and not self.eof:
+            item = self.chunks.get()
+            if isinstance(item, Exception):
+                self.error = item
+                raise item
+            self.eof = item == b""
+            self.current = memoryview(item)
+        n = min(len(buffer), len(self.current))
+        buffer[:n] = self.current[:n]
+        self.current = self.current[n:]
+        return n
+
+    def close(self):
+        self.stopped.set()
+        super().close()
+
+
+def open_input(file_path, mode="r", encoding=None, errors=None):
+    """
+    # open_input
+
+    `open()` for reading that also accepts gzip, xz and bz2 files, recognized
+    by their content, so archived logs and traces can be parsed without
+    decompressing them to disk first. Compressed files are decompressed in a
+    background thread (see DecompressingReader).
+
+        Parameters:
+            file_path (str): The file, or its name without the compression
+                suffix (see find_input).
+            mode (str): "r" for text or "rb" for bytes.
+    """
+    if mode not in ["r", "rb"]:
+        raise Exception(f"open_input only reads, mode {mode} is not supported")
+    file_path = find_input(file_path)
+    compression = detect_compression(file_path)
+    if compression is None:
+        return open(file_path, mode, encoding=encoding, errors=errors)
+    reader = io.BufferedReader(DecompressingReader(file_path, compression))
+    if mode == "rb":
+        return reader
+    return io.TextIOWrapper(reader, encoding=encoding, errors=errors)
+
+
+def _line_blocks(f, block_size):
+    """Blocks of about `block_size` bytes of complete lines of a binary file."""
+    rest = b""
+    while block := f.read(block_size):
+        block = rest + block
+        end = block.rfind(b"\n") + 1
+        if end == 0:
+            rest = block
+            continue
+        rest = block[end:]
+        yield block[:end]
+    if rest:
+        yield rest
+
+
+def read_csv(file_path, block_size=1 << 24, **kwargs):
+    """
+    # read_csv
+
+    `polars.read_csv` of a file that may be compressed. A plain file is given
+    to polars by path so it can map it. A compressed one is parsed a block of
+    lines at a time while the next blocks are decompressed (see
+    DecompressingReader), so only one block of the decompressed text is in
+    memory besides the DataFrame.
+
+    Every block after the first one gets the column names of the first one.
+    A column whose type differs between blocks (e.g. ints in one, floats in
+    another) is cast to Float64, or to Utf8 if it is not numeric.
+    """
+    import polars as pl
+
+    file_path = find_input(file_path)
+    if detect_compression(file_path) is None:
+        return pl.read_csv(file_path, **kwargs)
+
+    frames = []
+    with open_input(file_path, "rb") as f:
+        for block in _line_blocks(f, block_size):
+            frames.append(pl.read_csv(io.BytesIO(block), **kwargs))
+            if len(frames) == 1:
+                # the header, or the column names given, are in the first block
+                kwargs.update(has_header=False, new_columns=frames[0].columns)
+    if not frames:
+        return pl.read_csv(io.BytesIO(b""), **kwargs)
+    if len(frames) == 1:
+        return frames[0]
+    numeric_dtypes = (
+        pl.Int8,
+        pl.Int16,
+        pl.Int32,
+        pl.Int64,
+        pl.UInt8,
+        pl.UInt16,
+        pl.UInt32,
+        pl.UInt64,
+        pl.Float32,
+        pl.Float64,
+    )
+    casts = []
+    for name in frames[0].columns:
+        dtypes = {frame[name].dtype for frame in frames}
+        if len(dtypes) > 1:
+            numeric = all(dtype in numeric_dtypes for dtype in dtypes)
+            casts.append(pl.col(name).cast(pl.Float64 if numeric else pl.Utf8))
+    if casts:
+        frames = [frame.with_columns(casts) for frame in frames]
+    return pl.concat(frames, rechunk=False)
+
+
+class FileFollower:
+    """
+    Reads the lines appended to a file since the last call, like `tail -f`.
+
+    Only complete lines are returned, a partially written last line is kept
+    until its newline arrives. If the file shrinks it is read again from the
+    beginning and `truncated` is set, so callers can drop their state.
+    """
+
+    def __init__(self, file_path, skip_header=False):
+        self.file_path = file_path
+        self.skip_header = skip_header
+        self.truncated = False
+        self._reset()
+
+    def _reset(self):
+        self.offset = 0
+        self.partial = b""
+        self.header_pending = self.skip_header
+
+    def read_lines(self):
+        self.truncated = False
+        try:
+            size = os.path.getsize(self.file_path)
+        except (FileNotFoundError, TypeError):
+            return []
+        if size < self.offset:
+            self._reset()
+            self.truncated = True
+        if size == self.offset:
+            return []
+
+        with open(self.file_path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read(size - self.offset)
+        self.offset += len(data)
+
+        lines = (self.partial + data).split(b"\n")
+        self.partial = lines.pop()
+        if self.header_pending and lines:
+            lines = lines[1:]
+            self.header_pending = False
+        return [line.decode(errors="replace").rstrip("\r") for line in lines]